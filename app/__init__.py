@@ -2,6 +2,7 @@ import logging
 import os
 from logging.handlers import RotatingFileHandler
 from flask import Flask
+from .config import Config
 
 def create_app():
     app = Flask(__name__, template_folder='../templates', static_folder='../static')
@@ -21,7 +22,9 @@ def create_app():
     app.logger.setLevel(logging.INFO)
 
     # Import and register blueprints or routes
-    from .routes import main_bp
+    from .routes import main_bp, start_services
     app.register_blueprint(main_bp)
+    if Config.START_BACKGROUND_SERVICES:
+        start_services()
 
     return app
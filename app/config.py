@@ -5,4 +5,45 @@ class Config:
     SECRET_KEY = os.environ.get('FLASK_SECRET_KEY', 'change-this-in-production!')
     CONFIG_DIR = os.environ.get('CONFIG_DIR', '/config')
     PROFILES_DIR = pathlib.Path(CONFIG_DIR) / "profiles"
+    # How often the profile registry looks for edited profile files (the profile API routes reload immediately)
+    PROFILE_RECHECK_SECONDS = float(os.environ.get('PROFILE_RECHECK_SECONDS', 2))
     LOG_DIR = pathlib.Path(CONFIG_DIR) / "logs"
+    # Concurrent ffprobe workers per scan; 0 per-mount means no per-filesystem cap
+    SCAN_WORKERS = int(os.environ.get('SCAN_WORKERS', 4))
+    SCAN_WORKERS_PER_MOUNT = int(os.environ.get('SCAN_WORKERS_PER_MOUNT', 0))
+    # Persistent ffprobe result cache under CONFIG_DIR/cache
+    PROBE_CACHE_ENABLED = os.environ.get('PROBE_CACHE_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+    PROBE_CACHE_MAX_MB = int(os.environ.get('PROBE_CACHE_MAX_MB', 512))
+    # Hash each uncached file's first and last 64 KiB so cached probes also follow copies and cross-filesystem moves
+    PROBE_CACHE_CONTENT_HASH = os.environ.get('PROBE_CACHE_CONTENT_HASH', 'true').lower() not in ('0', 'false', 'no')
+    # Fast ffprobe tier: only the needed fields, reading at most this many bytes / microseconds; incomplete results get a full probe
+    PROBE_FAST_ENABLED = os.environ.get('PROBE_FAST_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+    PROBE_FAST_PROBESIZE = int(os.environ.get('PROBE_FAST_PROBESIZE', 1048576))
+    PROBE_FAST_ANALYZEDURATION_US = int(os.environ.get('PROBE_FAST_ANALYZEDURATION_US', 1000000))
+    # Max discovered-but-unprobed files held in memory while walking a scan root
+    SCAN_DISCOVERY_BUFFER = int(os.environ.get('SCAN_DISCOVERY_BUFFER', 10000))
+    # Concurrent ffmpeg fix jobs per task, and the -threads cap per job (0 lets ffmpeg decide)
+    FIX_WORKERS = int(os.environ.get('FIX_WORKERS', 2))
+    FIX_THREADS_PER_JOB = int(os.environ.get('FIX_THREADS_PER_JOB', 0))
+    # How fix backups are made (hardlink, reflink or copy; cheaper methods fall back to the next), and free space kept in reserve
+    FIX_BACKUP_METHOD = os.environ.get('FIX_BACKUP_METHOD', 'hardlink').lower()
+    FIX_MIN_FREE_MB = int(os.environ.get('FIX_MIN_FREE_MB', 1024))
+    # Open the task store and start the library watcher in create_app(); off for tooling that only needs the routes (tasks then stay in memory)
+    START_BACKGROUND_SERVICES = os.environ.get('START_BACKGROUND_SERVICES', 'true').lower() not in ('0', 'false', 'no')
+    # Durable task state and results in CONFIG_DIR/tasks.db; finished tasks expire after the TTL or beyond the LRU cap (interrupted ones are kept).
+    # When it is off, tasks stay in memory and scan results are held as compact records (result_records.CompactResultList)
+    TASK_STORE_ENABLED = os.environ.get('TASK_STORE_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+    TASK_RETENTION_HOURS = float(os.environ.get('TASK_RETENTION_HOURS', 24))
+    TASK_RETENTION_MAX = int(os.environ.get('TASK_RETENTION_MAX', 20))
+    # Background job scheduler: concurrent jobs overall and per kind, and how many may wait in the queue
+    SCHEDULER_MAX_JOBS = int(os.environ.get('SCHEDULER_MAX_JOBS', 3))
+    SCHEDULER_MAX_SCANS = int(os.environ.get('SCHEDULER_MAX_SCANS', 2))
+    SCHEDULER_MAX_FIXES = int(os.environ.get('SCHEDULER_MAX_FIXES', 1))
+    SCHEDULER_MAX_QUEUED = int(os.environ.get('SCHEDULER_MAX_QUEUED', 50))
+    # Library watch mode: roots (separated by os.pathsep) kept up to date as files change, checked against WATCH_PROFILE
+    WATCH_ROOTS = [root for root in os.environ.get('WATCH_ROOTS', '').split(os.pathsep) if root]
+    WATCH_PROFILE = os.environ.get('WATCH_PROFILE', '')
+    WATCH_MODE = os.environ.get('WATCH_MODE', 'auto').lower() # auto, inotify or poll
+    WATCH_DEBOUNCE_SECONDS = float(os.environ.get('WATCH_DEBOUNCE_SECONDS', 10))
+    WATCH_POLL_SECONDS = float(os.environ.get('WATCH_POLL_SECONDS', 300))
+    WATCH_AUTO_FIX = os.environ.get('WATCH_AUTO_FIX', 'false').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,10 @@
+import sqlite3
+import pathlib
+
+def connect(db_path: pathlib.Path) -> sqlite3.Connection:
+    """Opens a SQLite database in WAL mode, shareable across threads (callers serialize access)."""
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,17 @@
+import threading
+
+# Per-task change counters; background tasks bump them, SSE streams wait on them.
+_condition = threading.Condition()
+_versions = {}
+
+def publish(task_id: str):
+    """Signals that a task's progress, results or status changed."""
+    with _condition:
+        _versions[task_id] = _versions.get(task_id, 0) + 1
+        _condition.notify_all()
+
+def wait_for_update(task_id: str, last_version: int, timeout: float) -> int:
+    """Blocks until the task's version differs from last_version or timeout elapses; returns the current version."""
+    with _condition:
+        _condition.wait_for(lambda: _versions.get(task_id, 0) != last_version, timeout=timeout)
+        return _versions.get(task_id, 0)
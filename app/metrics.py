@@ -0,0 +1,148 @@
+import bisect
+import threading
+import time
+
+# Latency buckets in seconds, for everything from a compatibility check (microseconds) to a full probe of a slow mount
+SECONDS_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LONG_SECONDS_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+BYTES_BUCKETS = tuple(1 << shift for shift in range(20, 37, 2)) # 1 MiB .. 64 GiB
+SPEED_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+            lines.extend(self._render_series(key, value) for key, value in series)
+        return lines
+
+class Counter(_Metric):
+    """A monotonically increasing count, per label combination."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def _render_series(self, key, value) -> str:
+        return f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+class Gauge(_Metric):
+    """A value that is set rather than accumulated (e.g. queue length at scrape time)."""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+    def _render_series(self, key, value) -> str:
+        return f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+class Histogram(_Metric):
+    """Observations counted into fixed cumulative buckets, with their sum and count, per label combination."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: tuple, labelnames: tuple = ()):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket (not cumulative) counts, then the sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(((key, (list(counts), total)) for key, (counts, total) in self._series.items()), key=lambda item: item[0])
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+REGISTRY = []
+
+PROBE_SECONDS = Histogram("playarr_probe_seconds", "Wall time of ffprobe runs on cache misses, by outcome.", SECONDS_BUCKETS, ("outcome",))
+PROBE_CACHE_REQUESTS = Counter("playarr_probe_cache_requests_total", "Probe cache lookups, by result (hit, inode_hit, content_hit or miss).", ("result",))
+FILE_BYTES = Histogram("playarr_scanned_file_bytes", "Size of each media file analyzed by a scan.", BYTES_BUCKETS)
+CHECK_SECONDS = Histogram("playarr_compatibility_check_seconds", "Time to check one file against the compiled profile rules.", SECONDS_BUCKETS)
+DISCOVERY_SECONDS = Histogram("playarr_scan_discovery_seconds", "Time to walk a scan root and find all its media files.", LONG_SECONDS_BUCKETS)
+DISCOVERED_FILES = Counter("playarr_scan_discovered_files_total", "Media files found by scan directory walks.")
+FIX_SECONDS = Histogram("playarr_fix_ffmpeg_seconds", "Wall time of ffmpeg fix runs, by status.", LONG_SECONDS_BUCKETS, ("status",))
+FIX_SPEED = Histogram("playarr_fix_encode_speed", "Media seconds processed per wall-clock second by successful ffmpeg fix runs.", SPEED_BUCKETS)
+QUEUE_WAIT_SECONDS = Histogram("playarr_job_queue_wait_seconds", "Time jobs spent waiting in the scheduler queue, by kind.", LONG_SECONDS_BUCKETS, ("kind",))
+SCHEDULER_JOBS = Gauge("playarr_scheduler_jobs", "Scheduler jobs by state (running or queued) and kind.", ("state", "kind"))
+
+def render() -> str:
+    """The registry in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class TaskTimings:
+    """Thread-safe per-phase time totals and counts for one task, exposed as its "timings" status field.
+
+    Phase times are summed across worker threads, so with parallel workers they can add up to more than the task's wall time.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._phases = {}
+        self._counts = {}
+
+    def add(self, phase: str, seconds: float):
+        with self._lock:
+            totals = self._phases.setdefault(phase, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snapshot = {phase: {"count": count, "seconds": round(seconds, 3)} for phase, (count, seconds) in self._phases.items()}
+            snapshot.update(self._counts)
+        snapshot["wall_seconds"] = round(time.monotonic() - self._started, 3)
+        return snapshot
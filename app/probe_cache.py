@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import logging
+import pathlib
+import threading
+import utils
+from . import db
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+class ProbeCache:
+    """On-disk cache of raw ffprobe JSON, keyed by absolute path plus st_size and st_mtime_ns.
+
+    One row is kept per path; a changed size or mtime is a miss and the next put replaces the row.
+    Rows also record the file's identity, (st_dev, st_ino) and optionally a utils.file_fingerprint
+    content hash, so a probe follows the file to another path: find_by_inode matches hardlinks and
+    renames, find_by_content copies and cross-filesystem moves.
+    Each row also stores the compact fields compatibility checks need (utils.compatibility_fields),
+    so scan results can be re-evaluated without parsing full probes.
+    When the stored JSON exceeds max_bytes, least recently used rows are evicted.
+    """
+    TOUCH_BATCH_SIZE = 500
+
+    def __init__(self, db_path: pathlib.Path, max_bytes: int):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = db.connect(db_path)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS probe_cache (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    probe_json TEXT NOT NULL,
+                    nbytes INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_probe_cache_last_used ON probe_cache (last_used)")
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(probe_cache)")]
+            if "check_json" not in columns:
+                self._conn.execute("ALTER TABLE probe_cache ADD COLUMN check_json TEXT")
+            for column in ("dev INTEGER", "ino INTEGER", "content_hash TEXT"):
+                if column.split()[0] not in columns:
+                    self._conn.execute(f"ALTER TABLE probe_cache ADD COLUMN {column}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_probe_cache_inode ON probe_cache (dev, ino)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_probe_cache_content ON probe_cache (size, content_hash)")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM probe_cache").fetchone()[0]
+        self._pending_touches = []
+        self._pending_identities = []
+
+    def get(self, path: str, size: int, mtime_ns: int, dev: int | None = None, ino: int | None = None, content_hash_of=None) -> dict | None:
+        """Returns the stored probe of path while its size and mtime are unchanged.
+
+        Rows stored without an identity (before it was recorded, or with content hashing off) get it
+        backfilled on a hit, batched like the last_used touches: dev/ino when given, and the content hash
+        when `content_hash_of` (a callable returning it, e.g. reading the file) is given.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT probe_json, dev, content_hash FROM probe_cache WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, size, mtime_ns)).fetchone()
+            if row is None:
+                return None
+            self._pending_touches.append((time.time(), path))
+            if len(self._pending_touches) >= self.TOUCH_BATCH_SIZE:
+                self._flush_touches()
+        # Hashed outside the lock: it reads the file
+        content_hash = content_hash_of() if row[2] is None and content_hash_of else None
+        if (row[1] is None and ino) or content_hash:
+            with self._lock:
+                self._pending_identities.append((dev if ino else None, ino or None, content_hash, path))
+        try:
+            return json.loads(row[0])
+        except json.JSONDecodeError:
+            return None
+
+    def find_by_inode(self, path: str, size: int, mtime_ns: int, dev: int, ino: int) -> dict | None:
+        """Finds the probe of a hardlink or renamed file stored under another path (same inode, size and mtime); see _adopt."""
+        return self._find_elsewhere(
+            "SELECT path, probe_json FROM probe_cache WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ? AND path != ? LIMIT 1",
+            (dev, ino, size, mtime_ns, path), path, size, mtime_ns, dev, ino, None)
+
+    def find_by_content(self, path: str, size: int, mtime_ns: int, dev: int | None, ino: int | None, content_hash: str) -> dict | None:
+        """Finds the probe of a copied or cross-filesystem moved file stored under another path (same size and content hash)."""
+        return self._find_elsewhere(
+            "SELECT path, probe_json FROM probe_cache WHERE size = ? AND content_hash = ? AND path != ? LIMIT 1",
+            (size, content_hash, path), path, size, mtime_ns, dev, ino, content_hash)
+
+    def _find_elsewhere(self, query: str, params: tuple, path: str, size: int, mtime_ns: int, dev, ino, content_hash) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+        if row is None:
+            return None
+        try:
+            media_info = json.loads(row[1])
+        except json.JSONDecodeError:
+            return None
+        # Checked outside the lock: a stat can be slow on network mounts
+        self._adopt(row[0], path, size, mtime_ns, dev, ino, content_hash, moved=not os.path.lexists(row[0]))
+        return media_info
+
+    def _adopt(self, source_path: str, path: str, size: int, mtime_ns: int, dev: int, ino: int, content_hash: str | None, moved: bool):
+        """Stores the row of source_path under path with the file's current identity, so the next lookup is a plain get().
+        moved=True (the old path no longer exists, i.e. a rename) drops the source row; otherwise it is kept (hardlink or copy)."""
+        with self._lock:
+            previous = self._conn.execute("SELECT nbytes FROM probe_cache WHERE path = ?", (path,)).fetchone()
+            with self._conn:
+                copied = self._conn.execute(
+                    "INSERT OR REPLACE INTO probe_cache (path, size, mtime_ns, probe_json, check_json, nbytes, last_used, dev, ino, content_hash) "
+                    "SELECT ?, ?, ?, probe_json, check_json, nbytes, ?, ?, ?, COALESCE(?, content_hash) FROM probe_cache WHERE path = ?",
+                    (path, size, mtime_ns, time.time(), dev, ino, content_hash, source_path))
+                if copied.rowcount == 0:
+                    return # Evicted or replaced meanwhile
+                nbytes = self._conn.execute("SELECT nbytes FROM probe_cache WHERE path = ?", (path,)).fetchone()[0]
+                self._total_bytes += nbytes - (previous[0] if previous else 0)
+                if moved:
+                    self._conn.execute("DELETE FROM probe_cache WHERE path = ?", (source_path,))
+                    self._total_bytes -= nbytes
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def get_many(self, entries: list[tuple]) -> dict:
+        """Returns {path: compatibility fields} for each (path, size, mtime_ns) whose stored probe is of exactly that file version.
+
+        Used to re-evaluate a finished scan from the size and mtime its results recorded. Paths whose row was evicted
+        or replaced by a probe of a newer version are left out.
+        """
+        wanted = {path: (size, mtime_ns) for path, size, mtime_ns in entries}
+        paths = list(wanted)
+        found = {}
+        chunk_size = 500 # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(paths), chunk_size):
+            chunk = paths[start:start + chunk_size]
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT path, size, mtime_ns, COALESCE(check_json, probe_json) FROM probe_cache WHERE path IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchall()
+            for path, size, mtime_ns, check_json in rows:
+                if wanted[path] != (size, mtime_ns):
+                    continue
+                try:
+                    found[path] = json.loads(check_json)
+                except json.JSONDecodeError:
+                    continue
+        return found
+
+    def put(self, path: str, size: int, mtime_ns: int, media_info: dict, dev: int | None = None, ino: int | None = None, content_hash: str | None = None):
+        probe_json = json.dumps(media_info, separators=(',', ':'))
+        check_json = json.dumps(utils.compatibility_fields(media_info), separators=(',', ':'))
+        nbytes = len(probe_json) + len(check_json)
+        with self._lock:
+            previous = self._conn.execute("SELECT nbytes FROM probe_cache WHERE path = ?", (path,)).fetchone()
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO probe_cache (path, size, mtime_ns, probe_json, check_json, nbytes, last_used, dev, ino, content_hash) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, size, mtime_ns, probe_json, check_json, nbytes, time.time(), dev, ino or None, content_hash))
+            self._total_bytes += nbytes - (previous[0] if previous else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def flush(self):
+        with self._lock:
+            self._flush_touches()
+
+    def clear(self) -> int:
+        """Invalidates every cached probe. Returns the number of entries removed."""
+        with self._lock:
+            with self._conn:
+                removed = self._conn.execute("DELETE FROM probe_cache").rowcount
+            self._total_bytes = 0
+            self._pending_touches.clear()
+            self._pending_identities.clear()
+            self._conn.execute("VACUUM")
+        logger.info(f"Probe cache cleared ({removed} entries).")
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM probe_cache").fetchone()[0]
+            return {"entries": entries, "bytes": self._total_bytes, "max_bytes": self.max_bytes, "path": str(self.db_path)}
+
+    def _flush_touches(self):
+        if not self._pending_touches and not self._pending_identities:
+            return
+        with self._conn:
+            self._conn.executemany("UPDATE probe_cache SET last_used = ? WHERE path = ?", self._pending_touches)
+            self._conn.executemany("UPDATE probe_cache SET dev = COALESCE(dev, ?), ino = COALESCE(ino, ?), content_hash = COALESCE(content_hash, ?) "
+                                   "WHERE path = ?", self._pending_identities)
+        self._pending_touches.clear()
+        self._pending_identities.clear()
+
+    def _evict(self):
+        """Drops least recently used rows until the cache is back under 90% of max_bytes."""
+        self._flush_touches()
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        with self._conn:
+            for path, nbytes in self._conn.execute("SELECT path, nbytes FROM probe_cache ORDER BY last_used").fetchall():
+                if self._total_bytes <= target:
+                    break
+                self._conn.execute("DELETE FROM probe_cache WHERE path = ?", (path,))
+                self._total_bytes -= nbytes
+                evicted += 1
+        logger.info(f"Probe cache evicted {evicted} entries ({self._total_bytes} bytes remain).")
+
+_probe_cache = None
+_probe_cache_failed = False
+_probe_cache_lock = threading.Lock()
+
+def get_probe_cache() -> ProbeCache | None:
+    """Returns the process-wide probe cache, or None when it is disabled or cannot be opened."""
+    global _probe_cache, _probe_cache_failed
+    if not Config.PROBE_CACHE_ENABLED or _probe_cache_failed:
+        return None
+    with _probe_cache_lock:
+        if _probe_cache is None and not _probe_cache_failed:
+            db_path = pathlib.Path(Config.CONFIG_DIR) / "cache" / "probe_cache.db"
+            try:
+                _probe_cache = ProbeCache(db_path, Config.PROBE_CACHE_MAX_MB * 1024 * 1024)
+            except Exception as e:
+                logger.error(f"Could not open probe cache at {db_path}: {e}")
+                _probe_cache_failed = True
+        return _probe_cache
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import logging
+import pathlib
+import threading
+import utils
+from .config import Config
+from .scan_history import profile_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Profile keys holding codec/container names; other keys besides max_h264_level (description, notes...) are free-form
+CODEC_LIST_KEYS = ("supported_containers", "unsupported_containers_strict", "supported_video_codecs", "unsupported_video_codecs_strict",
+                   "supported_audio_codecs", "unsupported_audio_codecs_strict", "supported_subtitle_codecs", "unsupported_subtitle_formats")
+
+def validate_profile(profile) -> list[str]:
+    """Checks a parsed profile against the profile schema. Returns the problems found (empty when valid)."""
+    if not isinstance(profile, dict):
+        return ["Profile must be a JSON object."]
+    errors = []
+    for key in CODEC_LIST_KEYS:
+        value = profile.get(key)
+        if value is not None and not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+            errors.append(f"'{key}' must be a list of strings.")
+    max_level = profile.get("max_h264_level")
+    if max_level is not None and (isinstance(max_level, bool) or not isinstance(max_level, (int, float)) or max_level <= 0):
+        errors.append("'max_h264_level' must be a positive number (e.g. 41 for level 4.1).")
+    for key in ("description", "notes"):
+        if profile.get(key) is not None and not isinstance(profile[key], str):
+            errors.append(f"'{key}' must be a string.")
+    return errors
+
+class LoadedProfile:
+    """A parsed and validated profile file, with its compiled rules and scan_history fingerprint."""
+    __slots__ = ("name", "data", "rules", "fingerprint", "signature")
+
+    def __init__(self, name: str, data: dict, signature: tuple):
+        self.name = name
+        self.data = data
+        self.rules = utils.compile_profile(data)
+        self.fingerprint = profile_fingerprint(data)
+        self.signature = signature
+
+class ProfileRegistry:
+    """Process-wide cache of the profile JSON files in a directory.
+
+    Each file is parsed, validated (validate_profile) and compiled once, and again only when its
+    mtime or size changes. The directory is re-checked at most every `recheck_seconds`, or on the
+    next access after invalidate() (called by the profile API routes that write files). Invalid files are left out
+    and reported by errors(). Profile dicts are shared between callers and must not be modified.
+    """
+
+    def __init__(self, profiles_dir: pathlib.Path, recheck_seconds: float):
+        self.profiles_dir = pathlib.Path(profiles_dir)
+        self.recheck_seconds = recheck_seconds
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._errors = {}
+        self._checked_at = None
+
+    def entries(self) -> dict:
+        """Returns {name: LoadedProfile} for every valid profile, as one consistent snapshot."""
+        return self._current()
+
+    def profiles(self) -> dict:
+        """Returns {name: profile dict} for every valid profile."""
+        return {name: entry.data for name, entry in self._current().items()}
+
+    def entry(self, name: str) -> LoadedProfile | None:
+        return self._current().get(name)
+
+    def get(self, name: str) -> dict | None:
+        entry = self.entry(name)
+        return entry.data if entry else None
+
+    def rules(self, name: str) -> utils.CompiledProfile | None:
+        entry = self.entry(name)
+        return entry.rules if entry else None
+
+    def errors(self) -> dict:
+        """Returns {file name: problem} for profile files that couldn't be loaded."""
+        self._current()
+        with self._lock:
+            return {file_name: message for file_name, (_, message) in self._errors.items()}
+
+    def invalidate(self, name: str | None = None):
+        """Makes the next access re-check the directory. A named profile is re-read even if its mtime and size
+        look unchanged (two saves within the filesystem's timestamp granularity)."""
+        with self._lock:
+            self._checked_at = None
+            if name is not None:
+                # Replaced rather than modified: callers may hold the previous snapshot
+                self._entries = {entry_name: entry for entry_name, entry in self._entries.items() if entry_name != name}
+                self._errors.pop(f"{name}.json", None)
+
+    def _current(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is None or now - self._checked_at >= self.recheck_seconds:
+                self._refresh()
+                self._checked_at = now
+            return self._entries
+
+    def _refresh(self):
+        """Re-reads new or changed profile files and drops deleted ones; callers hold the lock."""
+        try:
+            with os.scandir(self.profiles_dir) as dir_entries:
+                files = {dir_entry.name: dir_entry.stat() for dir_entry in dir_entries if dir_entry.name.endswith(".json") and dir_entry.is_file()}
+        except OSError as e:
+            if self._entries or self._checked_at is None:
+                logger.warning(f"Profiles directory {self.profiles_dir} can't be read: {e}")
+            self._entries = {}
+            return
+        entries = {}
+        errors = {}
+        for file_name, file_stat in files.items():
+            name = file_name[:-len(".json")]
+            signature = (file_stat.st_mtime_ns, file_stat.st_size)
+            current = self._entries.get(name)
+            if current is not None and current.signature == signature:
+                entries[name] = current
+                continue
+            if file_name in self._errors and self._errors[file_name][0] == signature:
+                errors[file_name] = self._errors[file_name] # Unchanged and still broken; don't log it again
+                continue
+            try:
+                with open(self.profiles_dir / file_name, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                problems = validate_profile(data)
+                if problems:
+                    raise ValueError(" ".join(problems))
+                entries[name] = LoadedProfile(name, data, signature)
+                logger.info(f"Profile '{name}' {'reloaded' if current else 'loaded'}.")
+            except (OSError, ValueError) as e: # json.JSONDecodeError is a ValueError
+                logger.warning(f"Skipping profile file '{file_name}': {e}")
+                errors[file_name] = (signature, str(e))
+        self._entries = entries
+        self._errors = errors
+
+_profile_registry = None
+_profile_registry_lock = threading.Lock()
+
+def get_profile_registry() -> ProfileRegistry:
+    """Returns the process-wide registry of the profiles in Config.PROFILES_DIR."""
+    global _profile_registry
+    with _profile_registry_lock:
+        if _profile_registry is None:
+            _profile_registry = ProfileRegistry(Config.PROFILES_DIR, Config.PROFILE_RECHECK_SECONDS)
+        return _profile_registry
@@ -0,0 +1,174 @@
+import os
+import sys
+import array
+import threading
+
+# Scan result fields held in slots; anything else on an item (verdicts, change, message...) goes to `extra`.
+_FIELDS = ("is_compatible", "reason", "error", "container", "video_details", "subtitle_codecs", "duration", "size", "mtime_ns")
+_AUDIO_KEYS = ("index", "codec", "language", "title", "channels", "channel_layout")
+_AUDIO_KEY_SET = frozenset(_AUDIO_KEYS)
+_KNOWN_KEYS = frozenset(("file_path", "relative_path", "audio_tracks", *_FIELDS))
+
+# Result fields /api/tasks/<id>/results can sort by; the first four can also be filtered on by exact value.
+RESULT_SORT_FIELDS = ("is_compatible", "container", "video_codec", "relative_path", "duration", "reason")
+INDEXED_FIELDS = ("is_compatible", "container", "video_codec", "audio_codec")
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+def _video_codec(video_details) -> str | None:
+    return video_details.split(" ", 1)[0] if isinstance(video_details, str) and video_details not in ("", "N/A") else None
+
+def index_fields(item) -> dict:
+    """The queryable fields of a result item. audio_codecs is the set of its audio track codecs."""
+    if not isinstance(item, dict):
+        item = {}
+    is_compatible = item.get("is_compatible")
+    return {
+        "is_compatible": is_compatible if isinstance(is_compatible, bool) else None,
+        "container": item.get("container"),
+        "video_codec": _video_codec(item.get("video_details")),
+        "relative_path": item.get("relative_path"),
+        "duration": item.get("duration"),
+        "reason": item.get("reason"),
+        "audio_codecs": {track.get("codec") for track in item.get("audio_tracks") or () if isinstance(track, dict) and track.get("codec")}
+    }
+
+class ScanResult:
+    """One scan result item, packed: codec/container/reason strings are interned, audio tracks are tuples,
+    and only the root-relative path is kept (the list holds the root once). to_dict() restores the JSON shape."""
+    __slots__ = ("relative_path", "audio_tracks", "extra", *_FIELDS)
+
+    @classmethod
+    def pack(cls, root: str, item: dict) -> "ScanResult":
+        record = cls.__new__(cls)
+        record.relative_path = item.get("relative_path")
+        record.is_compatible = item.get("is_compatible")
+        record.reason = _intern(item.get("reason"))
+        record.error = item.get("error")
+        record.container = _intern(item.get("container"))
+        record.video_details = _intern(item.get("video_details"))
+        record.subtitle_codecs = tuple(_intern(codec) for codec in item.get("subtitle_codecs") or ())
+        record.duration = item.get("duration")
+        record.size = item.get("size")
+        record.mtime_ns = item.get("mtime_ns")
+        record.audio_tracks = tuple(
+            tuple(_intern(track[key]) for key in _AUDIO_KEYS) if isinstance(track, dict) and track.keys() == _AUDIO_KEY_SET else track
+            for track in item.get("audio_tracks") or ())
+        extra = {key: value for key, value in item.items() if key not in _KNOWN_KEYS}
+        file_path = item.get("file_path")
+        if file_path is not None and (record.relative_path is None or file_path != os.path.join(root, record.relative_path)):
+            extra["file_path"] = file_path # Not derivable from the root; keep it verbatim
+        record.extra = extra or None
+        return record
+
+    def to_dict(self, root: str) -> dict:
+        item = {
+            "file_path": os.path.join(root, self.relative_path) if self.relative_path is not None else None,
+            "relative_path": self.relative_path,
+            "is_compatible": self.is_compatible,
+            "reason": self.reason,
+            "error": self.error,
+            "container": self.container,
+            "video_details": self.video_details,
+            "audio_tracks": [dict(zip(_AUDIO_KEYS, track)) if isinstance(track, tuple) else track for track in self.audio_tracks],
+            "subtitle_codecs": list(self.subtitle_codecs),
+            "duration": self.duration,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns
+        }
+        if self.extra:
+            item.update(self.extra)
+        return item
+
+class CompactResultList:
+    """In-memory result list of a scan, storing ScanResult records under one root.
+
+    Behaves like the list of result dicts it replaces (append, len, iteration, indexing, slicing);
+    items are packed on append and converted back to dicts only when read. Items that aren't
+    file results (e.g. {"message": ...}) are kept as they are.
+    Appends also maintain per-value position lists for INDEXED_FIELDS, used by query().
+    With pack=False items are kept as they are, to query results that aren't scan items (e.g. fix outcomes).
+    """
+
+    def __init__(self, root: str, items=(), pack: bool = True):
+        self.root = str(root)
+        self.pack = pack
+        self._records = []
+        self._index = {field: {} for field in INDEXED_FIELDS}
+        self._lock = threading.Lock()
+        for item in items:
+            self.append(item)
+
+    def append(self, item: dict):
+        record = ScanResult.pack(self.root, item) if self.pack and isinstance(item, dict) and item.get("relative_path") is not None else item
+        fields = index_fields(item)
+        with self._lock:
+            position = len(self._records)
+            self._records.append(record)
+            for field in ("is_compatible", "container", "video_codec"):
+                self._add_position(field, fields[field], position)
+            for codec in fields["audio_codecs"]:
+                self._add_position("audio_codec", codec, position)
+
+    def _add_position(self, field: str, value, position: int):
+        positions = self._index[field].get(value)
+        if positions is None:
+            # 4 bytes per entry instead of a pointer plus an int object
+            positions = self._index[field][value] = array.array("I")
+        positions.append(position)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def _unpack(self, record):
+        return record.to_dict(self.root) if isinstance(record, ScanResult) else record
+
+    def __len__(self):
+        return len(self._records)
+
+    def __bool__(self):
+        return bool(self._records)
+
+    def __getitem__(self, index):
+        with self._lock:
+            records = self._records[index]
+        if isinstance(index, slice):
+            return [self._unpack(record) for record in records]
+        return self._unpack(records)
+
+    def __iter__(self):
+        for start in range(0, len(self._records), 1000):
+            yield from self[start:start + 1000]
+
+    def query(self, filters: dict, sort: str | None = None, descending: bool = False, offset: int = 0, limit: int = 100) -> tuple[int, list]:
+        """Filters, sorts and pages the results; see TaskStore.query_results for the filters. Returns (total matches, page)."""
+        with self._lock:
+            records = list(self._records)
+            candidates = None
+            for field in INDEXED_FIELDS:
+                if field in filters:
+                    positions = self._index[field].get(filters[field], ())
+                    candidates = set(positions) if candidates is None else candidates.intersection(positions)
+        positions = sorted(candidates) if candidates is not None else range(len(records))
+        reason = (filters.get("reason") or "").lower()
+        path_prefix = filters.get("path_prefix")
+        if sort or reason or path_prefix:
+            fields = {position: self._fields(records[position]) for position in positions}
+            if reason:
+                positions = [position for position in positions if reason in (fields[position]["reason"] or "").lower()]
+            if path_prefix:
+                positions = [position for position in positions if (fields[position]["relative_path"] or "").startswith(path_prefix)]
+            if sort:
+                # Missing values first when ascending, last when descending (as SQLite orders NULLs)
+                positions = sorted(positions, key=lambda position: (fields[position][sort] is not None, fields[position][sort]), reverse=descending)
+        page = positions[offset:offset + limit]
+        return len(positions), [self._unpack(records[position]) for position in page]
+
+    def _fields(self, record) -> dict:
+        if not isinstance(record, ScanResult):
+            return index_fields(record)
+        return {"is_compatible": record.is_compatible if isinstance(record.is_compatible, bool) else None, "container": record.container,
+                "video_codec": _video_codec(record.video_details), "relative_path": record.relative_path,
+                "duration": record.duration, "reason": record.reason}
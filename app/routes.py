@@ -1,10 +1,20 @@
-from flask import Blueprint, render_template, request, jsonify, abort
+from flask import Blueprint, render_template, request, jsonify, abort, Response
 import pathlib
 import uuid
-import threading
 import os
+import time
+import logging
 import utils
-from .tasks import run_scan_task, run_fix_task
+from .tasks import run_scan_task, run_fix_task, reevaluate_results, BACKUP_METHODS
+from .probe_cache import get_probe_cache
+from .task_store import get_task_store, TERMINAL_STATUSES
+from .scheduler import JobScheduler, QueueFullError, PRIORITIES
+from .result_records import CompactResultList, RESULT_SORT_FIELDS
+from .scan_history import get_scan_history
+from .profiles import get_profile_registry, validate_profile
+from .watcher import start_library_watcher
+from .config import Config
+from . import events, metrics
 import pathlib
 import os
 
@@ -28,29 +38,47 @@ def help_page():
 
 @main_bp.route('/restart-tasks', methods=['POST'])
 def restart_tasks():
-    # Implement restart tasks logic here
-    # For now, just return success
+    """Re-queues every interrupted scan and fix through the scheduler."""
     from flask import current_app
 
     current_app.logger.info("Restart tasks requested")
-    return jsonify({'status': 'success', 'message': 'Tasks restarted'})
+    if _task_store is None:
+        return jsonify({'status': 'success', 'message': 'Task store is disabled; nothing to restart', 'restarted': [], 'failed': {}})
+    restarted, failed = [], {}
+    for interrupted in _task_store.interrupted_tasks():
+        task_id = interrupted["task_id"]
+        error, status_code = _resume_through_scheduler(task_id)
+        if error:
+            failed[task_id] = error
+        else:
+            restarted.append(task_id)
+    return jsonify({'status': 'success', 'message': f'{len(restarted)} task(s) restarted', 'restarted': restarted, 'failed': failed})
 
 @main_bp.route('/stop-tasks', methods=['POST'])
 def stop_tasks():
-    # Implement stop tasks logic here
-    # For now, just return success
+    """Drops every queued job and asks every running one to stop."""
     from flask import current_app
 
     current_app.logger.info("Stop tasks requested")
-    return jsonify({'status': 'success', 'message': 'Tasks stopped'})
+    stopped = scheduler.stop_all()
+    return jsonify({'status': 'success', 'message': 'Tasks stopped', **stopped})
 
 def sanitize_filename(name):
     return utils.sanitize_filename(name)
 
 def get_current_profiles():
-    return utils.load_profiles(pathlib.Path(os.environ.get('CONFIG_DIR', '/config')) / "profiles")
+    return get_profile_registry().profiles()
 
-tasks = {}  # In-memory task store
+def _make_scheduler(tasks) -> JobScheduler:
+    return JobScheduler(tasks, Config.SCHEDULER_MAX_JOBS, {"scan": Config.SCHEDULER_MAX_SCANS, "fix": Config.SCHEDULER_MAX_FIXES},
+                        Config.SCHEDULER_MAX_QUEUED)
+
+# Replaced by start_services() when the app factory starts the background services
+_task_store = None
+tasks = {}  # In-memory fallback when the task store is disabled or not opened
+scheduler = _make_scheduler(tasks)
+watcher = None
+_services_started = False
 
 from datetime import timedelta
 import json
@@ -85,42 +113,239 @@ def faq():
 
 from flask import current_app
 
+def _save_task_params(task_id: str, params: dict):
+    """Records a task's request parameters so it can be resumed after a restart."""
+    if _task_store is not None:
+        _task_store.save_params(task_id, params)
+
 @main_bp.route('/api/scan', methods=['POST'])
 def start_scan():
     """API endpoint to start an adaptively recursive scan task."""
     global tasks
     data = request.json
     directory = data.get('directory')
-    profile_name = data.get('profile_name')
+    profile_names = data.get('profile_names')
+    if profile_names is not None and (not isinstance(profile_names, list) or not all(isinstance(name, str) for name in profile_names)):
+        return jsonify({"error": "'profile_names' must be a list of profile names."}), 400
+    profile_name = data.get('profile_name') or (profile_names[0] if profile_names else None)
     if not directory:
         return jsonify({"error": "Missing directory parameter"}), 400
     if not profile_name:
         return jsonify({"error": "Missing profile name parameter"}), 400
-    current_profiles = get_current_profiles()
-    if profile_name not in current_profiles:
-        return jsonify({"error": f"Profile '{profile_name}' not found."}), 400
+    loaded_profiles = get_profile_registry().entries()
+    for name in [profile_name, *(profile_names or [])]:
+        if name not in loaded_profiles:
+            return jsonify({"error": f"Profile '{name}' not found."}), 400
+    extra_profiles = {name: loaded_profiles[name].data for name in profile_names or [] if name != profile_name}
+    extra_rules = {name: loaded_profiles[name].rules for name in extra_profiles}
     scan_dir = pathlib.Path(directory)
     if not scan_dir.is_dir():
         return jsonify({"error": f"Scan directory '{directory}' not found."}), 400
-    selected_profile_data = current_profiles[profile_name]
+    workers = data.get('workers')
+    if workers is not None and (not isinstance(workers, int) or workers < 1):
+        return jsonify({"error": "'workers' must be a positive integer."}), 400
+    mode = data.get('mode', 'full')
+    if mode not in ('full', 'incremental'):
+        return jsonify({"error": "'mode' must be 'full' or 'incremental'."}), 400
+    priority = data.get('priority', 'normal')
+    if priority not in PRIORITIES:
+        return jsonify({"error": f"'priority' must be one of: {', '.join(PRIORITIES)}."}), 400
+    selected_profile = loaded_profiles[profile_name]
     task_id = f"scan_{uuid.uuid4()}"
-    thread = threading.Thread(target=run_scan_task, args=(task_id, scan_dir, selected_profile_data, tasks, current_app.logger))
-    thread.daemon = True
-    thread.start()
-    current_app.logger.info(f"Task {task_id}: Queued ADAPTIVE scan for '{directory}', profile '{profile_name}'.")
-    return jsonify({"message": "Scan queued", "task_id": task_id}), 202
+    tasks[task_id] = {"status": "queued", "cancel_requested": False}
+    _save_task_params(task_id, {"directory": directory, "profile_name": profile_name, "profile_names": profile_names,
+                                "workers": workers, "mode": mode})
+    dedupe_key = ("scan", os.path.abspath(directory), profile_name, tuple(profile_names or []), mode)
+    try:
+        queued_id, deduplicated = scheduler.submit(
+            task_id, "scan", run_scan_task, (task_id, scan_dir, selected_profile.data, tasks, current_app.logger),
+            {"workers": workers, "profile_name": profile_name, "mode": mode, "extra_profiles": extra_profiles or None, "rules": selected_profile.rules,
+             "extra_rules": extra_rules or None},
+            priority=priority, dedupe_key=dedupe_key)
+    except QueueFullError as e:
+        del tasks[task_id]
+        return jsonify({"error": str(e)}), 429
+    if deduplicated:
+        del tasks[task_id]
+        current_app.logger.info(f"Task {queued_id}: Identical scan of '{directory}' already queued or running; not starting another.")
+        return jsonify({"message": "Identical scan already queued or running", "task_id": queued_id, "deduplicated": True}), 200
+    current_app.logger.info(f"Task {task_id}: Queued ADAPTIVE {mode} scan for '{directory}', profile '{profile_name}' (priority {priority}).")
+    return jsonify({"message": "Scan queued", "task_id": task_id, "queue_position": tasks[task_id].get("queue_position")}), 202
+
+STATUS_FIELDS = ["status", "progress", "processed_count", "total_files", "discovery_complete", "current_file", "active_files", "encode_speed", "eta_seconds", "transcode_seconds_saved", "error", "mode", "changes", "deleted_files", "profile_matrix", "queue_position", "probe_tiers", "timings"]
+MAX_RESULTS_PER_POLL = 2000
+
+def _status_snapshot(task: dict) -> dict:
+    """Copies the status counters of a task; nested dicts are copied since worker threads mutate them."""
+    snapshot = {}
+    for key in STATUS_FIELDS:
+        value = task.get(key)
+        if value is not None:
+            snapshot[key] = dict(value) if isinstance(value, dict) else value
+    return snapshot
 
 @main_bp.route('/api/status/<task_id>', methods=['GET'])
 def get_status(task_id):
-    """API endpoint to get the status and partial/full results of a task."""
+    """API endpoint to get the progress counters of a task.
+
+    Results are only included when the client passes ?since=<cursor>: the response then carries the
+    records appended after that cursor (at most `limit`), plus the cursor to send on the next poll.
+    """
     task = tasks.get(task_id)
     if not task:
         return jsonify({"error": "Task not found"}), 404
-    response_data = {key: task.get(key) for key in ["status", "progress", "processed_count", "total_files", "current_file", "error", "result"] if task.get(key) is not None or key == 'result'}
-    if 'result' not in response_data:
-        response_data['result'] = []
+    response_data = _status_snapshot(task)
+    results = task.get("result") or []
+    result_count = len(results)
+    response_data["result_count"] = result_count
+    since = request.args.get('since', type=int)
+    if since is not None:
+        limit = min(max(request.args.get('limit', MAX_RESULTS_PER_POLL, type=int), 1), MAX_RESULTS_PER_POLL)
+        if since < 0 or since > result_count:
+            # The result list was replaced (e.g. by a "no media files" message); start over.
+            response_data["reset"] = True
+            since = 0
+        delta = results[since:since + limit]
+        response_data["result"] = delta
+        response_data["cursor"] = since + len(delta)
+        response_data["has_more"] = since + len(delta) < result_count
     return jsonify(response_data)
 
+SSE_KEEPALIVE_SECONDS = 15
+# Upper bound on how long a stream waits before re-reading the task; other worker processes don't publish to this one
+SSE_POLL_SECONDS = 1.0
+
+def _sse_message(event: str, data: dict, event_id: int | None = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+@main_bp.route('/api/tasks/<task_id>/results', methods=['GET'])
+def query_task_results(task_id):
+    """Filtered, sorted page of a task's results, so the dashboard doesn't download and filter everything.
+
+    Query parameters: compatible=true|false, container, video_codec, audio_codec (exact), reason
+    (substring), path_prefix (relative path), sort (one of RESULT_SORT_FIELDS), order=asc|desc,
+    offset and limit (at most MAX_RESULTS_PER_POLL).
+    """
+    task = tasks.get(task_id)
+    if not task:
+        return jsonify({"error": "Task not found"}), 404
+    filters = {}
+    compatible = request.args.get('compatible')
+    if compatible is not None:
+        if compatible.lower() not in ('true', 'false'):
+            return jsonify({"error": "'compatible' must be 'true' or 'false'."}), 400
+        filters["is_compatible"] = compatible.lower() == 'true'
+    for field in ('container', 'video_codec', 'audio_codec', 'reason', 'path_prefix'):
+        value = request.args.get(field)
+        if value:
+            filters[field] = value
+    sort = request.args.get('sort')
+    if sort is not None and sort not in RESULT_SORT_FIELDS:
+        return jsonify({"error": f"'sort' must be one of: {', '.join(RESULT_SORT_FIELDS)}."}), 400
+    order = request.args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        return jsonify({"error": "'order' must be 'asc' or 'desc'."}), 400
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), MAX_RESULTS_PER_POLL)
+    if _task_store is not None:
+        total, page = _task_store.query_results(task_id, filters, sort, order == 'desc', offset, limit)
+    else:
+        results = task.get("result") or []
+        if not isinstance(results, CompactResultList):
+            # Only scan results have the shape ScanResult packs; fix outcomes and the like are queried as they are
+            results = CompactResultList("", results, pack=task_id.startswith("scan_"))
+        total, page = results.query(filters, sort, order == 'desc', offset, limit)
+    return jsonify({"task_id": task_id, "total": total, "offset": offset, "limit": limit, "result": page})
+
+@main_bp.route('/api/tasks/<task_id>/events', methods=['GET'])
+def task_events(task_id):
+    """Server-Sent Events stream of a task: 'results' deltas, 'progress' counters and a final 'done' event.
+
+    Resumes from ?since=<cursor> (or the Last-Event-ID header sent by a reconnecting EventSource).
+    """
+    if task_id not in tasks:
+        return jsonify({"error": "Task not found"}), 404
+    cursor = request.args.get('since', type=int)
+    if cursor is None:
+        cursor = request.headers.get('Last-Event-ID', 0, type=int)
+
+    def generate(cursor):
+        version = -1
+        last_progress = None
+        last_sent = time.monotonic()
+        while True:
+            version = events.wait_for_update(task_id, version, timeout=SSE_POLL_SECONDS)
+            task = tasks.get(task_id)
+            if task is None:
+                yield _sse_message("error", {"error": "Task not found"})
+                return
+            results = task.get("result") or []
+            reset = cursor > len(results)
+            if reset:
+                cursor = 0
+            while cursor < len(results) or reset:
+                chunk = results[cursor:cursor + MAX_RESULTS_PER_POLL]
+                cursor += len(chunk)
+                yield _sse_message("results", {"result": chunk, "cursor": cursor, "reset": reset}, event_id=cursor)
+                reset = False
+                last_sent = time.monotonic()
+            progress = _status_snapshot(task)
+            progress["result_count"] = len(results)
+            if progress.get("status") in TERMINAL_STATUSES:
+                yield _sse_message("done", progress)
+                return
+            if progress != last_progress:
+                yield _sse_message("progress", progress)
+                last_progress = progress
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+
+    return Response(generate(cursor), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@main_bp.route('/api/tasks/<task_id>/reevaluate', methods=['POST'])
+def reevaluate_task(task_id):
+    """Re-checks a finished scan's results against a (possibly edited) profile without re-running ffprobe.
+
+    The new results become a separate completed task; the response lists the files whose verdict changed, and
+    as "missing" those without stored probe data for the scanned version (their verdict is kept; rescan to update them).
+    """
+    source_task = tasks.get(task_id)
+    if not source_task:
+        return jsonify({"error": "Task not found"}), 404
+    if not (task_id.startswith("scan_") or task_id.startswith("reeval_")):
+        return jsonify({"error": "Only scan results can be re-evaluated."}), 400
+    if source_task.get("status") not in ("completed", "cancelled"):
+        return jsonify({"error": f"Task cannot be re-evaluated in status: {source_task.get('status')}"}), 409
+    data = request.get_json(silent=True) or {}
+    profile_name = data.get('profile_name')
+    if not profile_name:
+        return jsonify({"error": "Missing profile name parameter"}), 400
+    selected_profile = get_profile_registry().entry(profile_name)
+    if selected_profile is None:
+        return jsonify({"error": f"Profile '{profile_name}' not found."}), 400
+    new_task_id = f"reeval_{uuid.uuid4()}"
+    started = time.monotonic()
+    changed, missing = reevaluate_results(new_task_id, list(source_task.get("result") or []), selected_profile.data, tasks, current_app.logger,
+                                          rules=selected_profile.rules)
+    new_task = tasks[new_task_id]
+    return jsonify({
+        "task_id": new_task_id,
+        "source_task_id": task_id,
+        "profile_name": profile_name,
+        "total_files": new_task["total_files"],
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+        **new_task["changes"],
+        "changed": changed,
+        "missing_files": missing
+    }), 200
+
 @main_bp.route('/api/stop_task/<task_id>', methods=['POST'])
 def stop_task(task_id):
     """API endpoint to request cancellation of a running task."""
@@ -130,9 +355,13 @@ def stop_task(task_id):
     if not task:
         return jsonify({"error": "Task not found"}), 404
     current_status = task.get('status')
+    if current_status == 'queued' and scheduler.cancel_queued(task_id):
+        current_app.logger.info(f"Task {task_id}: Cancelled before it started.")
+        return jsonify({"message": "Task cancelled"}), 200
     if current_status in ['running', 'queued', 'cancelling']:
         tasks[task_id]['cancel_requested'] = True
         tasks[task_id]['status'] = 'cancelling'
+        events.publish(task_id)
         current_app.logger.info(f"Task {task_id}: Cancellation requested.")
         return jsonify({"message": "Cancellation requested"}), 200
     else:
@@ -159,7 +388,6 @@ def get_profile_content(profile_name):
         content = pathlib.Path(profile_path).read_text(encoding='utf-8')
         return jsonify({"profile_name": safe_name, "content": content})
     except Exception as e:
-        from flask import current_app
         current_app.logger.error(f"Error reading profile {profile_path}: {e}")
         abort(500, description="Could not read profile.")
 
@@ -177,11 +405,15 @@ def save_profile_content(profile_name):
     content_str = request.json['content']
     import json
     try:
-        json.loads(content_str)  # Validate JSON
+        profile_data = json.loads(content_str)  # Validate JSON
     except Exception as e:
         return jsonify({"error": f"Invalid JSON format: {e}"}), 400
+    problems = validate_profile(profile_data)
+    if problems:
+        return jsonify({"error": f"Invalid profile: {' '.join(problems)}", "problems": problems}), 400
     try:
         pathlib.Path(profile_path).write_text(content_str, encoding='utf-8')
+        get_profile_registry().invalidate(safe_name)
         current_app.logger.info(f"Profile '{safe_name}' saved.")
         return jsonify({"message": f"Profile '{safe_name}' saved."}), 200
     except Exception as e:
@@ -205,12 +437,16 @@ def add_profile():
         return jsonify({"error": f"Profile '{safe_name}' already exists."}), 409
     import json
     try:
-        json.loads(content_str)  # Validate JSON
+        profile_data = json.loads(content_str)  # Validate JSON
     except Exception as e:
         return jsonify({"error": f"Invalid JSON format: {e}"}), 400
+    problems = validate_profile(profile_data)
+    if problems:
+        return jsonify({"error": f"Invalid profile: {' '.join(problems)}", "problems": problems}), 400
     try:
         pathlib.Path(os.path.dirname(profile_path)).mkdir(parents=True, exist_ok=True)
         pathlib.Path(profile_path).write_text(content_str, encoding='utf-8')
+        get_profile_registry().invalidate(safe_name)
         current_app.logger.info(f"Profile '{safe_name}' added.")
         return jsonify({"message": f"Profile '{safe_name}' added."}), 201
     except Exception as e:
@@ -231,6 +467,7 @@ def delete_profile(profile_name):
         return jsonify({"error": "Profile not found."}), 404
     try:
         pathlib.Path(profile_path).unlink()
+        get_profile_registry().invalidate(safe_name)
         current_app.logger.info(f"Profile '{safe_name}' deleted.")
         return jsonify({"message": f"Profile '{safe_name}' deleted."}), 200
     except Exception as e:
@@ -252,9 +489,203 @@ def start_fix():
         return jsonify({"error": "Missing 'files_to_fix' list."}), 400
     if not isinstance(fix_options, dict):
         return jsonify({"error": "Missing 'fix_options' object."}), 400
+    for option in ('concurrency', 'threads'):
+        value = fix_options.get(option)
+        if value is not None and (not isinstance(value, int) or value < 1):
+            return jsonify({"error": f"'fix_options.{option}' must be a positive integer."}), 400
+    if not isinstance(fix_options.get('in_place', False), bool):
+        return jsonify({"error": "'fix_options.in_place' must be true or false."}), 400
+    backup_method = fix_options.get('backup_method')
+    if backup_method is not None and backup_method not in BACKUP_METHODS:
+        return jsonify({"error": f"'fix_options.backup_method' must be one of: {', '.join(BACKUP_METHODS)}."}), 400
+    profile_name = fix_options.get('profile_name')
+    selected_profile = None
+    if profile_name:
+        selected_profile = get_profile_registry().entry(profile_name)
+        if selected_profile is None:
+            return jsonify({"error": f"Profile '{profile_name}' not found."}), 400
+    priority = data.get('priority', 'normal')
+    if priority not in PRIORITIES:
+        return jsonify({"error": f"'priority' must be one of: {', '.join(PRIORITIES)}."}), 400
+    task_id = f"fix_{uuid.uuid4()}"
+    tasks[task_id] = {"status": "queued", "cancel_requested": False}
+    _save_task_params(task_id, {"files_to_fix": files_to_fix, "fix_options": fix_options, "profile_name": profile_name})
+    try:
+        scheduler.submit(task_id, "fix", run_fix_task, (task_id, files_to_fix, fix_options, tasks, current_app.logger),
+                         {"profile": selected_profile.data if selected_profile else None, "rules": selected_profile.rules if selected_profile else None},
+                         priority=priority)
+    except QueueFullError as e:
+        del tasks[task_id]
+        return jsonify({"error": str(e)}), 429
+    current_app.logger.info(f"Task {task_id}: Queued fix task for {len(files_to_fix)} files (priority {priority}).")
+    return jsonify({"message": "Fix task queued", "task_id": task_id, "queue_position": tasks[task_id].get("queue_position")}), 202
+
+@main_bp.route('/api/probe_cache', methods=['GET'])
+def get_probe_cache_stats():
+    """Returns size statistics for the persistent ffprobe cache."""
+    probe_cache = get_probe_cache()
+    if not probe_cache:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **probe_cache.stats()})
+
+@main_bp.route('/api/probe_cache', methods=['DELETE'])
+def clear_probe_cache():
+    """Invalidates every cached ffprobe result."""
+    probe_cache = get_probe_cache()
+    if not probe_cache:
+        return jsonify({"error": "Probe cache is disabled."}), 400
+    removed = probe_cache.clear()
+    current_app.logger.info(f"Probe cache invalidated: {removed} entries removed.")
+    return jsonify({"message": f"Probe cache cleared ({removed} entries)."}), 200
+
+@main_bp.route('/api/tasks', methods=['DELETE'])
+def purge_tasks():
+    """Deletes finished tasks and their results; ?older_than_hours=N keeps tasks used more recently than that."""
+    if _task_store is None:
+        return jsonify({"error": "Task store is disabled."}), 400
+    older_than_hours = request.args.get('older_than_hours', type=float)
+    older_than_seconds = older_than_hours * 3600 if older_than_hours is not None else None
+    purged = _task_store.purge(older_than_seconds=older_than_seconds)
+    return jsonify({"purged": purged, **_task_store.stats()})
+
+@main_bp.route('/api/tasks/<task_id>', methods=['DELETE'])
+def delete_task(task_id):
+    """Deletes one finished task and its results."""
+    task = tasks.get(task_id)
+    if not task:
+        return jsonify({"error": "Task not found"}), 404
+    if task.get("status") not in TERMINAL_STATUSES:
+        return jsonify({"error": f"Task cannot be deleted in status: {task.get('status')}"}), 409
+    del tasks[task_id]
+    return jsonify({"message": "Task deleted"}), 200
+
+@main_bp.route('/api/tasks/interrupted', methods=['GET'])
+def list_interrupted_tasks():
+    """Lists tasks that stopped because their process died (e.g. a container restart) and can be resumed."""
+    if _task_store is None:
+        return jsonify([])
+    return jsonify(_task_store.interrupted_tasks())
+
+def _resume_through_scheduler(task_id: str, priority: str = "normal") -> tuple[str | None, int]:
+    """Claims an interrupted scan or fix and queues it to continue where it stopped. Returns (error, status code)."""
+    params = _task_store.load_params(task_id)
+    if params is None:
+        return "Task not found or cannot be resumed.", 404
+    loaded_profiles = get_profile_registry().entries()
+    profile_name = params.get("profile_name")
+    for name in [profile_name, *(params.get("profile_names") or [])]:
+        if name and name not in loaded_profiles:
+            return f"Profile '{name}' not found.", 400
+    if task_id.startswith("scan_"):
+        scan_dir = pathlib.Path(params["directory"])
+        if not scan_dir.is_dir():
+            return f"Scan directory '{params['directory']}' not found.", 400
+        extra_profiles = {name: loaded_profiles[name].data for name in params.get("profile_names") or [] if name != profile_name}
+        kind, target = "scan", run_scan_task
+        args = (task_id, scan_dir, loaded_profiles[profile_name].data, tasks, current_app.logger)
+        kwargs = {"workers": params.get("workers"), "profile_name": profile_name, "mode": params.get("mode", "full"),
+                  "extra_profiles": extra_profiles or None, "resume": True, "rules": loaded_profiles[profile_name].rules,
+                  "extra_rules": {name: loaded_profiles[name].rules for name in extra_profiles} or None}
+    elif task_id.startswith("fix_"):
+        kind, target = "fix", run_fix_task
+        args = (task_id, params["files_to_fix"], params["fix_options"], tasks, current_app.logger)
+        loaded_profile = loaded_profiles[profile_name] if profile_name else None
+        kwargs = {"profile": loaded_profile.data if loaded_profile else None, "resume": True, "rules": loaded_profile.rules if loaded_profile else None}
+    else:
+        return "Only scan and fix tasks can be resumed.", 400
+    if _task_store.resume(task_id) is None:
+        return "Task is not interrupted.", 409
+    try:
+        scheduler.submit(task_id, kind, target, args, kwargs, priority=priority)
+    except QueueFullError as e:
+        tasks[task_id]["status"] = "interrupted" # Hand it back so it can be resumed later
+        return str(e), 429
+    current_app.logger.info(f"Task {task_id}: Resuming interrupted task.")
+    return None, 202
+
+@main_bp.route('/api/tasks/<task_id>/resume', methods=['POST'])
+def resume_task(task_id):
+    """Restarts an interrupted scan or fix from where it stopped, keeping the results it already has."""
+    if _task_store is None:
+        return jsonify({"error": "Task store is disabled."}), 400
+    priority = (request.get_json(silent=True) or {}).get('priority', 'normal')
+    if priority not in PRIORITIES:
+        return jsonify({"error": f"'priority' must be one of: {', '.join(PRIORITIES)}."}), 400
+    error, status_code = _resume_through_scheduler(task_id, priority)
+    if error:
+        return jsonify({"error": error}), status_code
+    return jsonify({"message": "Task resumed", "task_id": task_id, "queue_position": tasks[task_id].get("queue_position")}), 202
+
+@main_bp.route('/api/scheduler', methods=['GET'])
+def get_scheduler_stats():
+    """Returns how many jobs are running (overall and per kind) and waiting, plus the configured limits."""
+    return jsonify(scheduler.stats())
+
+@main_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Probe, compatibility check, discovery, fix and queue metrics in the Prometheus text exposition format."""
+    stats = scheduler.stats()
+    for kind in set(stats["kind_limits"]) | set(stats["running_by_kind"]) | set(stats["queued_by_kind"]):
+        metrics.SCHEDULER_JOBS.set(stats["running_by_kind"].get(kind, 0), state="running", kind=kind)
+        metrics.SCHEDULER_JOBS.set(stats["queued_by_kind"].get(kind, 0), state="queued", kind=kind)
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _load_watch_profile(profile_name: str):
+    return get_profile_registry().entry(profile_name)
+
+def _queue_watch_fix(items: list[dict]):
+    """Queues one low-priority fix task for the incompatible files a library watcher batch found."""
+    output_suffix = '.fixed'
+    files_to_fix = [item for item in items if not pathlib.Path(item["file_path"]).stem.endswith(output_suffix)]
+    loaded_profile = _load_watch_profile(Config.WATCH_PROFILE)
+    if not files_to_fix or loaded_profile is None:
+        return
     task_id = f"fix_{uuid.uuid4()}"
-    thread = threading.Thread(target=run_fix_task, args=(task_id, files_to_fix, fix_options, tasks, current_app.logger))
-    thread.daemon = True
-    thread.start()
-    current_app.logger.info(f"Task {task_id}: Queued fix task for {len(files_to_fix)} files.")
-    return jsonify({"message": "Fix task queued", "task_id": task_id}), 202
+    fix_options = {"profile_name": Config.WATCH_PROFILE, "output_suffix": output_suffix}
+    tasks[task_id] = {"status": "queued", "cancel_requested": False}
+    _save_task_params(task_id, {"files_to_fix": files_to_fix, "fix_options": fix_options, "profile_name": Config.WATCH_PROFILE})
+    try:
+        scheduler.submit(task_id, "fix", run_fix_task, (task_id, files_to_fix, fix_options, tasks, _watch_logger), {"profile": loaded_profile.data, "rules": loaded_profile.rules}, priority="low")
+    except QueueFullError as e:
+        del tasks[task_id]
+        _watch_logger.warning(f"Could not queue a fix for {len(files_to_fix)} watched file(s): {e}")
+        return
+    _watch_logger.info(f"Task {task_id}: Queued fix for {len(files_to_fix)} incompatible file(s) found by the library watcher.")
+
+@main_bp.route('/api/watch', methods=['GET'])
+def get_watch_status():
+    """Reports the library watcher's mode, roots and counters."""
+    if watcher is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, "auto_fix": Config.WATCH_AUTO_FIX, **watcher.stats()})
+
+@main_bp.route('/api/watch/results', methods=['GET'])
+def get_watch_results():
+    """Pages through the stored results of a watched root (?root=, default the first), ordered by path."""
+    if watcher is None:
+        return jsonify({"error": "Library watch mode is not enabled."}), 400
+    root = os.path.abspath(request.args.get('root') or watcher.roots[0])
+    if root not in watcher.roots:
+        return jsonify({"error": f"'{root}' is not a watched root."}), 400
+    scan_history = get_scan_history()
+    if scan_history is None:
+        return jsonify({"error": "Scan history is unavailable."}), 500
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), MAX_RESULTS_PER_POLL)
+    total, items = scan_history.load_results(root, watcher.profile_name, offset, limit)
+    return jsonify({"root": root, "profile_name": watcher.profile_name, "total": total, "offset": offset, "limit": limit, "result": items})
+
+_watch_logger = logging.getLogger("app.watcher")
+
+def start_services():
+    """Opens the task store (which starts its flush thread) for tasks and the scheduler, and starts the library watcher.
+    Called by create_app(); later calls do nothing. The watcher runs in one process only (see start_library_watcher)."""
+    global _task_store, tasks, scheduler, watcher, _services_started
+    if _services_started:
+        return
+    _services_started = True
+    _task_store = get_task_store()
+    if _task_store is not None:
+        tasks = _task_store
+        scheduler = _make_scheduler(tasks)
+    watcher = start_library_watcher(_load_watch_profile, _queue_watch_fix if Config.WATCH_AUTO_FIX else None)
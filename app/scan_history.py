@@ -0,0 +1,142 @@
+import json
+import time
+import hashlib
+import logging
+import pathlib
+import threading
+from . import db
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+def profile_fingerprint(profile: dict) -> str:
+    """Stable hash of a profile's rules, used to tell whether stored verdicts are still valid."""
+    return hashlib.sha1(json.dumps(profile, sort_keys=True).encode('utf-8')).hexdigest()
+
+class ScanHistory:
+    """Snapshot of the last completed scan per (root, profile): file stats plus their result items."""
+
+    def __init__(self, db_path: pathlib.Path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = db.connect(db_path)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS scan_runs (
+                    root TEXT NOT NULL,
+                    profile_name TEXT NOT NULL,
+                    profile_fingerprint TEXT NOT NULL,
+                    completed_at REAL NOT NULL,
+                    file_count INTEGER NOT NULL,
+                    PRIMARY KEY (root, profile_name)
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS scan_files (
+                    root TEXT NOT NULL,
+                    profile_name TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    result_json TEXT NOT NULL,
+                    PRIMARY KEY (root, profile_name, path)
+                )""")
+            if "verdict_profiles" not in [row[1] for row in self._conn.execute("PRAGMA table_info(scan_runs)")]:
+                self._conn.execute("ALTER TABLE scan_runs ADD COLUMN verdict_profiles TEXT")
+
+    def load(self, root: str, profile_name: str) -> dict | None:
+        """Returns {"profile_fingerprint", "completed_at", "files": {path: (size, mtime_ns, result_json)}} or None."""
+        with self._lock:
+            run = self._conn.execute(
+                "SELECT profile_fingerprint, completed_at FROM scan_runs WHERE root = ? AND profile_name = ?",
+                (root, profile_name)).fetchone()
+            if run is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT path, size, mtime_ns, result_json FROM scan_files WHERE root = ? AND profile_name = ?",
+                (root, profile_name)).fetchall()
+        return {
+            "profile_fingerprint": run[0],
+            "completed_at": run[1],
+            "files": {path: (size, mtime_ns, result_json) for path, size, mtime_ns, result_json in rows}
+        }
+
+    def verdict_profiles(self, root: str, profile_name: str) -> list[str]:
+        """Profiles the snapshot's items carry per-profile "verdicts" for (a scan with extra profiles), or []."""
+        with self._lock:
+            row = self._conn.execute("SELECT verdict_profiles FROM scan_runs WHERE root = ? AND profile_name = ?", (root, profile_name)).fetchone()
+        return json.loads(row[0]) if row and row[0] else []
+
+    def save(self, root: str, profile_name: str, fingerprint: str, entries: list[tuple], verdict_profiles: list[str] | None = None):
+        """Replaces the snapshot for (root, profile) with entries of (path, size, mtime_ns, result_item).
+        verdict_profiles names the profiles in the items' "verdicts", so single-file updates can match them."""
+        rows = [(root, profile_name, path, size, mtime_ns, json.dumps(result_item, separators=(',', ':')))
+                for path, size, mtime_ns, result_item in entries]
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM scan_files WHERE root = ? AND profile_name = ?", (root, profile_name))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO scan_files (root, profile_name, path, size, mtime_ns, result_json) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO scan_runs (root, profile_name, profile_fingerprint, completed_at, file_count, verdict_profiles) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (root, profile_name, fingerprint, time.time(), len(rows), json.dumps(verdict_profiles) if verdict_profiles else None))
+        logger.info(f"Saved scan snapshot for '{root}' / '{profile_name}' ({len(rows)} files).")
+
+    def upsert_files(self, root: str, profile_name: str, fingerprint: str, entries: list[tuple]):
+        """Adds or replaces single files in the (root, profile) snapshot, e.g. as the library watcher sees them change.
+        entries are (path, size, mtime_ns, result_item) like save(); the rest of the snapshot is kept."""
+        rows = [(root, profile_name, path, size, mtime_ns, json.dumps(result_item, separators=(',', ':')))
+                for path, size, mtime_ns, result_item in entries]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO scan_files (root, profile_name, path, size, mtime_ns, result_json) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows)
+                self._update_run(root, profile_name, fingerprint)
+
+    def remove_files(self, root: str, profile_name: str, paths: list[str]):
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("DELETE FROM scan_files WHERE root = ? AND profile_name = ? AND path = ?",
+                                       [(root, profile_name, path) for path in paths])
+                self._update_run(root, profile_name, None)
+
+    def load_results(self, root: str, profile_name: str, offset: int = 0, limit: int = 100) -> tuple[int, list[dict]]:
+        """Returns (file count, one page of stored result items ordered by path) for a (root, profile) snapshot."""
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM scan_files WHERE root = ? AND profile_name = ?", (root, profile_name)).fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT result_json FROM scan_files WHERE root = ? AND profile_name = ? ORDER BY path LIMIT ? OFFSET ?",
+                (root, profile_name, limit, offset)).fetchall()
+        return total, [json.loads(row[0]) for row in rows]
+
+    def _update_run(self, root: str, profile_name: str, fingerprint: str | None):
+        """Keeps scan_runs.file_count in step after single-file changes; callers hold the lock and a transaction.
+        An existing run keeps its fingerprint, so incremental scans still re-check files judged by an older profile."""
+        file_count = self._conn.execute("SELECT COUNT(*) FROM scan_files WHERE root = ? AND profile_name = ?", (root, profile_name)).fetchone()[0]
+        updated = self._conn.execute("UPDATE scan_runs SET file_count = ? WHERE root = ? AND profile_name = ?",
+                                     (file_count, root, profile_name)).rowcount
+        if not updated and fingerprint is not None:
+            self._conn.execute(
+                "INSERT INTO scan_runs (root, profile_name, profile_fingerprint, completed_at, file_count) VALUES (?, ?, ?, ?, ?)",
+                (root, profile_name, fingerprint, time.time(), file_count))
+
+_scan_history = None
+_scan_history_failed = False
+_scan_history_lock = threading.Lock()
+
+def get_scan_history() -> ScanHistory | None:
+    """Returns the process-wide scan history store, or None when it cannot be opened."""
+    global _scan_history, _scan_history_failed
+    if _scan_history_failed:
+        return None
+    with _scan_history_lock:
+        if _scan_history is None and not _scan_history_failed:
+            db_path = pathlib.Path(Config.CONFIG_DIR) / "scan_history.db"
+            try:
+                _scan_history = ScanHistory(db_path)
+            except Exception as e:
+                logger.error(f"Could not open scan history at {db_path}: {e}")
+                _scan_history_failed = True
+        return _scan_history
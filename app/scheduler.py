@@ -0,0 +1,179 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from . import events, metrics
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+class QueueFullError(Exception):
+    pass
+
+class _Job:
+    __slots__ = ("task_id", "kind", "target", "args", "kwargs", "priority", "seq", "dedupe_key", "queued_at")
+
+    def __init__(self, task_id, kind, target, args, kwargs, priority, seq, dedupe_key):
+        self.task_id = task_id
+        self.kind = kind
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.seq = seq
+        self.dedupe_key = dedupe_key
+        self.queued_at = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class JobScheduler:
+    """Runs background tasks with a global and per-kind concurrency limit.
+
+    Jobs wait in a priority queue (FIFO within a priority) with their task in the "queued" state, and
+    start as soon as both their kind and the global limit have a free slot. Identical scans (same
+    dedupe_key) that are queued or running are not started twice. Limits apply per process.
+    """
+
+    def __init__(self, tasks, max_running: int, kind_limits: dict, max_queued: int):
+        self.tasks = tasks
+        self.max_running = max(1, max_running)
+        self.kind_limits = kind_limits
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._queue = []
+        self._running = {}
+        self._dedupe = {}
+        self._seq = itertools.count()
+
+    def submit(self, task_id: str, kind: str, target, args: tuple = (), kwargs: dict | None = None, priority: str = "normal",
+               dedupe_key: tuple | None = None) -> tuple[str, bool]:
+        """Queues a job. Returns (task_id, deduplicated); a duplicate returns the existing task's id instead.
+        Raises QueueFullError when max_queued jobs are already waiting."""
+        with self._lock:
+            if dedupe_key is not None and dedupe_key in self._dedupe:
+                return self._dedupe[dedupe_key], True
+            if len(self._queue) >= self.max_queued:
+                raise QueueFullError(f"Job queue is full ({self.max_queued} waiting).")
+            job = _Job(task_id, kind, target, args, kwargs or {}, PRIORITIES.get(priority, PRIORITIES["normal"]), next(self._seq), dedupe_key)
+            heapq.heappush(self._queue, job)
+            if dedupe_key is not None:
+                self._dedupe[dedupe_key] = task_id
+            started = self._dispatch()
+            self._update_queue_positions()
+        logger.info(f"Task {task_id}: Queued {kind} job (priority {priority}).")
+        self._publish(started, task_id)
+        return task_id, False
+
+    def cancel_queued(self, task_id: str) -> bool:
+        """Drops a job that has not started yet and marks its task cancelled. Returns False if it isn't queued."""
+        with self._lock:
+            job = next((queued for queued in self._queue if queued.task_id == task_id), None)
+            if job is None:
+                return False
+            self._queue.remove(job)
+            heapq.heapify(self._queue)
+            self._forget(job)
+            self._update_queue_positions()
+        task = self.tasks.get(task_id)
+        if task is not None:
+            task["queue_position"] = None
+            task["cancel_requested"] = True
+            task["status"] = "cancelled"
+        logger.info(f"Task {task_id}: Removed from the queue (cancelled before start).")
+        events.publish(task_id)
+        return True
+
+    def stop_all(self) -> dict:
+        """Cancels every queued job and requests cancellation of every running one."""
+        with self._lock:
+            queued_ids = [job.task_id for job in self._queue]
+            running_ids = list(self._running)
+        cancelled = sum(1 for task_id in queued_ids if self.cancel_queued(task_id))
+        for task_id in running_ids:
+            task = self.tasks.get(task_id)
+            if task is not None and task.get("status") in ("queued", "running"):
+                task["cancel_requested"] = True
+                task["status"] = "cancelling"
+                events.publish(task_id)
+        return {"cancelled_queued": cancelled, "stopping_running": len(running_ids)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            running_by_kind = {}
+            for job in self._running.values():
+                running_by_kind[job.kind] = running_by_kind.get(job.kind, 0) + 1
+            queued_by_kind = {}
+            for job in self._queue:
+                queued_by_kind[job.kind] = queued_by_kind.get(job.kind, 0) + 1
+            return {
+                "running": len(self._running),
+                "queued": len(self._queue),
+                "running_by_kind": running_by_kind,
+                "queued_by_kind": queued_by_kind,
+                "max_running": self.max_running,
+                "kind_limits": dict(self.kind_limits),
+                "max_queued": self.max_queued
+            }
+
+    def _dispatch(self) -> list[str]:
+        """Starts queued jobs while slots are free; callers hold the lock. Returns the started task ids."""
+        started = []
+        blocked_kinds = set()
+        deferred = []
+        while self._queue and len(self._running) < self.max_running:
+            job = heapq.heappop(self._queue)
+            running_of_kind = sum(1 for running in self._running.values() if running.kind == job.kind)
+            kind_limit = self.kind_limits.get(job.kind) or self.max_running
+            if job.kind in blocked_kinds or running_of_kind >= kind_limit:
+                blocked_kinds.add(job.kind)
+                deferred.append(job)
+                continue
+            task = self.tasks.get(job.task_id)
+            if task is not None and task.get("cancel_requested"):
+                self._forget(job)
+                task["status"] = "cancelled"
+                started.append(job.task_id)
+                continue
+            self._running[job.task_id] = job
+            queue_wait = time.monotonic() - job.queued_at
+            metrics.QUEUE_WAIT_SECONDS.observe(queue_wait, kind=job.kind)
+            if task is not None:
+                task["queue_position"] = None
+                task["queue_wait_seconds"] = round(queue_wait, 3)
+            thread = threading.Thread(target=self._run, args=(job,), name=f"{job.kind}-{job.task_id[-8:]}")
+            thread.daemon = True
+            thread.start()
+            started.append(job.task_id)
+        for job in deferred:
+            heapq.heappush(self._queue, job)
+        return started
+
+    def _run(self, job: _Job):
+        try:
+            job.target(*job.args, **job.kwargs)
+        except Exception as e:
+            logger.error(f"Task {job.task_id}: Job crashed: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._running.pop(job.task_id, None)
+                self._forget(job)
+                started = self._dispatch()
+                self._update_queue_positions()
+            self._publish(started)
+
+    def _forget(self, job: _Job):
+        if job.dedupe_key is not None and self._dedupe.get(job.dedupe_key) == job.task_id:
+            del self._dedupe[job.dedupe_key]
+
+    def _update_queue_positions(self):
+        for position, job in enumerate(sorted(self._queue), start=1):
+            task = self.tasks.get(job.task_id)
+            if task is not None and task.get("queue_position") != position:
+                task["queue_position"] = position
+
+    def _publish(self, task_ids: list[str], *extra: str):
+        for task_id in {*task_ids, *extra}:
+            events.publish(task_id)
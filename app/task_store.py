@@ -0,0 +1,610 @@
+import json
+import time
+import logging
+import pathlib
+import threading
+from collections.abc import MutableMapping
+from . import db
+from .config import Config
+from .result_records import index_fields
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled", "interrupted")
+# Retention only removes these; interrupted tasks are kept until resumed or deleted (DELETE /api/tasks/<id>)
+PURGEABLE_STATUSES = ("completed", "failed", "cancelled")
+
+def _snapshot(value):
+    """Copies nested dicts/lists before serializing; worker threads may be mutating them."""
+    if isinstance(value, dict):
+        return {k: _snapshot(v) for k, v in dict(value).items()}
+    if isinstance(value, (list, tuple)):
+        return [_snapshot(v) for v in list(value)]
+    return value
+
+class ResultList:
+    """Append-only list of a task's result items, stored in SQLite.
+
+    Appends are buffered and inserted in batches; reads page through the table plus the unflushed tail.
+    Supports len(), iteration, integer indexing and slicing like the plain list it replaces.
+    """
+
+    def __init__(self, store: "TaskStore", task_id: str, count: int):
+        self._store = store
+        self._task_id = task_id
+        self._stored = count
+        self._tail = []
+        self._lock = threading.Lock()
+
+    def append(self, item: dict):
+        with self._lock:
+            self._tail.append(item)
+            batch_full = len(self._tail) >= self._store.RESULT_BATCH_SIZE
+        if batch_full:
+            self._store.flush_task(self._task_id)
+
+    def __len__(self):
+        with self._lock:
+            return self._stored + len(self._tail)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            items = self._read(start, stop) if stop > start else []
+            return items[::step] if step != 1 else items
+        if index < 0:
+            index += len(self)
+        items = self._read(index, index + 1)
+        if not items:
+            raise IndexError("result index out of range")
+        return items[0]
+
+    def __iter__(self):
+        start = 0
+        page_size = self._store.RESULT_BATCH_SIZE
+        while True:
+            page = self._read(start, start + page_size)
+            if not page:
+                return
+            yield from page
+            start += len(page)
+
+    def _read(self, start: int, stop: int) -> list:
+        with self._lock:
+            stored_stop = min(stop, self._stored)
+            items = self._store._read_results(self._task_id, start, stored_stop) if start < stored_stop else []
+            items.extend(self._tail[max(0, start - self._stored):max(0, stop - self._stored)])
+        return items
+
+    def _unflushed(self) -> tuple[int, list]:
+        """Returns (sequence number of the first unflushed item, the unflushed items); they stay readable until committed."""
+        with self._lock:
+            return self._stored, list(self._tail)
+
+    def _mark_flushed(self, count: int):
+        with self._lock:
+            self._stored += count
+            del self._tail[:count]
+
+class TaskRecord(MutableMapping):
+    """Dict-like task state. Writes are buffered and persisted by the store (at least every FLUSH_INTERVAL).
+
+    Records created in this process are "live": they stay in memory until the task finishes. Records
+    loaded for other readers (e.g. another worker process serving /api/status) are snapshots whose
+    writes go straight to the database.
+    """
+
+    def __init__(self, store: "TaskStore", task_id: str, fields: dict, result_count: int, live: bool):
+        self._store = store
+        self.task_id = task_id
+        self._fields = fields
+        self._result_list = ResultList(store, task_id, result_count)
+        self._live = live
+        self._dirty = set()
+        self._result_replaced = None
+        self._last_cancel_check = 0.0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def __getitem__(self, key):
+        if key == "result":
+            return self._result_list
+        if key == "cancel_requested" and self._live and not self._fields.get(key):
+            self._check_remote_cancel()
+        return self._fields[key]
+
+    def __setitem__(self, key, value):
+        if key == "result":
+            self._result_list = ResultList(self._store, self.task_id, 0)
+            self._result_list._tail.extend(value)
+            with self._lock:
+                self._result_replaced = self._result_list
+        else:
+            self._fields[key] = value
+            with self._lock:
+                self._dirty.add(key)
+        if not self._live or (key == "status" and value in TERMINAL_STATUSES):
+            self._store.flush_task(self.task_id, record=self)
+
+    def __delitem__(self, key):
+        self._fields.pop(key)
+        with self._lock:
+            self._dirty.add(key)
+
+    def __iter__(self):
+        yield "result"
+        yield from list(self._fields)
+
+    def __len__(self):
+        return len(self._fields) + 1
+
+    def mark_dirty(self, key: str):
+        """Flags a field whose dict or list value was modified in place, so the next flush writes it."""
+        with self._lock:
+            self._dirty.add(key)
+
+    def _take_changes(self) -> tuple[dict, list, ResultList | None]:
+        """Returns (changed fields to write, deleted keys, replaced result list) and clears the dirty set.
+
+        Only assigned fields and those flagged with mark_dirty() are written.
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            replaced, self._result_replaced = self._result_replaced, None
+        changed = {}
+        deleted = []
+        for key in dirty:
+            if key in self._fields:
+                changed[key] = _snapshot(self._fields[key])
+            else:
+                deleted.append(key)
+        return changed, deleted, replaced
+
+    def _check_remote_cancel(self):
+        """Picks up a cancellation requested through another process, at most once per CANCEL_POLL_INTERVAL."""
+        now = time.monotonic()
+        if now - self._last_cancel_check < self._store.CANCEL_POLL_INTERVAL:
+            return
+        self._last_cancel_check = now
+        if self._store._read_field(self.task_id, "cancel_requested"):
+            self._fields["cancel_requested"] = True
+            if self._fields.get("status") == "running":
+                self._fields["status"] = "cancelling"
+
+class TaskStore(MutableMapping):
+    """SQLite-backed replacement for the in-memory `tasks` dict, shared by every worker process.
+
+    Task fields live in task_fields (one row per key) and result items in task_results, so status
+    polls and paged result reads never need a task's full result list in memory. Finished tasks are
+    dropped after TASK_RETENTION_HOURS without being read or updated, and beyond the TASK_RETENTION_MAX
+    most recently used; interrupted tasks are kept for resuming.
+
+    Live tasks heartbeat through updated_at. A running task whose heartbeat goes stale (its process
+    died, e.g. a container restart) is marked "interrupted" and can be resumed from its stored params.
+    """
+    FLUSH_INTERVAL = 0.5
+    RESULT_BATCH_SIZE = 500
+    CANCEL_POLL_INTERVAL = 1.0
+    ACCESS_TOUCH_INTERVAL = 60
+    HEARTBEAT_INTERVAL = 5
+    STALE_AFTER = 30
+    _RESULT_TABLES = ("task_results", "task_result_index", "task_result_audio")
+
+    def __init__(self, db_path: pathlib.Path, retention_hours: float, max_finished: int):
+        self.db_path = db_path
+        self.retention_seconds = retention_hours * 3600
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._live = {}
+        self._live_lock = threading.Lock()
+        self._conn = db.connect(db_path)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_records (
+                    task_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    last_accessed REAL NOT NULL,
+                    result_count INTEGER NOT NULL DEFAULT 0,
+                    params_json TEXT
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_fields (
+                    task_id TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value_json TEXT NOT NULL,
+                    PRIMARY KEY (task_id, key)
+                ) WITHOUT ROWID""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_results (
+                    task_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    item_json TEXT NOT NULL,
+                    PRIMARY KEY (task_id, seq)
+                ) WITHOUT ROWID""")
+            # Queryable fields of each result, written with it, for /api/tasks/<id>/results
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_result_index (
+                    task_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    is_compatible INTEGER,
+                    container TEXT,
+                    video_codec TEXT,
+                    relative_path TEXT,
+                    duration REAL,
+                    reason TEXT,
+                    PRIMARY KEY (task_id, seq)
+                ) WITHOUT ROWID""")
+            for column in ("is_compatible", "container", "video_codec", "relative_path", "duration"):
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_task_result_{column} ON task_result_index (task_id, {column})")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_result_audio (
+                    task_id TEXT NOT NULL,
+                    codec TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    PRIMARY KEY (task_id, codec, seq)
+                ) WITHOUT ROWID""")
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(task_records)")]
+            if "params_json" not in columns:
+                self._conn.execute("ALTER TABLE task_records ADD COLUMN params_json TEXT")
+        self.mark_interrupted()
+        self.purge_expired()
+        self._flusher = threading.Thread(target=self._flush_loop, name="task-store-flush", daemon=True)
+        self._flusher.start()
+
+    # --- Mapping interface ---
+    def __getitem__(self, task_id: str) -> TaskRecord:
+        with self._live_lock:
+            record = self._live.get(task_id)
+        if record is not None:
+            return record
+        record = self._load(task_id)
+        if record is None:
+            raise KeyError(task_id)
+        return record
+
+    def __setitem__(self, task_id: str, fields: dict):
+        """Registers a new task owned by this process (replacing any stored task with the same id)."""
+        fields = dict(fields)
+        results = fields.pop("result", None)
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._delete_rows([task_id])
+                self._conn.execute(
+                    "INSERT INTO task_records (task_id, kind, status, created_at, updated_at, last_accessed, result_count) VALUES (?, ?, ?, ?, ?, ?, 0)",
+                    (task_id, task_id.split("_", 1)[0], fields.get("status"), now, now, now))
+        record = TaskRecord(self, task_id, {}, 0, live=True)
+        with self._live_lock:
+            self._live[task_id] = record
+        record.update(fields)
+        if results is not None:
+            record["result"] = results
+        self.flush_task(task_id, record=record)
+        self.purge_expired()
+
+    def __delitem__(self, task_id: str):
+        with self._live_lock:
+            self._live.pop(task_id, None)
+        with self._lock:
+            with self._conn:
+                self._delete_rows([task_id])
+
+    def __contains__(self, task_id) -> bool:
+        with self._live_lock:
+            if task_id in self._live:
+                return True
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM task_records WHERE task_id = ?", (task_id,)).fetchone() is not None
+
+    def __iter__(self):
+        with self._lock:
+            task_ids = [row[0] for row in self._conn.execute("SELECT task_id FROM task_records ORDER BY created_at")]
+        return iter(task_ids)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM task_records").fetchone()[0]
+
+    # --- Persistence ---
+    def flush_task(self, task_id: str, record: TaskRecord | None = None):
+        """Writes a record's pending field changes and buffered results in one transaction."""
+        if record is None:
+            with self._live_lock:
+                record = self._live.get(task_id)
+            if record is None:
+                return
+        with record._flush_lock:
+            changed, deleted, replaced = record._take_changes()
+            result_list = record._result_list
+            first_seq, items = result_list._unflushed()
+            if not changed and not deleted and replaced is None and not items:
+                return
+            rows = [(task_id, first_seq + offset, json.dumps(item, separators=(',', ':'))) for offset, item in enumerate(items)]
+            try:
+                with self._lock:
+                    with self._conn:
+                        if replaced is not None:
+                            for table in self._RESULT_TABLES:
+                                self._conn.execute(f"DELETE FROM {table} WHERE task_id = ?", (task_id,))
+                        self._conn.executemany("INSERT OR REPLACE INTO task_results (task_id, seq, item_json) VALUES (?, ?, ?)", rows)
+                        self._insert_index_rows(task_id, first_seq, items)
+                        self._conn.executemany("INSERT OR REPLACE INTO task_fields (task_id, key, value_json) VALUES (?, ?, ?)",
+                                               [(task_id, key, json.dumps(value)) for key, value in changed.items()])
+                        self._conn.executemany("DELETE FROM task_fields WHERE task_id = ? AND key = ?", [(task_id, key) for key in deleted])
+                        now = time.time()
+                        self._conn.execute(
+                            "UPDATE task_records SET status = COALESCE(?, status), updated_at = ?, last_accessed = ?, result_count = ? WHERE task_id = ?",
+                            (changed.get("status"), now, now, first_seq + len(items), task_id))
+            except Exception as e:
+                logger.error(f"Task store flush failed for {task_id}: {e}")
+                with record._lock:
+                    record._dirty.update(changed)
+                    record._dirty.update(deleted)
+                    if replaced is not None and record._result_replaced is None:
+                        record._result_replaced = replaced
+                return
+            result_list._mark_flushed(len(items))
+        if record._live and record._fields.get("status") in TERMINAL_STATUSES:
+            # Finished: later readers load it from the database, so its memory can be released.
+            with self._live_lock:
+                if self._live.get(task_id) is record:
+                    del self._live[task_id]
+            record._live = False
+
+    def _flush_loop(self):
+        last_heartbeat = 0.0
+        while True:
+            time.sleep(self.FLUSH_INTERVAL)
+            with self._live_lock:
+                live_ids = list(self._live)
+            for task_id in live_ids:
+                self.flush_task(task_id)
+            if live_ids and time.monotonic() - last_heartbeat >= self.HEARTBEAT_INTERVAL:
+                last_heartbeat = time.monotonic()
+                try:
+                    with self._lock:
+                        with self._conn:
+                            now = time.time()
+                            self._conn.executemany("UPDATE task_records SET updated_at = ?, last_accessed = ? WHERE task_id = ?",
+                                                   [(now, now, task_id) for task_id in live_ids])
+                except Exception as e:
+                    logger.error(f"Task store heartbeat failed: {e}")
+
+    def _load(self, task_id: str) -> TaskRecord | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT result_count, last_accessed, status, updated_at FROM task_records WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                return None
+        if row[2] not in TERMINAL_STATUSES and now - row[3] > self.STALE_AFTER:
+            self.mark_interrupted([task_id])
+        with self._lock:
+            fields = {key: json.loads(value_json) for key, value_json in
+                      self._conn.execute("SELECT key, value_json FROM task_fields WHERE task_id = ?", (task_id,))}
+            if now - row[1] > self.ACCESS_TOUCH_INTERVAL:
+                with self._conn:
+                    self._conn.execute("UPDATE task_records SET last_accessed = ? WHERE task_id = ?", (now, task_id))
+        return TaskRecord(self, task_id, fields, row[0], live=False)
+
+    def _read_results(self, task_id: str, start: int, stop: int) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item_json FROM task_results WHERE task_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (task_id, start, stop)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _read_field(self, task_id: str, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT value_json FROM task_fields WHERE task_id = ? AND key = ?", (task_id, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _delete_rows(self, task_ids: list[str]):
+        """Deletes tasks and their fields/results; callers hold the lock and a transaction."""
+        for table in (*self._RESULT_TABLES, "task_fields", "task_records"):
+            self._conn.executemany(f"DELETE FROM {table} WHERE task_id = ?", [(task_id,) for task_id in task_ids])
+
+    def _insert_index_rows(self, task_id: str, first_seq: int, items: list):
+        """Indexes result items by their queryable fields; callers hold the lock and a transaction."""
+        index_rows, audio_rows = [], []
+        for offset, item in enumerate(items):
+            fields = index_fields(item)
+            seq = first_seq + offset
+            index_rows.append((task_id, seq, fields["is_compatible"], fields["container"], fields["video_codec"],
+                               fields["relative_path"], fields["duration"], fields["reason"]))
+            audio_rows.extend((task_id, codec, seq) for codec in fields["audio_codecs"])
+        self._conn.executemany("INSERT OR REPLACE INTO task_result_index (task_id, seq, is_compatible, container, video_codec, relative_path, duration, reason) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", index_rows)
+        self._conn.executemany("INSERT OR REPLACE INTO task_result_audio (task_id, codec, seq) VALUES (?, ?, ?)", audio_rows)
+
+    # --- Result queries ---
+    def query_results(self, task_id: str, filters: dict, sort: str | None = None, descending: bool = False,
+                      offset: int = 0, limit: int = 100) -> tuple[int, list]:
+        """Returns (total matches, one page of result items) for a task, using the result index.
+
+        filters may hold is_compatible (bool), container, video_codec, audio_codec (exact values),
+        reason (case-insensitive substring) and path_prefix (relative path prefix). Without a sort
+        field, results come in scan order; ties are always broken by scan order.
+        """
+        self.flush_task(task_id) # Make a live task's buffered results visible
+        self._index_missing_results(task_id)
+        from_sql, where, params = "task_result_index i", ["i.task_id = ?"], [task_id]
+        for field in ("is_compatible", "container", "video_codec"):
+            if field in filters:
+                where.append(f"i.{field} IS ?")
+                params.append(filters[field])
+        if "audio_codec" in filters:
+            # Driven from the (task_id, codec, seq) key: already in scan order, and no per-row subquery
+            from_sql = "task_result_audio a JOIN task_result_index i ON i.task_id = a.task_id AND i.seq = a.seq"
+            where = ["a.task_id = ?", "a.codec = ?", *where]
+            params = [task_id, filters["audio_codec"], *params]
+        if filters.get("reason"):
+            escaped = filters["reason"].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where.append("i.reason LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        if filters.get("path_prefix"):
+            prefix = filters["path_prefix"]
+            # A range instead of LIKE so the (task_id, relative_path) index is used
+            where.append("i.relative_path >= ? AND i.relative_path < ?")
+            params += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+        where_sql = " AND ".join(where)
+        order_sql = f"i.{sort} {'DESC' if descending else 'ASC'}, i.seq" if sort else "i.seq"
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM {from_sql} WHERE {where_sql}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT r.item_json FROM {from_sql} JOIN task_results r ON r.task_id = i.task_id AND r.seq = i.seq "
+                f"WHERE {where_sql} ORDER BY {order_sql} LIMIT ? OFFSET ?", (*params, limit, offset)).fetchall()
+        return total, [json.loads(row[0]) for row in rows]
+
+    def _index_missing_results(self, task_id: str):
+        """Indexes results stored before the result index existed (rows are indexed in seq order as they are written)."""
+        with self._lock:
+            indexed = self._conn.execute("SELECT COUNT(*) FROM task_result_index WHERE task_id = ?", (task_id,)).fetchone()[0]
+            rows = self._conn.execute("SELECT seq, item_json FROM task_results WHERE task_id = ? AND seq >= ? ORDER BY seq",
+                                      (task_id, indexed)).fetchall()
+            if rows:
+                with self._conn:
+                    self._insert_index_rows(task_id, rows[0][0], [json.loads(item_json) for _, item_json in rows])
+
+    # --- Interrupted tasks ---
+    def save_params(self, task_id: str, params: dict):
+        """Stores what is needed to restart a task (request parameters, not derived state)."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("UPDATE task_records SET params_json = ? WHERE task_id = ?", (json.dumps(params), task_id))
+
+    def load_params(self, task_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT params_json FROM task_records WHERE task_id = ?", (task_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def mark_interrupted(self, task_ids: list[str] | None = None) -> int:
+        """Marks unfinished tasks with a stale heartbeat (and not running in this process) as interrupted.
+        A task that was being cancelled is marked cancelled instead. Returns the number of tasks marked."""
+        cutoff = time.time() - self.STALE_AFTER
+        placeholders = ",".join("?" * len(TERMINAL_STATUSES))
+        with self._live_lock:
+            live_ids = set(self._live)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT task_id, status FROM task_records WHERE (status IS NULL OR status NOT IN ({placeholders})) AND updated_at < ?",
+                (*TERMINAL_STATUSES, cutoff)).fetchall()
+            marked = [(task_id, "cancelled" if status == "cancelling" else "interrupted") for task_id, status in rows
+                      if task_id not in live_ids and (task_ids is None or task_id in task_ids)]
+            if marked:
+                with self._conn:
+                    self._conn.executemany("UPDATE task_records SET status = ? WHERE task_id = ?", [(status, task_id) for task_id, status in marked])
+                    self._conn.executemany("INSERT OR REPLACE INTO task_fields (task_id, key, value_json) VALUES (?, 'status', ?)",
+                                           [(task_id, json.dumps(status)) for task_id, status in marked])
+                    self._conn.executemany("INSERT OR REPLACE INTO task_fields (task_id, key, value_json) VALUES (?, 'active_files', '{}')",
+                                           [(task_id,) for task_id, _ in marked])
+        for task_id, status in marked:
+            logger.warning(f"Task {task_id}: No longer running (stale heartbeat); marked {status}.")
+        return len(marked)
+
+    def interrupted_tasks(self) -> list[dict]:
+        """Lists interrupted tasks that have stored params, most recent first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT task_id, kind, created_at, updated_at, result_count, params_json FROM task_records "
+                "WHERE status = 'interrupted' AND params_json IS NOT NULL ORDER BY updated_at DESC").fetchall()
+        interrupted = []
+        for task_id, kind, created_at, updated_at, result_count, params_json in rows:
+            total_files = self._read_field(task_id, "total_files")
+            params = json.loads(params_json)
+            interrupted.append({
+                "task_id": task_id,
+                "kind": kind,
+                "created_at": created_at,
+                "interrupted_at": updated_at,
+                "processed_count": result_count,
+                "total_files": total_files,
+                "directory": params.get("directory"),
+                "profile_name": params.get("profile_name")
+            })
+        return interrupted
+
+    def resume(self, task_id: str) -> TaskRecord | None:
+        """Takes ownership of an interrupted task in this process. Returns its now-live record, or None."""
+        with self._lock:
+            with self._conn:
+                # Conditional update, so two processes can't both claim the same task
+                claimed = self._conn.execute(
+                    "UPDATE task_records SET status = 'queued', updated_at = ? WHERE task_id = ? AND status = 'interrupted'",
+                    (time.time(), task_id)).rowcount
+        if not claimed:
+            return None
+        record = self._load(task_id)
+        if record is None:
+            return None
+        record._live = True
+        with self._live_lock:
+            self._live[task_id] = record
+        record["status"] = "queued"
+        record["cancel_requested"] = False
+        return record
+
+    # --- Retention ---
+    def purge(self, older_than_seconds: float | None = None, task_ids: list[str] | None = None) -> int:
+        """Deletes finished tasks: those not accessed within older_than_seconds, or the given ids (all finished if neither).
+        Running and interrupted (resumable) tasks are never purged. Returns the number of tasks removed."""
+        placeholders = ",".join("?" * len(PURGEABLE_STATUSES))
+        query = f"SELECT task_id FROM task_records WHERE status IN ({placeholders})"
+        params = list(PURGEABLE_STATUSES)
+        if older_than_seconds is not None:
+            query += " AND last_accessed < ?"
+            params.append(time.time() - older_than_seconds)
+        with self._lock:
+            purge_ids = [row[0] for row in self._conn.execute(query, params)]
+            if task_ids is not None:
+                wanted = set(task_ids)
+                purge_ids = [task_id for task_id in purge_ids if task_id in wanted]
+            if purge_ids:
+                with self._conn:
+                    self._delete_rows(purge_ids)
+        if purge_ids:
+            logger.info(f"Task store purged {len(purge_ids)} finished task(s).")
+        return len(purge_ids)
+
+    def purge_expired(self) -> int:
+        """Applies the retention policy: TTL on last access, then an LRU cap on finished tasks."""
+        removed = self.purge(older_than_seconds=self.retention_seconds)
+        placeholders = ",".join("?" * len(PURGEABLE_STATUSES))
+        with self._lock:
+            over_cap = [row[0] for row in self._conn.execute(
+                f"SELECT task_id FROM task_records WHERE status IN ({placeholders}) ORDER BY last_accessed DESC LIMIT -1 OFFSET ?",
+                (*PURGEABLE_STATUSES, self.max_finished))]
+        if over_cap:
+            removed += self.purge(task_ids=over_cap)
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            task_count, result_count = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(result_count), 0) FROM task_records").fetchone()
+        with self._live_lock:
+            live_count = len(self._live)
+        return {"tasks": task_count, "results": result_count, "live_tasks": live_count, "path": str(self.db_path)}
+
+_task_store = None
+_task_store_failed = False
+_task_store_lock = threading.Lock()
+
+def get_task_store() -> TaskStore | None:
+    """Returns the process-wide task store, or None when it is disabled or cannot be opened."""
+    global _task_store, _task_store_failed
+    if not Config.TASK_STORE_ENABLED or _task_store_failed:
+        return None
+    with _task_store_lock:
+        if _task_store is None and not _task_store_failed:
+            db_path = pathlib.Path(Config.CONFIG_DIR) / "tasks.db"
+            try:
+                _task_store = TaskStore(db_path, Config.TASK_RETENTION_HOURS, Config.TASK_RETENTION_MAX)
+            except Exception as e:
+                logger.error(f"Could not open task store at {db_path}: {e}")
+                _task_store_failed = True
+        return _task_store
@@ -1,27 +1,470 @@
+import os
+import json
+import time
 import pathlib
 import utils
 import subprocess
 import shlex
 import shutil
+import queue
+import threading
+import functools
+import contextlib
+import collections
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+try:
+    import fcntl
+except ImportError: # Not available on Windows; reflink backups fall back to copies there
+    fcntl = None
+from .config import Config
+from .probe_cache import get_probe_cache
+from .scan_history import get_scan_history, profile_fingerprint
+from .result_records import CompactResultList, ScanResult
+from . import events, metrics
 
-def run_scan_task(task_id: str, directory: pathlib.Path, profile: dict, tasks: dict, logger):
-    """Function executed in background thread to perform scan, adapting recursion."""
+def _cancel_requested(tasks: dict, task_id: str) -> bool:
+    return tasks.get(task_id, {}).get('cancel_requested', False)
+
+def _mark_dirty(task: dict, key: str):
+    """Flags a task field modified in place for the task store to persist (plain dict tasks need nothing)."""
+    mark_dirty = getattr(task, "mark_dirty", None)
+    if mark_dirty:
+        mark_dirty(key)
+
+def _as_float(value) -> float | None:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+class _MountLimiter:
+    """Caps concurrent probes per filesystem (st_dev) so slow network shares aren't overloaded."""
+    def __init__(self, per_mount: int):
+        self.per_mount = per_mount
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    @contextlib.contextmanager
+    def limit(self, device: int | None):
+        if self.per_mount <= 0:
+            yield
+            return
+        with self._lock:
+            semaphore = self._semaphores.setdefault(device, threading.BoundedSemaphore(self.per_mount))
+        with semaphore:
+            yield
+
+class _SharedProbes:
+    """Coalesces concurrent probes of one inode within a scan, so hardlinked paths are probed once.
+
+    Only lookups in flight are shared; once one finishes, later paths of the same inode find its
+    probe in the probe cache (ProbeCache.find_by_inode).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def run(self, key: tuple, probe):
+        with self._lock:
+            slot = self._in_flight.get(key)
+            owner = slot is None
+            if owner:
+                slot = self._in_flight[key] = [threading.Event(), None]
+        if not owner:
+            slot[0].wait()
+            return slot[1], True
+        try:
+            slot[1] = probe()
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            slot[0].set()
+        return slot[1], False
+
+class _MediaDiscovery:
+    """Walks a scan root on a background thread, feeding media DirEntries through a bounded queue.
+
+    found_count grows as the walk proceeds, so it doubles as a running estimate of the total.
+    """
+    _DONE = object()
+
+    def __init__(self, directory: pathlib.Path, recursive: bool, should_stop=None, buffer_size: int | None = None):
+        self.directory = directory
+        self.recursive = recursive
+        self.should_stop = should_stop
+        self.found_count = 0
+        self.finished = False
+        self.error = None
+        self.seconds = None
+        self._queue = queue.Queue(maxsize=buffer_size or Config.SCAN_DISCOVERY_BUFFER)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._walk, name="media-discovery", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop_event.set()
+        self._thread.join(timeout=5)
+
+    def __iter__(self):
+        while True:
+            entry = self._queue.get()
+            if entry is self._DONE:
+                return
+            yield entry
+
+    def _walk(self):
+        started = time.monotonic()
+        try:
+            for entry in utils.iter_media_files(self.directory, self.recursive, should_stop=self._stopped):
+                self.found_count += 1
+                self._put(entry)
+        except Exception as e:
+            self.error = e
+        finally:
+            # Includes time blocked on a full queue, i.e. waiting for the probes to catch up
+            self.seconds = time.monotonic() - started
+            if not self.error and not self._stopped():
+                metrics.DISCOVERY_SECONDS.observe(self.seconds)
+            metrics.DISCOVERED_FILES.inc(self.found_count)
+            self.finished = True
+            self._put(self._DONE)
+
+    def _stopped(self) -> bool:
+        return self._stop_event.is_set() or bool(self.should_stop and self.should_stop())
+
+    def _put(self, item):
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+def _ordered_map(executor, fn, items, workers: int, max_ahead: int):
+    """Yields (item, fn(item)) in input order while keeping `workers` calls running.
+
+    A new call starts as soon as any call finishes, so one slow item doesn't idle the other workers;
+    finished results wait to be yielded in order, at most `max_ahead` items past the oldest unfinished one.
+    """
+    items = iter(items)
+    pending = {} # index -> (item, future), submitted and not yet yielded
+    running = set()
+    next_index = submit_index = 0
+    exhausted = False
+    try:
+        while True:
+            running = {future for future in running if not future.done()}
+            while not exhausted and len(running) < workers and submit_index - next_index < workers + max_ahead:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                future = executor.submit(fn, item)
+                pending[submit_index] = (item, future)
+                running.add(future)
+                submit_index += 1
+            if next_index in pending and pending[next_index][1].done():
+                item, future = pending.pop(next_index)
+                next_index += 1
+                yield item, future.result()
+                continue
+            if not pending:
+                return
+            wait(running, return_when=FIRST_COMPLETED)
+    finally:
+        for _, future in pending.values():
+            future.cancel()
+
+def _probe_media_file(media_file: pathlib.Path, mount_limiter: _MountLimiter | None = None, file_stat: os.stat_result | None = None,
+                      probe_stats: utils.ProbeTierStats | None = None, timings: metrics.TaskTimings | None = None,
+                      shared_probes: _SharedProbes | None = None) -> dict | None:
+    """Returns ffprobe data for a file, served from the probe cache while its size and mtime are unchanged.
+    The cache also matches the file's inode and content hash, so hardlinks, renames and moves reuse a probe.
+    Cache misses go through the fast/full probe tiers (utils.run_ffprobe_tiered) unless PROBE_FAST_ENABLED is off.
+    With shared_probes, paths of a hardlinked inode being probed concurrently wait for that one probe.
+    Cache lookups and probe wall times (excluding the wait for a mount slot) are recorded in metrics and `timings`."""
+    if file_stat is None:
+        try:
+            file_stat = media_file.stat()
+        except OSError:
+            file_stat = None
+    if shared_probes and file_stat and file_stat.st_nlink > 1 and file_stat.st_ino:
+        media_info, shared = shared_probes.run((file_stat.st_dev, file_stat.st_ino),
+                                               lambda: _lookup_or_probe(media_file, mount_limiter, file_stat, probe_stats, timings))
+        if shared and timings:
+            timings.count("hardlinks_shared")
+        return media_info
+    return _lookup_or_probe(media_file, mount_limiter, file_stat, probe_stats, timings)
+
+def _lookup_or_probe(media_file: pathlib.Path, mount_limiter: _MountLimiter | None, file_stat: os.stat_result | None,
+                     probe_stats: utils.ProbeTierStats | None, timings: metrics.TaskTimings | None) -> dict | None:
+    probe_cache = get_probe_cache() if file_stat else None
+    path = os.path.abspath(media_file)
+    dev, ino = (file_stat.st_dev, file_stat.st_ino) if file_stat and file_stat.st_ino else (None, None) # No inode numbers on some platforms
+    content_hash = None
+    if probe_cache:
+        size, mtime_ns = file_stat.st_size, file_stat.st_mtime_ns
+        hash_content = (lambda: utils.file_fingerprint(media_file, size)) if Config.PROBE_CACHE_CONTENT_HASH else None
+        cached_info, cache_result = probe_cache.get(path, size, mtime_ns, dev, ino, content_hash_of=hash_content), "hit"
+        if cached_info is None and ino:
+            cached_info, cache_result = probe_cache.find_by_inode(path, size, mtime_ns, dev, ino), "inode_hit"
+        if cached_info is None and hash_content:
+            content_hash = hash_content()
+            if content_hash:
+                cached_info, cache_result = probe_cache.find_by_content(path, size, mtime_ns, dev, ino, content_hash), "content_hit"
+        if cached_info is None:
+            cache_result = "miss"
+        metrics.PROBE_CACHE_REQUESTS.inc(result=cache_result)
+        if timings:
+            timings.count("cache_misses" if cache_result == "miss" else f"cache_{cache_result}s")
+        if cached_info is not None:
+            return cached_info
+    with mount_limiter.limit(file_stat.st_dev if file_stat else None) if mount_limiter else contextlib.nullcontext():
+        started = time.monotonic()
+        if Config.PROBE_FAST_ENABLED:
+            media_info = utils.run_ffprobe_tiered(media_file, Config.PROBE_FAST_PROBESIZE, Config.PROBE_FAST_ANALYZEDURATION_US, probe_stats)
+        else:
+            media_info = utils.run_ffprobe(media_file)
+        probe_seconds = time.monotonic() - started
+    metrics.PROBE_SECONDS.observe(probe_seconds, outcome="ok" if media_info else "failed")
+    if timings:
+        timings.add("probe", probe_seconds)
+    if media_info and probe_cache:
+        probe_cache.put(path, file_stat.st_size, file_stat.st_mtime_ns, media_info, dev, ino, content_hash)
+    return media_info
+
+def _analyze_media_file(task_id: str, media_file: pathlib.Path, directory: pathlib.Path, rules: utils.CompiledProfile, mount_limiter, logger, file_stat: os.stat_result | None = None,
+                        verdict_rules: dict | None = None, probe_stats: utils.ProbeTierStats | None = None, timings: metrics.TaskTimings | None = None,
+                        shared_probes: _SharedProbes | None = None) -> dict:
+    """Probes a single media file and builds its analysis result item.
+
+    With verdict_rules ({profile_name: CompiledProfile}), the item also carries a per-profile
+    "verdicts" dict; the top-level is_compatible/reason stay those of `rules`.
+    """
+    relative_path_str = str(media_file.relative_to(directory))
+    analysis_result_item = {
+        "file_path": str(media_file),
+        "relative_path": relative_path_str,
+        "is_compatible": False,
+        "reason": "",
+        "error": None,
+        "container": "N/A",
+        "video_details": "N/A",
+        "audio_tracks": [],
+        "subtitle_codecs": [],
+        "duration": None,
+        "size": None,
+        "mtime_ns": None
+    }
+    if file_stat is None:
+        try:
+            file_stat = media_file.stat()
+        except OSError:
+            file_stat = None
+    if file_stat:
+        # The file version probed, so re-evaluation can find exactly this probe in the probe cache
+        analysis_result_item["size"], analysis_result_item["mtime_ns"] = file_stat.st_size, file_stat.st_mtime_ns
+        metrics.FILE_BYTES.observe(file_stat.st_size)
+        if timings:
+            timings.count("analyzed_bytes", file_stat.st_size)
+    media_info = _probe_media_file(media_file, mount_limiter, file_stat, probe_stats, timings, shared_probes)
+    if media_info:
+        try:
+            analysis_result_item["container"] = media_info.get('format', {}).get('format_name', 'N/A').split(',')[0]
+            analysis_result_item["duration"] = _as_float(media_info.get('format', {}).get('duration'))
+            if 'streams' in media_info:
+                video_codec = "N/A"
+                video_level_str = ""
+                sub_list = []
+                detailed_audio_list = []
+                for stream in media_info['streams']:
+                    codec_type = stream.get('codec_type')
+                    codec_name = stream.get('codec_name', 'unknown')
+                    stream_tags = stream.get('tags', {})
+                    if codec_type == 'video' and video_codec == "N/A":
+                        video_codec = codec_name
+                        level = stream.get('level')
+                        profile_str = stream.get('profile', '')
+                        current_video_level_str = ""
+                        if level is not None:
+                            current_video_level_str = f" L{level / 10.0:.1f}"
+                        analysis_result_item["video_details"] = f"{video_codec} {profile_str}{current_video_level_str}".strip()
+                    elif codec_type == 'audio':
+                        track_info = {
+                            "index": stream.get('index'),
+                            "codec": codec_name,
+                            "language": stream_tags.get('language'),
+                            "title": stream_tags.get('title'),
+                            "channels": stream.get('channels'),
+                            "channel_layout": stream.get('channel_layout')
+                        }
+                        detailed_audio_list.append(track_info)
+                    elif codec_type == 'subtitle':
+                        sub_list.append(codec_name)
+                analysis_result_item["audio_tracks"] = detailed_audio_list
+                analysis_result_item["subtitle_codecs"] = sorted(list(set(sub_list)))
+        except Exception as e:
+            logger.error(f"Task {task_id}: Detail extraction error: {e}", exc_info=False)
+            analysis_result_item["error"] = f"Detail extraction failed: {e}"
+
+        try:
+            check_started = time.perf_counter()
+            is_compatible, reason = rules.evaluate(media_info)
+            analysis_result_item["is_compatible"] = is_compatible
+            if reason or not analysis_result_item["error"]:
+                analysis_result_item["reason"] = reason
+            elif not reason and is_compatible and not analysis_result_item["error"]:
+                analysis_result_item["reason"] = "Direct Play OK"
+            if verdict_rules:
+                verdicts = {}
+                for name, profile_rules in verdict_rules.items():
+                    verdict_compatible, verdict_reason = (is_compatible, reason) if profile_rules is rules else profile_rules.evaluate(media_info)
+                    verdicts[name] = {"is_compatible": verdict_compatible, "reason": verdict_reason}
+                analysis_result_item["verdicts"] = verdicts
+            check_seconds = time.perf_counter() - check_started
+            metrics.CHECK_SECONDS.observe(check_seconds)
+            if timings:
+                timings.add("check", check_seconds)
+        except Exception as e:
+            logger.error(f"Task {task_id}: Check failed: {e}", exc_info=False)
+            analysis_result_item["error"] = f"Check failed: {e}"
+            analysis_result_item["reason"] = "[Check Error]"
+            analysis_result_item["is_compatible"] = False
+    else:
+        analysis_result_item["error"] = "ffprobe command failed or gave empty output"
+        analysis_result_item["reason"] = "[Probe Failed]"
+        analysis_result_item["container"] = "[Probe Err]"
+        analysis_result_item["video_details"] = "[Probe Err]"
+        analysis_result_item["is_compatible"] = False
+    return analysis_result_item
+
+def _scan_media_file(task_id: str, media_entry: os.DirEntry, directory: pathlib.Path, rules: utils.CompiledProfile, mount_limiter, logger, previous_files: dict | None = None, reuse_previous: bool = False,
+                     verdict_rules: dict | None = None, probe_stats: utils.ProbeTierStats | None = None,
+                     timings: metrics.TaskTimings | None = None, shared_probes: _SharedProbes | None = None) -> tuple[dict, os.stat_result | None]:
+    """Analyzes one file. In incremental mode it is tagged new/modified/unchanged, and unchanged files reuse their previous result."""
+    media_file = pathlib.Path(media_entry.path)
+    try:
+        file_stat = media_entry.stat()
+    except OSError:
+        file_stat = None
+    change = None
+    if previous_files is not None:
+        previous = previous_files.get(str(media_file))
+        if previous is None:
+            change = "new"
+        elif file_stat and previous[0] == file_stat.st_size and previous[1] == file_stat.st_mtime_ns:
+            change = "unchanged"
+            if reuse_previous:
+                analysis_result_item = json.loads(previous[2])
+                analysis_result_item["change"] = change
+                if timings:
+                    timings.count("reused_results")
+                return analysis_result_item, file_stat
+        else:
+            change = "modified"
+    analysis_result_item = _analyze_media_file(task_id, media_file, directory, rules, mount_limiter, logger, file_stat=file_stat, verdict_rules=verdict_rules,
+                                               probe_stats=probe_stats, timings=timings, shared_probes=shared_probes)
+    if change:
+        analysis_result_item["change"] = change
+    return analysis_result_item, file_stat
+
+def _history_item(root: str, record: ScanResult | dict) -> dict:
+    """A result as scan snapshots store it, whether written by a scan or the library watcher: the packed
+    record's JSON shape, without the incremental "change" tag."""
+    if isinstance(record, dict):
+        record = ScanResult.pack(root, record)
+    return {key: value for key, value in record.to_dict(root).items() if key != "change"}
+
+def _task_timings(task: dict) -> metrics.TaskTimings:
+    """A TaskTimings for a task run, starting with the time its job waited in the scheduler queue."""
+    timings = metrics.TaskTimings()
+    if task.get("queue_wait_seconds") is not None:
+        timings.add("queue_wait", task["queue_wait_seconds"])
+    return timings
+
+def _skip_processed(media_entries, already_processed: set, resumed_stats: dict):
+    """Filters out files a resumed scan already has results for, remembering their stat for the scan snapshot."""
+    for media_entry in media_entries:
+        file_path = str(pathlib.Path(media_entry.path))
+        if file_path in already_processed:
+            try:
+                resumed_stats[file_path] = media_entry.stat()
+            except OSError:
+                pass
+            continue
+        yield media_entry
+
+def run_scan_task(task_id: str, directory: pathlib.Path, profile: dict, tasks: dict, logger, workers: int | None = None, per_mount_limit: int | None = None, profile_name: str | None = None, mode: str = "full",
+                  extra_profiles: dict | None = None, resume: bool = False, rules: utils.CompiledProfile | None = None,
+                  extra_rules: dict | None = None):
+    """Function executed in background thread to perform scan, adapting recursion.
+
+    With mode="incremental", the scan is compared against the last completed scan of the same
+    root and profile: only new or modified files are probed, and deleted files are reported.
+    With extra_profiles ({name: profile}), every file is probed once and checked against `profile` and
+    each extra profile; items get per-profile "verdicts" and the task a "profile_matrix" of counts.
+    With resume=True, an interrupted task keeps its stored results and only files not yet in them are probed.
+    `rules` are the already compiled rules of `profile` (e.g. from the profile registry), and `extra_rules` ({name: rules})
+    those of the extra profiles; whatever is omitted is compiled here.
+    """
     if task_id not in tasks:
         tasks[task_id] = {}
-    tasks[task_id].update({
-        "status": "running",
-        "result": [],
-        "processed_count": 0,
-        "progress": 0,
-        "current_file": None,
-        "total_files": 0,
-        "error": None,
-        "cancel_requested": False
-    })
-    logger.info(f"Task {task_id}: Background scan started for '{directory}'")
+    # Keep a cancellation requested while the job was still waiting in the scheduler queue
+    cancel_requested = bool(tasks[task_id].get("cancel_requested"))
+    if resume:
+        tasks[task_id].update({"status": "running", "current_file": None, "error": None, "cancel_requested": cancel_requested})
+    else:
+        tasks[task_id].update({
+            "status": "running",
+            "result": CompactResultList(str(directory)),
+            "processed_count": 0,
+            "progress": 0,
+            "current_file": None,
+            "total_files": 0,
+            "error": None,
+            "cancel_requested": cancel_requested,
+            "mode": mode
+        })
     analysis_results_list = tasks[task_id]["result"]
-    processed_count = 0
+    processed_count = len(analysis_results_list)
+    already_processed = {item["file_path"] for item in analysis_results_list if isinstance(item, dict) and item.get("file_path")} if resume else set()
+    resumed_stats = {}
+    logger.info(f"Task {task_id}: Background scan {'resumed' if resume else 'started'} for '{directory}' ({mode})"
+                + (f", {processed_count} file(s) already done" if resume else ""))
     scan_cancelled = False
+    scan_root = os.path.abspath(directory)
+    scan_history = get_scan_history() if profile_name else None
+    rules = rules or utils.compile_profile(profile)
+    verdict_rules = None
+    if extra_profiles:
+        verdict_rules = {profile_name or "default": rules}
+        verdict_rules.update((name, (extra_rules or {}).get(name) or utils.compile_profile(extra))
+                             for name, extra in extra_profiles.items() if name not in verdict_rules)
+        if not (resume and tasks[task_id].get("profile_matrix")):
+            tasks[task_id]["profile_matrix"] = {name: {"compatible": 0, "incompatible": 0} for name in verdict_rules}
+        # Stored verdicts are only reusable by a scan checking the same set of profiles
+        fingerprint = profile_fingerprint({"profile": profile, "extra_profiles": extra_profiles})
+    else:
+        fingerprint = profile_fingerprint(profile)
+    # Compact records (not the result dicts) so a large scan's snapshot doesn't hold every item in memory
+    history_entries = []
+    history_root = str(directory)
+    previous_files = None
+    reuse_previous = False
+    if mode == "incremental":
+        previous_scan = scan_history.load(scan_root, profile_name) if scan_history else None
+        if previous_scan is None:
+            logger.info(f"Task {task_id}: No previous scan of '{directory}' with profile '{profile_name}'; every file is new.")
+            previous_files = {}
+        else:
+            previous_files = previous_scan["files"]
+            reuse_previous = previous_scan["profile_fingerprint"] == fingerprint
+            if not reuse_previous:
+                logger.info(f"Task {task_id}: Profile '{profile_name}' changed since the last scan; unchanged files will be re-checked.")
 
     try:
         found_top_level_media = False
@@ -32,7 +475,7 @@ def run_scan_task(task_id: str, directory: pathlib.Path, profile: dict, tasks: d
             items_checked = 0
             max_items_to_check = 500
             for item in directory.iterdir():
-                if tasks.get(task_id, {}).get('cancel_requested', False):
+                if _cancel_requested(tasks, task_id):
                     raise StopIteration("Scan cancelled during initial check")
                 items_checked += 1
                 if item.is_dir():
@@ -45,109 +488,96 @@ def run_scan_task(task_id: str, directory: pathlib.Path, profile: dict, tasks: d
         except Exception as e:
             logger.error(f"Task {task_id}: Error during directory check: {e}", exc_info=False)
             found_subdirectories = True
-        if found_top_level_media:
-            glob_pattern = "*"
-        elif found_subdirectories:
-            glob_pattern = "**/*"
+        recursive = not found_top_level_media and found_subdirectories
+        if recursive:
             scan_type = "Recursive"
-        else:
-            glob_pattern = "*"
         logger.info(f"Task {task_id}: Determined scan type: {scan_type}")
 
-        logger.info(f"Task {task_id}: Globbing with pattern '{glob_pattern}' in '{directory}'")
-        media_files_list = list(directory.glob(glob_pattern))
-        valid_media_files = []
-        for item in media_files_list:
-            if tasks.get(task_id, {}).get('cancel_requested', False):
-                raise StopIteration("Scan cancelled during discovery")
-            if item.is_file() and item.suffix.lower() in utils.SUPPORTED_EXTENSIONS:
-                valid_media_files.append(item)
-        total_files_to_process = len(valid_media_files)
-        tasks[task_id]["total_files"] = total_files_to_process
-        logger.info(f"Task {task_id}: Found {total_files_to_process} media files to analyze.")
-        if not valid_media_files:
+        workers = max(1, workers if workers is not None else Config.SCAN_WORKERS)
+        per_mount_limit = per_mount_limit if per_mount_limit is not None else Config.SCAN_WORKERS_PER_MOUNT
+        mount_limiter = _MountLimiter(per_mount_limit)
+        probe_stats = utils.ProbeTierStats()
+        shared_probes = _SharedProbes()
+        timings = _task_timings(tasks[task_id])
+        logger.info(f"Task {task_id}: Walking '{directory}' and probing with {workers} worker(s), per-mount limit {per_mount_limit or 'none'}.")
+        discovery = _MediaDiscovery(directory, recursive, should_stop=lambda: _cancel_requested(tasks, task_id))
+        with discovery, ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"probe-{task_id[-8:]}") as executor:
+            analyze = functools.partial(_scan_media_file, task_id, directory=directory, rules=rules, mount_limiter=mount_limiter, logger=logger,
+                                        previous_files=previous_files, reuse_previous=reuse_previous, verdict_rules=verdict_rules, probe_stats=probe_stats,
+                                        timings=timings, shared_probes=shared_probes)
+            pending_entries = _skip_processed(discovery, already_processed, resumed_stats) if already_processed else discovery
+            ordered_results = _ordered_map(executor, analyze, pending_entries, workers, max_ahead=workers * 32)
+            try:
+                for media_entry, (analysis_result_item, file_stat) in ordered_results:
+                    if _cancel_requested(tasks, task_id):
+                        raise StopIteration("Scan cancelled during analysis")
+                    processed_count += 1
+                    total_files_to_process = discovery.found_count
+                    tasks[task_id]["total_files"] = total_files_to_process
+                    tasks[task_id]["discovery_complete"] = discovery.finished
+                    tasks[task_id]["progress"] = int((processed_count / total_files_to_process) * 100) if total_files_to_process > 0 else 0
+                    tasks[task_id]["processed_count"] = processed_count
+                    tasks[task_id]["current_file"] = analysis_result_item["relative_path"]
+                    logger.info(f"Task {task_id}: [{processed_count}/{total_files_to_process}] Analyzed: {analysis_result_item['relative_path']}")
+                    analysis_results_list.append(analysis_result_item)
+                    if verdict_rules:
+                        profile_matrix = tasks[task_id]["profile_matrix"]
+                        for name, verdict in (analysis_result_item.get("verdicts") or {}).items():
+                            if name in profile_matrix:
+                                profile_matrix[name]["compatible" if verdict["is_compatible"] else "incompatible"] += 1
+                        _mark_dirty(tasks[task_id], "profile_matrix")
+                    if file_stat:
+                        history_entries.append((analysis_result_item["file_path"], file_stat.st_size, file_stat.st_mtime_ns, ScanResult.pack(history_root, analysis_result_item)))
+                    if processed_count % 50 == 0:
+                        tasks[task_id]["probe_tiers"] = probe_stats.snapshot()
+                        tasks[task_id]["timings"] = timings.snapshot()
+                    events.publish(task_id)
+            finally:
+                ordered_results.close()
+                tasks[task_id]["probe_tiers"] = probe_stats.snapshot()
+                if discovery.seconds is not None:
+                    timings.add("discovery", discovery.seconds)
+                tasks[task_id]["timings"] = timings.snapshot()
+                probe_cache = get_probe_cache()
+                if probe_cache:
+                    probe_cache.flush()
+        if _cancel_requested(tasks, task_id):
+            raise StopIteration("Scan cancelled during discovery")
+        if discovery.error:
+            raise discovery.error
+        tasks[task_id]["total_files"] = discovery.found_count
+        tasks[task_id]["discovery_complete"] = True
+        logger.info(f"Task {task_id}: Found {discovery.found_count} media files.")
+        if processed_count == 0:
             raise StopIteration("No media files found matching supported extensions.")
+        if resumed_stats:
+            # Files finished before the interruption still belong in the scan snapshot
+            for item in analysis_results_list:
+                file_stat = resumed_stats.get(item.get("file_path"))
+                if file_stat:
+                    history_entries.append((item["file_path"], file_stat.st_size, file_stat.st_mtime_ns, ScanResult.pack(history_root, item)))
 
-        for media_file in valid_media_files:
-            if tasks.get(task_id, {}).get('cancel_requested', False):
-                raise StopIteration("Scan cancelled during analysis")
-            processed_count += 1
-            relative_path_str = str(media_file.relative_to(directory))
-            tasks[task_id]["progress"] = int((processed_count / total_files_to_process) * 100) if total_files_to_process > 0 else 0
-            tasks[task_id]["processed_count"] = processed_count
-            tasks[task_id]["current_file"] = relative_path_str
-            logger.info(f"Task {task_id}: [{processed_count}/{total_files_to_process}] Attempting ffprobe for: {relative_path_str}")
-
-            analysis_result_item = {
-                "file_path": str(media_file),
-                "relative_path": relative_path_str,
-                "is_compatible": False,
-                "reason": "",
-                "error": None,
-                "container": "N/A",
-                "video_details": "N/A",
-                "audio_tracks": [],
-                "subtitle_codecs": []
+        if previous_files is not None:
+            # Every result counts as seen, including files whose stat failed and so have no snapshot entry
+            seen_paths = {item.get("file_path") for item in analysis_results_list}
+            # Those keep their previous snapshot row instead of dropping out of the history
+            snapshot_paths = {entry[0] for entry in history_entries}
+            history_entries.extend((path, *previous_files[path][:2], json.loads(previous_files[path][2]))
+                                   for path in seen_paths - snapshot_paths if path in previous_files)
+            deleted_files = sorted(os.path.relpath(path, directory) for path in previous_files if path not in seen_paths)
+            change_counts = collections.Counter(item.get("change") for item in analysis_results_list)
+            tasks[task_id]["deleted_files"] = deleted_files
+            tasks[task_id]["changes"] = {
+                "new": change_counts["new"],
+                "modified": change_counts["modified"],
+                "unchanged": change_counts["unchanged"],
+                "deleted": len(deleted_files)
             }
-            media_info = utils.run_ffprobe(media_file)
-            if media_info:
-                try:
-                    analysis_result_item["container"] = media_info.get('format', {}).get('format_name', 'N/A').split(',')[0]
-                    if 'streams' in media_info:
-                        video_codec = "N/A"
-                        video_level_str = ""
-                        sub_list = []
-                        detailed_audio_list = []
-                        for stream in media_info['streams']:
-                            codec_type = stream.get('codec_type')
-                            codec_name = stream.get('codec_name', 'unknown')
-                            stream_tags = stream.get('tags', {})
-                            if codec_type == 'video' and video_codec == "N/A":
-                                video_codec = codec_name
-                                level = stream.get('level')
-                                profile_str = stream.get('profile', '')
-                                current_video_level_str = ""
-                                if level is not None:
-                                    current_video_level_str = f" L{level / 10.0:.1f}"
-                                analysis_result_item["video_details"] = f"{video_codec} {profile_str}{current_video_level_str}".strip()
-                            elif codec_type == 'audio':
-                                track_info = {
-                                    "index": stream.get('index'),
-                                    "codec": codec_name,
-                                    "language": stream_tags.get('language'),
-                                    "title": stream_tags.get('title'),
-                                    "channels": stream.get('channels'),
-                                    "channel_layout": stream.get('channel_layout')
-                                }
-                                detailed_audio_list.append(track_info)
-                            elif codec_type == 'subtitle':
-                                sub_list.append(codec_name)
-                        analysis_result_item["audio_tracks"] = detailed_audio_list
-                        analysis_result_item["subtitle_codecs"] = sorted(list(set(sub_list)))
-                except Exception as e:
-                    logger.error(f"Task {task_id}: Detail extraction error: {e}", exc_info=False)
-                    analysis_result_item["error"] = f"Detail extraction failed: {e}"
-
-                try:
-                    is_compatible, reason = utils.check_compatibility(media_info, profile)
-                    analysis_result_item["is_compatible"] = is_compatible
-                    if reason or not analysis_result_item["error"]:
-                        analysis_result_item["reason"] = reason
-                    elif not reason and is_compatible and not analysis_result_item["error"]:
-                        analysis_result_item["reason"] = "Direct Play OK"
-                except Exception as e:
-                    logger.error(f"Task {task_id}: Check failed: {e}", exc_info=False)
-                    analysis_result_item["error"] = f"Check failed: {e}"
-                    analysis_result_item["reason"] = "[Check Error]"
-                    analysis_result_item["is_compatible"] = False
-            else:
-                analysis_result_item["error"] = "ffprobe command failed or gave empty output"
-                analysis_result_item["reason"] = "[Probe Failed]"
-                analysis_result_item["container"] = "[Probe Err]"
-                analysis_result_item["video_details"] = "[Probe Err]"
-                analysis_result_item["is_compatible"] = False
-
-            analysis_results_list.append(analysis_result_item)
+            logger.info(f"Task {task_id}: Incremental changes: {tasks[task_id]['changes']}")
+        if scan_history:
+            scan_history.save(scan_root, profile_name, fingerprint,
+                              [(path, size, mtime_ns, _history_item(history_root, record)) for path, size, mtime_ns, record in history_entries],
+                              verdict_profiles=list(verdict_rules) if verdict_rules else None)
 
         tasks[task_id]["status"] = "completed"
         tasks[task_id]["current_file"] = None
@@ -176,155 +606,599 @@ def run_scan_task(task_id: str, directory: pathlib.Path, profile: dict, tasks: d
         if not scan_cancelled:
             tasks[task_id]["status"] = "completed"
             logger.warning(f"Task ended but status 'running'. Setting 'completed'.")
+    events.publish(task_id)
 
-def run_fix_task(task_id: str, files_to_fix: list[dict], fix_options: dict, tasks: dict, logger):
-    """Background task to iterate through files and attempt fixes using ffmpeg."""
-    if task_id not in tasks:
-        tasks[task_id] = {}
-    tasks[task_id].update({
-        "status": "running",
-        "result": [],
-        "processed_count": 0,
-        "progress": 0,
-        "current_file": "Starting fix...",
-        "total_files": len(files_to_fix),
+def reevaluate_results(task_id: str, source_results: list[dict], profile: dict, tasks: dict, logger,
+                       rules: utils.CompiledProfile | None = None) -> tuple[list[dict], list[str]]:
+    """
+    Re-checks finished scan results against a profile using the stored probe data, and stores them as a new completed task.
+    Probes come from the probe cache in batches, matched on the size and mtime each result recorded; nothing is probed.
+    Files without a matching probe (evicted, re-probed since, or scanned before results recorded size/mtime) keep their
+    previous verdict and are reported as missing.
+    Returns (files whose compatibility verdict changed, relative paths of the missing files). `rules` are profile's
+    compiled rules, if already at hand.
+    """
+    rules = rules or utils.compile_profile(profile)
+    items = [item for item in source_results if isinstance(item, dict) and item.get("file_path")]
+    checkable = [item for item in items if item.get("reason") != "[Probe Failed]"]
+    probe_cache = get_probe_cache()
+    versions = [(item["file_path"], item.get("size"), item.get("mtime_ns")) for item in checkable if item.get("size") is not None]
+    media_infos = probe_cache.get_many(versions) if probe_cache else {}
+    missing = [item.get("relative_path") or item["file_path"] for item in checkable if item["file_path"] not in media_infos]
+    if missing:
+        logger.info(f"Task {task_id}: {len(missing)} file(s) have no stored probe data for the scanned version; their verdicts are kept.")
+
+    results = []
+    changed = []
+    for item in items:
+        new_item = dict(item)
+        new_item.pop("change", None)
+        new_item.pop("verdicts", None)
+        media_info = media_infos.get(item["file_path"])
+        if media_info is not None:
+            try:
+                new_item["is_compatible"], new_item["reason"] = rules.evaluate(media_info)
+            except Exception as e:
+                logger.error(f"Task {task_id}: Check failed: {e}", exc_info=False)
+                new_item.update(is_compatible=False, reason="[Check Error]", error=f"Check failed: {e}")
+        if new_item.get("is_compatible") != item.get("is_compatible"):
+            changed.append({
+                "file_path": item["file_path"],
+                "relative_path": item.get("relative_path"),
+                "was_compatible": item.get("is_compatible"),
+                "is_compatible": new_item.get("is_compatible"),
+                "previous_reason": item.get("reason"),
+                "reason": new_item.get("reason")
+            })
+        results.append(new_item)
+
+    tasks[task_id] = {
+        "status": "completed",
+        "result": results,
+        "processed_count": len(results),
+        "progress": 100,
+        "current_file": None,
+        "total_files": len(results),
+        "discovery_complete": True,
         "error": None,
-        "cancel_requested": False
-    })
-    logger.info(f"Task {task_id}: Background fix started for {len(files_to_fix)} files.")
-    fix_results_list = tasks[task_id]["result"]
-    processed_count = 0
-    success_count = 0
-    fail_count = 0
-    skipped_count = 0
-    fix_cancelled = False
+        "cancel_requested": False,
+        "mode": "reevaluate",
+        "changes": {
+            "became_compatible": sum(1 for change in changed if change["is_compatible"]),
+            "became_incompatible": sum(1 for change in changed if not change["is_compatible"]),
+            "missing": len(missing)
+        }
+    }
+    events.publish(task_id)
+    logger.info(f"Task {task_id}: Re-evaluated {len(results)} results; {len(changed)} changed verdict.")
+    return changed, missing
+
+class _FixCancelled(Exception):
+    pass
+
+def _read_ffmpeg_progress(stream, on_progress):
+    """Parses `-progress pipe:1` key=value blocks, calling on_progress(dict) at the end of each block."""
+    block = {}
+    for line in stream:
+        key, _, value = line.strip().partition("=")
+        if key == "progress":
+            block["progress"] = value
+            on_progress(block)
+            block = {}
+        elif key:
+            block[key] = value
+
+def _stop_process(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def _run_ffmpeg(ffmpeg_cmd: list[str], is_cancelled, timeout: float, on_progress=None) -> tuple[int, str]:
+    """Runs ffmpeg with machine-readable progress on stdout, terminating it as soon as the task is cancelled.
+
+    Returns (returncode, stderr). on_progress receives each parsed progress block.
+    """
+    process = subprocess.Popen(ffmpeg_cmd[:1] + ["-progress", "pipe:1", "-nostats"] + ffmpeg_cmd[1:],
+                               stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, encoding='utf-8', errors='ignore')
+    stderr_chunks = []
+    readers = [
+        threading.Thread(target=_read_ffmpeg_progress, args=(process.stdout, on_progress or (lambda block: None)), daemon=True),
+        threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+    ]
+    for reader in readers:
+        reader.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                process.wait(timeout=0.5)
+                break
+            except subprocess.TimeoutExpired:
+                if is_cancelled():
+                    _stop_process(process)
+                    raise _FixCancelled()
+                if time.monotonic() > deadline:
+                    process.kill()
+                    process.wait()
+                    raise subprocess.TimeoutExpired(ffmpeg_cmd, timeout)
+    finally:
+        for reader in readers:
+            reader.join(timeout=5)
+    return process.returncode, "".join(stderr_chunks)
+
+def _parse_ffmpeg_speed(speed: str | None) -> float | None:
+    try:
+        return float(speed.rstrip("x")) if speed and speed != "N/A" else None
+    except ValueError:
+        return None
+
+class _FixProgress:
+    """Aggregates per-job ffmpeg progress into intra-file percent, overall encode speed and ETA on the task record.
+    It also keeps the task's "active_files" (the running jobs) up to date.
+
+    Speed and ETA are measured in media seconds: the probe durations of finished files plus the
+    current position of running jobs, divided by wall time since the task started.
+    """
+    def __init__(self, task: dict, files_to_fix: list[dict]):
+        self.task = task
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        known_durations = [_as_float(info.get('duration')) for info in files_to_fix]
+        known_durations = [duration for duration in known_durations if duration]
+        self._default_duration = (sum(known_durations) / len(known_durations)) if known_durations else 0.0
+        self._total_media_seconds = sum(_as_float(info.get('duration')) or self._default_duration for info in files_to_fix)
+        self._done_media_seconds = 0.0
+        self._running_positions = {}
+
+    def expected_duration(self, file_info: dict) -> float:
+        return _as_float(file_info.get('duration')) or self._default_duration
+
+    def correct_duration(self, expected: float, actual: float):
+        with self._lock:
+            self._total_media_seconds += actual - expected
+
+    def start(self, relative_path: str, duration: float):
+        self.task["active_files"][relative_path] = {"started_at": time.time(), "duration": duration, "out_time": 0.0, "percent": 0, "speed": None}
+        _mark_dirty(self.task, "active_files")
+
+    def update(self, relative_path: str, duration: float, block: dict):
+        out_time_us = block.get("out_time_us") or block.get("out_time_ms")
+        try:
+            position = max(0.0, int(out_time_us) / 1_000_000) if out_time_us not in (None, "N/A") else 0.0
+        except ValueError:
+            position = 0.0
+        if duration:
+            position = min(position, duration)
+        job = self.task["active_files"].get(relative_path)
+        if job is not None:
+            job.update({
+                "out_time": round(position, 1),
+                "percent": int(position / duration * 100) if duration else None,
+                "speed": _parse_ffmpeg_speed(block.get("speed"))
+            })
+            _mark_dirty(self.task, "active_files")
+        with self._lock:
+            self._running_positions[relative_path] = position
+            self._refresh()
+
+    def finish(self, relative_path: str, duration: float, transcoded: bool):
+        """Counts a finished job towards progress; files that were skipped or failed leave the workload."""
+        if self.task["active_files"].pop(relative_path, None) is not None:
+            _mark_dirty(self.task, "active_files")
+        with self._lock:
+            self._running_positions.pop(relative_path, None)
+            if transcoded:
+                self._done_media_seconds += duration
+            else:
+                self._total_media_seconds -= duration
+            self._refresh()
+
+    def _refresh(self):
+        done = self._done_media_seconds + sum(self._running_positions.values())
+        elapsed = time.monotonic() - self._started
+        speed = done / elapsed if elapsed > 0 else 0.0
+        remaining = max(0.0, self._total_media_seconds - done)
+        self.task["encode_speed"] = round(speed, 2)
+        self.task["eta_seconds"] = int(remaining / speed) if speed > 0 else None
+
+def _remove_partial_output(output_path: pathlib.Path, logger, context: str):
+    if output_path.exists():
+        try:
+            output_path.unlink()
+            logger.info(f"... Deleted incomplete output file{context}.")
+        except Exception as del_e:
+            logger.warning(f"... Failed to delete incomplete output file{context}: {del_e}")
+
+# Backup methods from cheapest to most expensive; a requested method falls back to the ones after it.
+BACKUP_METHODS = ("hardlink", "reflink", "copy")
+FICLONE = 0x40049409 # linux/fs.h: _IOW(0x94, 9, int)
+
+class _InsufficientSpace(Exception):
+    pass
+
+def _check_free_space(directory: pathlib.Path, needed_bytes: int):
+    """Raises _InsufficientSpace unless the filesystem holding `directory` can take needed_bytes plus the configured reserve."""
+    reserve = Config.FIX_MIN_FREE_MB * 1024 * 1024
+    free = shutil.disk_usage(directory).free
+    if free < needed_bytes + reserve:
+        raise _InsufficientSpace(f"Not enough free space: {(needed_bytes + reserve) / 1024**3:.1f} GiB needed, {free / 1024**3:.1f} GiB available")
+
+def _reflink(source: pathlib.Path, destination: pathlib.Path):
+    """Clones source into destination with the FICLONE ioctl (btrfs, XFS, bcachefs...): no data is copied."""
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with open(source, "rb") as src, open(destination, "xb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            destination.unlink()
+            raise
+    shutil.copystat(source, destination)
+
+def _verify_replacement(source_info: dict, output_path: pathlib.Path) -> str | None:
+    """Quick sanity check before an in-place fix replaces the original: same stream count and about the same duration.
+    Returns a description of the mismatch, or None when the output looks complete."""
+    output_info = utils.run_ffprobe(output_path)
+    if not output_info:
+        return "output could not be probed"
+    source_streams, output_streams = len(source_info.get("streams") or []), len(output_info.get("streams") or [])
+    if source_streams != output_streams:
+        return f"{output_streams} streams instead of {source_streams}"
+    source_duration = _as_float((source_info.get("format") or {}).get("duration"))
+    output_duration = _as_float((output_info.get("format") or {}).get("duration"))
+    if source_duration:
+        if output_duration is None:
+            return "output has no duration"
+        if abs(source_duration - output_duration) > max(1.0, source_duration * 0.005):
+            return f"duration {output_duration:.1f}s instead of {source_duration:.1f}s"
+    return None
+
+def _create_backup(source: pathlib.Path, destination: pathlib.Path, method: str, output_bytes: int, logger) -> str:
+    """Backs up source at destination, trying `method` and then the cheaper-to-costlier methods after it.
+
+    ffmpeg only reads the source and writes a separate output, so a hardlink (or reflink) is as safe as a copy
+    and costs no I/O. Returns the method that worked; raises the last error if none did.
+    """
+    methods = BACKUP_METHODS[BACKUP_METHODS.index(method):] if method in BACKUP_METHODS else BACKUP_METHODS
+    last_error = None
+    for candidate in methods:
+        try:
+            if candidate == "hardlink":
+                os.link(source, destination)
+            elif candidate == "reflink":
+                _reflink(source, destination)
+            else:
+                # A real copy needs room for itself and for the output still to be written
+                _check_free_space(destination.parent, source.stat().st_size + output_bytes)
+                shutil.copy2(source, destination)
+            return candidate
+        except _InsufficientSpace:
+            raise
+        except OSError as e:
+            logger.info(f"... {candidate} backup not possible ({e}), trying next method.")
+            last_error = e
+    raise last_error
+
+# Rough per-track audio encode speed (x realtime) used to estimate the work a plan avoids before it runs.
+# Neither saving reported per outcome is measured: estimated_seconds_saved uses this nominal speed, and
+# extrapolated_seconds_saved scales the file's own ffmpeg wall time (mux and I/O included) per encoded track.
+ESTIMATED_AUDIO_ENCODE_SPEED = 50.0
+
+def _plan_audio_fix(audio_tracks: list[dict] | None, rules: utils.CompiledProfile | None, target_audio_codec: str, target_audio_bitrate: str | None, skip_if_compatible: bool) -> dict:
+    """
+    Decides which audio streams actually need re-encoding.
+    Tracks the compiled profile accepts (CompiledProfile.audio_supported, as in scan verdicts) are stream-copied
+    (-c:a:N copy); the rest are encoded to the target codec. Without audio rules or scanned track info, every
+    audio stream is re-encoded.
+    Returns {"action": "skip"|"transcode", "codec_args", "copy_tracks", "transcode_tracks", "reason"}.
+    """
+    if rules is None or not rules.checks_audio or not audio_tracks:
+        codec_args = ["-c:a", target_audio_codec, *(["-b:a", target_audio_bitrate] if target_audio_bitrate else [])]
+        return {"action": "transcode", "codec_args": codec_args, "copy_tracks": [], "transcode_tracks": None,
+                "reason": "No profile or track info; re-encoding all audio"}
+    copy_tracks = [n for n, track in enumerate(audio_tracks) if rules.audio_supported(track.get("codec"))]
+    transcode_tracks = [n for n, track in enumerate(audio_tracks) if not rules.audio_supported(track.get("codec"))]
+    plan = {"action": "transcode", "codec_args": [], "copy_tracks": copy_tracks, "transcode_tracks": transcode_tracks, "reason": ""}
+    if not transcode_tracks:
+        plan.update(action="skip", reason="All audio tracks already supported")
+    elif copy_tracks and skip_if_compatible:
+        plan.update(action="skip", reason="A supported audio track is already present")
+    else:
+        for n in copy_tracks:
+            plan["codec_args"] += [f"-c:a:{n}", "copy"]
+        for n in transcode_tracks:
+            plan["codec_args"] += [f"-c:a:{n}", target_audio_codec, *([f"-b:a:{n}", target_audio_bitrate] if target_audio_bitrate else [])]
+        plan["reason"] = f"Re-encoding {len(transcode_tracks)} of {len(audio_tracks)} audio track(s)"
+    return plan
+
+def _fix_media_file(task_id: str, file_info: dict, fix_options: dict, fix_progress: _FixProgress, is_cancelled, logger, rules: utils.CompiledProfile | None = None,
+                    timings: metrics.TaskTimings | None = None) -> dict:
+    """Fixes one file with ffmpeg, re-encoding only the audio tracks the profile can't play, and returns its fix outcome.
+
+    With fix_options["in_place"], the output is checked against the original (see _verify_replacement) and then
+    renamed over it, instead of being kept next to it as <stem><output_suffix><ext>.
+    """
     target_audio_codec = fix_options.get('target_audio_codec', 'aac')
     target_audio_bitrate = fix_options.get('target_audio_bitrate')
     output_suffix = fix_options.get('output_suffix', '.fixed')
+    in_place = bool(fix_options.get('in_place', False))
     backup_original = fix_options.get('backup', False)
+    backup_method = fix_options.get('backup_method') or Config.FIX_BACKUP_METHOD
+    threads_per_job = fix_options.get('threads', Config.FIX_THREADS_PER_JOB)
+    input_path_str = file_info.get('file_path')
+    relative_path = file_info.get('relative_path', input_path_str)
+    fix_outcome = {
+        "relative_path": relative_path,
+        "status": "skipped",
+        "message": "Unknown state",
+        "output_path": None,
+        "backup_path": None,
+        "backup_method": None,
+        "copied_audio_tracks": None,
+        "transcoded_audio_tracks": None,
+        "estimated_seconds_saved": 0.0,
+        "extrapolated_seconds_saved": None
+    }
 
+    expected_duration = fix_progress.expected_duration(file_info)
+    duration = expected_duration
     try:
-        for file_info in files_to_fix:
-            if tasks.get(task_id, {}).get('cancel_requested', False):
-                raise StopIteration("Fix cancelled by user")
-            processed_count += 1
-            input_path_str = file_info.get('file_path')
-            relative_path = file_info.get('relative_path', input_path_str)
-            tasks[task_id]["progress"] = int((processed_count / tasks[task_id]["total_files"]) * 100) if tasks[task_id]["total_files"] > 0 else 0
-            tasks[task_id]["processed_count"] = processed_count
-            tasks[task_id]["current_file"] = f"Processing: {relative_path}"
-            logger.info(f"Task {task_id}: Fixing {processed_count}/{tasks[task_id]['total_files']}: {relative_path}")
-            fix_outcome = {
-                "relative_path": relative_path,
-                "status": "skipped",
-                "message": "Unknown state",
-                "output_path": None,
-                "backup_path": None
-            }
+        if not input_path_str:
+            fix_outcome["status"] = "failed"
+            fix_outcome["message"] = "Missing file path"
+            return fix_outcome
+        input_path = pathlib.Path(input_path_str)
+        if not input_path.is_file():
+            fix_outcome["status"] = "failed"
+            fix_outcome["message"] = "Input file not found"
+            return fix_outcome
+        output_filename = input_path.name if in_place else f"{input_path.stem}{output_suffix}{input_path.suffix}"
+        output_path = input_path.parent / output_filename
+        # ffmpeg writes to a .partial file that is renamed on success, so an existing output is always complete
+        partial_path = output_path.with_name(f"{output_path.stem}.partial{output_path.suffix}")
+        if not in_place and output_path.exists():
+            logger.info(f"... Skipping, output exists")
+            fix_outcome["status"] = "skipped"
+            fix_outcome["message"] = "Output file already exists"
+            return fix_outcome
+        media_info = None
+        if in_place:
+            # A full probe of the file as it is now. It is the baseline _verify_replacement compares the output with
+            # (a cached or fast-tier probe can differ from a full one), and the plan is built from it rather than the
+            # scan's track list, so a file already replaced before an interrupted task was resumed is skipped
+            probe_started = time.monotonic()
+            media_info = utils.run_ffprobe(input_path)
+            if timings:
+                timings.add("verify", time.monotonic() - probe_started)
+            if not media_info:
+                fix_outcome["status"] = "failed"
+                fix_outcome["message"] = "Could not probe the original to verify an in-place fix"
+                return fix_outcome
+            audio_tracks = [{"index": stream.get("index"), "codec": stream.get("codec_name", "unknown")}
+                            for stream in media_info.get("streams") or [] if stream.get("codec_type") == "audio"]
+        else:
+            audio_tracks = file_info.get('audio_tracks')
+        plan = _plan_audio_fix(audio_tracks, rules, target_audio_codec, target_audio_bitrate,
+                               fix_options.get('skip_if_compatible_audio', True))
+        fix_outcome["copied_audio_tracks"] = plan["copy_tracks"]
+        fix_outcome["transcoded_audio_tracks"] = plan["transcode_tracks"]
+        if plan["action"] == "skip":
+            logger.info(f"... Skipping, {plan['reason'].lower()}")
+            fix_outcome["status"] = "skipped"
+            fix_outcome["message"] = plan["reason"]
+            fix_outcome["estimated_seconds_saved"] = round((_as_float(file_info.get('duration')) or 0.0) * len(audio_tracks) / ESTIMATED_AUDIO_ENCODE_SPEED, 1)
+            return fix_outcome
+        if is_cancelled():
+            raise _FixCancelled()
+        if not _as_float(file_info.get('duration')):
+            media_info = media_info or _probe_media_file(input_path, timings=timings)
+            duration = _as_float(((media_info or {}).get('format') or {}).get('duration')) or 0.0
+            fix_progress.correct_duration(expected_duration, duration)
+        # The output is a remux of the input, so it needs about as much room as the input itself
+        input_size = input_path.stat().st_size
+        try:
+            _check_free_space(output_path.parent, input_size)
+        except _InsufficientSpace as space_err:
+            logger.error(f"... {space_err}")
+            fix_outcome["status"] = "failed"
+            fix_outcome["message"] = str(space_err)
+            return fix_outcome
+        fix_progress.start(relative_path, duration)
+        if backup_original:
+            backup_path = input_path.with_suffix(input_path.suffix + ".bak")
+            if backup_path.exists():
+                logger.warning(f"... Backup exists, skipping backup.")
+            else:
+                try:
+                    logger.info(f"... Creating backup ({backup_method})")
+                    backup_started = time.monotonic()
+                    fix_outcome["backup_method"] = _create_backup(input_path, backup_path, backup_method, input_size, logger)
+                    if timings:
+                        timings.add("backup", time.monotonic() - backup_started)
+                    fix_outcome["backup_path"] = str(backup_path)
+                    logger.info(f"... Backup created ({fix_outcome['backup_method']}).")
+                except Exception as bk_err:
+                    logger.error(f"... Backup failed: {bk_err}")
+                    fix_outcome["status"] = "failed"
+                    fix_outcome["message"] = f"Backup failed: {bk_err}"
+                    return fix_outcome
+
+        ffmpeg_cmd = [
+            "ffmpeg",
+            "-y",
+            "-i", str(input_path),
+            "-map", "0",
+            "-map_metadata", "0",
+            "-c:v", "copy",
+            *plan["codec_args"],
+            "-c:s", "copy",
+            *(["-threads", str(threads_per_job)] if threads_per_job else []),
+            "-loglevel", "warning",
+            str(partial_path)
+        ]
+        logger.info(f"Task {task_id}: Running command: {shlex.join(ffmpeg_cmd)}")
+
+        def report_progress(block: dict):
+            fix_progress.update(relative_path, duration, block)
+            events.publish(task_id)
 
-            if not input_path_str:
+        copied_count = len(plan["copy_tracks"])
+        fix_outcome["estimated_seconds_saved"] = round(duration * copied_count / ESTIMATED_AUDIO_ENCODE_SPEED, 1)
+        try:
+            job_started = time.monotonic()
+            returncode, stderr = _run_ffmpeg(ffmpeg_cmd, is_cancelled, timeout=3600, on_progress=report_progress)
+            ffmpeg_seconds = time.monotonic() - job_started
+            metrics.FIX_SECONDS.observe(ffmpeg_seconds, status="success" if returncode == 0 else "failed")
+            if returncode == 0 and duration and ffmpeg_seconds > 0:
+                metrics.FIX_SPEED.observe(duration / ffmpeg_seconds)
+            if timings:
+                timings.add("ffmpeg", ffmpeg_seconds)
+            verify_error = None
+            if returncode == 0 and in_place:
+                verify_started = time.monotonic()
+                verify_error = _verify_replacement(media_info, partial_path)
+                if timings:
+                    timings.add("verify", time.monotonic() - verify_started)
+            if verify_error:
+                logger.error(f"... Output check failed for {relative_path}, original kept: {verify_error}")
                 fix_outcome["status"] = "failed"
-                fix_outcome["message"] = "Missing file path"
-                fail_count += 1
-                fix_results_list.append(fix_outcome)
-                continue
-            input_path = pathlib.Path(input_path_str)
-            if not input_path.is_file():
+                fix_outcome["message"] = f"Output check failed: {verify_error}"
+                _remove_partial_output(partial_path, logger, "")
+            elif returncode == 0:
+                if in_place:
+                    shutil.copymode(input_path, partial_path)
+                os.replace(partial_path, output_path)
+                logger.info(f"... Success: {output_path.name}" + (" (replaced original)" if in_place else ""))
+                fix_outcome["status"] = "success"
+                fix_outcome["message"] = "Fix completed, original replaced" if in_place else "Fix completed"
+                fix_outcome["output_path"] = str(output_path)
+                if plan["transcode_tracks"]:
+                    # Whole-run wall time per encoded track, times the tracks that were stream-copied instead
+                    seconds_per_track = ffmpeg_seconds / len(plan["transcode_tracks"])
+                    fix_outcome["extrapolated_seconds_saved"] = round(seconds_per_track * copied_count, 1)
+            else:
+                logger.error(f"... ffmpeg failed code {returncode} for {relative_path}. Error:\n{stderr[-1000:]}")
                 fix_outcome["status"] = "failed"
-                fix_outcome["message"] = "Input file not found"
-                fail_count += 1
-                fix_results_list.append(fix_outcome)
-                continue
-            output_filename = f"{input_path.stem}{output_suffix}{input_path.suffix}"
-            output_path = input_path.parent / output_filename
-            if output_path.exists():
-                logger.info(f"... Skipping, output exists")
-                fix_outcome["status"] = "skipped"
-                fix_outcome["message"] = "Output file already exists"
-                skipped_count += 1
-                fix_results_list.append(fix_outcome)
-                continue
-            if backup_original:
-                backup_path = input_path.with_suffix(input_path.suffix + ".bak")
-                if backup_path.exists():
-                    logger.warning(f"... Backup exists, skipping backup.")
-                else:
-                    try:
-                        logger.info(f"... Creating backup")
-                        shutil.copy2(input_path, backup_path)
-                        fix_outcome["backup_path"] = str(backup_path)
-                        logger.info(f"... Backup created.")
-                    except Exception as bk_err:
-                        logger.error(f"... Backup failed: {bk_err}")
-                        fix_outcome["status"] = "failed"
-                        fix_outcome["message"] = f"Backup failed: {bk_err}"
-                        fail_count += 1
-                        fix_results_list.append(fix_outcome)
-                        continue
-
-            ffmpeg_cmd = [
-                "ffmpeg",
-                "-y",
-                "-i", str(input_path),
-                "-map", "0",
-                "-map_metadata", "0",
-                "-c:v", "copy",
-                "-c:a", target_audio_codec,
-                *(["-b:a", target_audio_bitrate] if target_audio_bitrate else []),
-                "-c:s", "copy",
-                "-loglevel", "warning",
-                str(output_path)
-            ]
-            logger.info(f"Task {task_id}: Running command: {shlex.join(ffmpeg_cmd)}")
+                fix_outcome["message"] = f"ffmpeg error (code {returncode})"
+                _remove_partial_output(partial_path, logger, "")
+        except _FixCancelled:
+            logger.info(f"Task {task_id}: ffmpeg terminated for {relative_path} (task cancelled)")
+            _remove_partial_output(partial_path, logger, " after cancellation")
+            raise
+        except subprocess.TimeoutExpired:
+            logger.error(f"Task {task_id}: ffmpeg timed out for {relative_path}")
+            fix_outcome["status"] = "failed"
+            fix_outcome["message"] = "ffmpeg timeout"
+            _remove_partial_output(partial_path, logger, " after timeout")
+        except Exception as exec_e:
+            logger.error(f"Task {task_id}: Error running ffmpeg for {relative_path}: {exec_e}", exc_info=True)
+            fix_outcome["status"] = "failed"
+            fix_outcome["message"] = f"Execution error: {exec_e}"
+            _remove_partial_output(partial_path, logger, " after execution error")
+        return fix_outcome
+    finally:
+        fix_progress.finish(relative_path, duration, transcoded=fix_outcome["status"] == "success")
+
+def run_fix_task(task_id: str, files_to_fix: list[dict], fix_options: dict, tasks: dict, logger, profile: dict | None = None, resume: bool = False,
+                 rules: utils.CompiledProfile | None = None):
+    """Background task to attempt fixes using ffmpeg, running up to `concurrency` jobs at once.
+
+    With a profile, each file's fix is planned per audio track (see _plan_audio_fix); `rules` is its
+    compiled form when the caller already has one.
+    Outcomes are recorded in input order, so with resume=True an interrupted task continues after its
+    last stored outcome; files that were mid-encode are redone (their outputs were never renamed into place).
+    """
+    if task_id not in tasks:
+        tasks[task_id] = {}
+    cancel_requested = bool(tasks[task_id].get("cancel_requested"))
+    if resume:
+        tasks[task_id].update({"status": "running", "current_file": "Resuming fix...", "active_files": {}, "error": None, "cancel_requested": cancel_requested})
+        # A fix interrupted while still queued never got its progress fields
+        for field, default in (("result", []), ("processed_count", 0), ("progress", 0), ("total_files", len(files_to_fix)),
+                               ("encode_speed", None), ("eta_seconds", None), ("transcode_seconds_saved", {"estimated": 0.0, "extrapolated": 0.0})):
+            if tasks[task_id].get(field) is None:
+                tasks[task_id][field] = default
+    else:
+        tasks[task_id].update({
+            "status": "running",
+            "result": [],
+            "processed_count": 0,
+            "progress": 0,
+            "current_file": "Starting fix...",
+            "total_files": len(files_to_fix),
+            "active_files": {},
+            "encode_speed": None,
+            "eta_seconds": None,
+            "transcode_seconds_saved": {"estimated": 0.0, "extrapolated": 0.0},
+            "error": None,
+            "cancel_requested": cancel_requested
+        })
+    concurrency = max(1, int(fix_options.get('concurrency') or Config.FIX_WORKERS))
+    rules = rules or (utils.compile_profile(profile) if profile else None)
+    fix_results_list = tasks[task_id]["result"]
+    active_files = tasks[task_id]["active_files"]
+    status_counts = collections.Counter(outcome.get("status") for outcome in fix_results_list) if resume else collections.Counter()
+    processed_count = len(fix_results_list)
+    success_count = status_counts["success"]
+    fail_count = status_counts["failed"]
+    skipped_count = processed_count - success_count - fail_count
+    remaining_files = files_to_fix[processed_count:]
+    logger.info(f"Task {task_id}: Background fix {'resumed' if resume else 'started'} for {len(remaining_files)} files ({concurrency} concurrent job(s)).")
+    fix_cancelled = False
+    is_cancelled = lambda: _cancel_requested(tasks, task_id)
+    fix_progress = _FixProgress(tasks[task_id], remaining_files)
+    timings = _task_timings(tasks[task_id])
 
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"fix-{task_id[-8:]}") as executor:
+            fix_one = functools.partial(_fix_media_file, task_id, fix_options=fix_options,
+                                       fix_progress=fix_progress, is_cancelled=is_cancelled, logger=logger, rules=rules,
+                                       timings=timings)
+            ordered_outcomes = _ordered_map(executor, fix_one, remaining_files, concurrency, max_ahead=concurrency * 16)
             try:
-                result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, check=False, encoding='utf-8', errors='ignore', timeout=3600)
-                if result.returncode == 0:
-                    logger.info(f"... Success: {output_path.name}")
-                    fix_outcome["status"] = "success"
-                    fix_outcome["message"] = "Fix completed"
-                    fix_outcome["output_path"] = str(output_path)
-                    success_count += 1
-                else:
-                    logger.error(f"... ffmpeg failed code {result.returncode} for {relative_path}. Error:\n{result.stderr[-1000:]}")
-                    fix_outcome["status"] = "failed"
-                    fix_outcome["message"] = f"ffmpeg error (code {result.returncode})"
-                    fail_count += 1
-                    if output_path.exists():
-                        try:
-                            output_path.unlink()
-                            logger.info(f"... Deleted incomplete output file.")
-                        except Exception as del_e:
-                            logger.warning(f"... Failed to delete incomplete output file: {del_e}")
-            except subprocess.TimeoutExpired:
-                logger.error(f"Task {task_id}: ffmpeg timed out for {relative_path}")
-                fix_outcome["status"] = "failed"
-                fix_outcome["message"] = "ffmpeg timeout"
-                fail_count += 1
-                if output_path.exists():
+                while True:
                     try:
-                        output_path.unlink()
-                        logger.info(f"... Deleted incomplete output file after timeout.")
-                    except Exception as del_e:
-                        logger.warning(f"... Failed to delete incomplete output file after timeout: {del_e}")
-            except Exception as exec_e:
-                logger.error(f"Task {task_id}: Error running ffmpeg for {relative_path}: {exec_e}", exc_info=True)
-                fix_outcome["status"] = "failed"
-                fix_outcome["message"] = f"Execution error: {exec_e}"
-                fail_count += 1
-                if output_path.exists():
-                    try:
-                        output_path.unlink()
-                        logger.info(f"... Deleted potentially incomplete output file after execution error.")
-                    except Exception as del_e:
-                        logger.warning(f"... Failed to delete potentially incomplete output file after execution error: {del_e}")
-
-            fix_results_list.append(fix_outcome)
+                        file_info, fix_outcome = next(ordered_outcomes)
+                    except StopIteration:
+                        break
+                    except _FixCancelled:
+                        raise StopIteration("Fix cancelled by user")
+                    if is_cancelled():
+                        raise StopIteration("Fix cancelled by user")
+                    processed_count += 1
+                    if fix_outcome["status"] == "success":
+                        success_count += 1
+                    elif fix_outcome["status"] == "failed":
+                        fail_count += 1
+                    else:
+                        skipped_count += 1
+                    tasks[task_id]["progress"] = int((processed_count / tasks[task_id]["total_files"]) * 100) if tasks[task_id]["total_files"] > 0 else 0
+                    tasks[task_id]["processed_count"] = processed_count
+                    seconds_saved = tasks[task_id]["transcode_seconds_saved"]
+                    tasks[task_id]["transcode_seconds_saved"] = {
+                        "estimated": round(seconds_saved["estimated"] + fix_outcome["estimated_seconds_saved"], 1),
+                        "extrapolated": round(seconds_saved.get("extrapolated", 0.0) + (fix_outcome["extrapolated_seconds_saved"] or 0.0), 1)
+                    }
+                    running = sorted(active_files)
+                    tasks[task_id]["current_file"] = f"Processing: {', '.join(running)}" if running else f"Processed: {fix_outcome['relative_path']}"
+                    logger.info(f"Task {task_id}: Fixed {processed_count}/{tasks[task_id]['total_files']}: {fix_outcome['relative_path']} ({fix_outcome['status']})")
+                    fix_results_list.append(fix_outcome)
+                    tasks[task_id]["timings"] = timings.snapshot()
+                    events.publish(task_id)
+            finally:
+                ordered_outcomes.close()
+                tasks[task_id]["timings"] = timings.snapshot()
 
         final_msg = f"Finished. Success: {success_count}, Failed: {fail_count}, Skipped: {skipped_count}"
         tasks[task_id]["status"] = "completed"
         tasks[task_id]["current_file"] = final_msg
         tasks[task_id]["progress"] = 100
+        tasks[task_id]["eta_seconds"] = 0
         logger.info(f"Task {task_id}: Fix completed. {final_msg}")
     except StopIteration as stop_reason:
         reason_str = str(stop_reason) if str(stop_reason) else "Unknown"
@@ -344,3 +1218,4 @@ def run_fix_task(task_id: str, files_to_fix: list[dict], fix_options: dict, task
         if not fix_cancelled:
             tasks[task_id]["status"] = "completed"
             logger.warning(f"Task {task_id}: Fix task ended but status 'running'. Setting 'completed'.")
+    events.publish(task_id)
@@ -0,0 +1,386 @@
+import os
+import time
+import errno
+import select
+import struct
+import logging
+import pathlib
+import threading
+import ctypes
+import ctypes.util
+from concurrent.futures import ThreadPoolExecutor
+import utils
+from .config import Config
+from .scan_history import get_scan_history
+from .tasks import _analyze_media_file, _history_item
+try:
+    import fcntl
+except ImportError: # Not available on Windows; every process may then watch
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# linux/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct("iIII")
+
+class _Inotify:
+    """Minimal inotify binding through libc (ctypes), watching directory trees."""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 failed: {os.strerror(error)}")
+        self.paths = {}
+
+    def watch_tree(self, root: str) -> list[str]:
+        """Watches root and every directory below it (symlinks not followed).
+        Returns the directories left unwatched because the watch limit was reached; what is below them is skipped."""
+        unwatched = []
+        for current_dir, subdirs, _ in os.walk(root):
+            try:
+                self.add_watch(current_dir)
+            except OSError as e:
+                if e.errno != errno.ENOSPC:
+                    raise
+                unwatched.append(current_dir)
+                subdirs.clear()
+        return unwatched
+
+    def add_watch(self, path: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return # Removed before we got to it
+            # ENOSPC here means fs.inotify.max_user_watches is too low for the library
+            raise OSError(error, f"inotify_add_watch failed for '{path}': {os.strerror(error)}")
+        self.paths[wd] = path
+
+    def read_events(self, timeout: float) -> list[tuple[str | None, int, str]]:
+        """Waits up to timeout for events; returns (watched directory, mask, name) tuples."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_len].rstrip(b"\0"))
+            offset += name_len
+            directory = self.paths.get(wd)
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+            events.append((directory, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class LibraryWatcher:
+    """Keeps the scan snapshot of a few library roots up to date as files arrive, change or disappear.
+
+    Changes are picked up with inotify, or by periodically comparing each tree's size/mtime against
+    the snapshot when inotify is unavailable (WATCH_MODE=poll, non-Linux hosts, network mounts).
+    Changed paths are debounced, then probed and checked like a scan would, and upserted into the
+    (root, profile) snapshot in scan_history; incremental scans and /api/watch/results read it.
+    load_profile(name) returns the profile's profiles.LoadedProfile (or None), so each batch uses its
+    current rules. With on_incompatible, incompatible files of each batch are handed over (e.g. to queue a fix).
+    Batches are at most MAX_BATCH_FILES files, with inotify events read in between, so a large resync
+    (e.g. the first start, without a snapshot) doesn't leave the kernel event queue to overflow.
+    Subtrees inotify can't watch (fs.inotify.max_user_watches exhausted) are polled like that instead.
+    """
+    MAX_BATCH_FILES = 100
+
+    def __init__(self, roots: list[str], profile_name: str, load_profile, mode: str = "auto", debounce_seconds: float = 10.0,
+                 poll_seconds: float = 300.0, on_incompatible=None):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.profile_name = profile_name
+        self.load_profile = load_profile
+        self.requested_mode = mode
+        self.mode = None
+        self.debounce_seconds = debounce_seconds
+        self.poll_seconds = poll_seconds
+        self.on_incompatible = on_incompatible
+        self._pending = {}
+        self._removed = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._inotify = None
+        self._polled_trees = set()
+        self._thread = None
+        self._counters = {"checked": 0, "removed": 0, "batches": 0, "resyncs": 0, "handed_over": 0}
+        self._last_batch_at = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="library-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "roots": list(self.roots),
+                "profile_name": self.profile_name,
+                "pending": len(self._pending),
+                "pending_removals": len(self._removed),
+                "watched_directories": len(self._inotify.paths) if self._inotify else None,
+                "polled_trees": sorted(self._polled_trees),
+                "last_batch_at": self._last_batch_at,
+                **self._counters
+            }
+
+    # --- Event sources ---
+    def _run(self):
+        self.mode = self._start_inotify() if self.requested_mode in ("auto", "inotify") else "poll"
+        logger.info(f"Library watcher started ({self.mode}) for {', '.join(self.roots)} with profile '{self.profile_name}'.")
+        self._resync() # Catch up on changes made while the watcher wasn't running
+        next_poll = time.monotonic() + self.poll_seconds
+        backlog = False
+        while not self._stop.is_set():
+            try:
+                wait_seconds = 0.0 if backlog else 1.0
+                if self._inotify:
+                    self._handle_events(self._inotify.read_events(timeout=wait_seconds))
+                else:
+                    self._stop.wait(wait_seconds)
+                if time.monotonic() >= next_poll:
+                    if not self._inotify:
+                        self._resync()
+                    elif self._polled_trees:
+                        self._resync(sorted(self._polled_trees))
+                    next_poll = time.monotonic() + self.poll_seconds
+                backlog = self._process_due()
+            except Exception as e:
+                logger.error(f"Library watcher error: {e}", exc_info=True)
+                self._stop.wait(5.0)
+        if self._inotify:
+            self._inotify.close()
+
+    def _start_inotify(self) -> str:
+        try:
+            self._inotify = _Inotify()
+            for root in self.roots:
+                self._watch_tree(root)
+            return "inotify"
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify unavailable ({e}); polling every {self.poll_seconds:.0f}s instead.")
+            if self._inotify:
+                self._inotify.close()
+                self._inotify = None
+            return "poll"
+
+    def _watch_tree(self, path: str):
+        """Watches a directory tree; parts inotify has no watches left for are polled instead."""
+        unwatched = self._inotify.watch_tree(path)
+        if unwatched:
+            logger.warning(f"inotify watch limit reached (fs.inotify.max_user_watches); polling {len(unwatched)} tree(s) under '{path}' "
+                           f"every {self.poll_seconds:.0f}s instead, e.g. '{unwatched[0]}'.")
+            with self._lock:
+                self._polled_trees.update(unwatched)
+
+    def _handle_events(self, events: list):
+        for directory, mask, name in events:
+            try:
+                self._handle_event(directory, mask, name)
+            except Exception as e: # One bad event must not drop the rest of the batch
+                logger.error(f"Library watcher could not handle event for '{os.path.join(directory or '', name)}': {e}", exc_info=True)
+
+    def _handle_event(self, directory: str | None, mask: int, name: str):
+        if mask & IN_Q_OVERFLOW:
+            logger.warning("inotify queue overflowed; rescanning the watched trees.")
+            self._resync()
+            return
+        if directory is None or not name:
+            return
+        path = os.path.join(directory, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                # A directory moved or created in (e.g. a season folder): watch it and check what it already holds
+                self._watch_tree(path)
+                for entry in utils.iter_media_files(pathlib.Path(path)):
+                    self._mark_changed(entry.path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._mark_removed_under(path)
+        elif mask & (IN_CREATE | IN_CLOSE_WRITE | IN_MOVED_TO):
+            self._mark_changed(path)
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+            self._mark_removed(path)
+
+    def _resync(self, trees: list[str] | None = None):
+        """Compares every root (or only the given trees below them) against its snapshot: new or modified files are queued,
+        vanished ones removed."""
+        scan_history = get_scan_history()
+        if scan_history is None:
+            return
+        for tree in trees or self.roots:
+            root = self._root_of(tree)
+            if root is None:
+                continue
+            previous = scan_history.load(root, self.profile_name)
+            prefix = tree.rstrip(os.sep) + os.sep
+            known = {path: stored for path, stored in (previous["files"] if previous else {}).items() if path.startswith(prefix)}
+            seen = set()
+            for entry in utils.iter_media_files(pathlib.Path(tree), should_stop=self._stop.is_set):
+                seen.add(entry.path)
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                stored = known.get(entry.path)
+                if stored is None or stored[0] != stat.st_size or stored[1] != stat.st_mtime_ns:
+                    self._mark_changed(entry.path, now=0.0) # Already settled; no need to wait out the debounce
+            for path in known:
+                if path not in seen:
+                    self._mark_removed(path)
+        with self._lock:
+            self._counters["resyncs"] += 1
+
+    @staticmethod
+    def _is_media_path(path: str) -> bool:
+        # Fix outputs are written as <stem>.partial<ext> and renamed when complete
+        return os.path.splitext(path)[1].lower() in utils.SUPPORTED_EXTENSIONS and ".partial." not in os.path.basename(path)
+
+    def _mark_changed(self, path: str, now: float | None = None):
+        if not self._is_media_path(path):
+            return
+        with self._lock:
+            self._pending[path] = time.monotonic() if now is None else now
+            self._removed.discard(path)
+
+    def _mark_removed(self, path: str):
+        if not self._is_media_path(path):
+            return
+        with self._lock:
+            self._pending.pop(path, None)
+            self._removed.add(path)
+
+    def _mark_removed_under(self, directory: str):
+        scan_history = get_scan_history()
+        root = self._root_of(directory)
+        previous = scan_history.load(root, self.profile_name) if scan_history and root else None
+        prefix = directory.rstrip(os.sep) + os.sep
+        for path in (previous or {}).get("files", {}):
+            if path.startswith(prefix):
+                self._mark_removed(path)
+
+    # --- Processing ---
+    def _process_due(self) -> bool:
+        """Checks up to MAX_BATCH_FILES paths whose last event is older than the debounce window (oldest first), and drops
+        removed ones from the snapshot. Returns whether more paths were already due."""
+        now = time.monotonic()
+        with self._lock:
+            due = sorted((last_event, path) for path, last_event in self._pending.items() if now - last_event >= self.debounce_seconds)
+            backlog = len(due) > self.MAX_BATCH_FILES
+            due = [path for _, path in due[:self.MAX_BATCH_FILES]]
+            for path in due:
+                del self._pending[path]
+            removed = list(self._removed)
+            self._removed.clear()
+        if not due and not removed:
+            return False
+        scan_history = get_scan_history()
+        loaded_profile = self.load_profile(self.profile_name)
+        if scan_history is None or loaded_profile is None:
+            logger.error(f"Library watcher can't record changes (profile '{self.profile_name}' or scan history unavailable).")
+            return backlog
+        settled = []
+        for path in due:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue # Gone again before we got to it
+            if time.time() - stat.st_mtime_ns / 1e9 < self.debounce_seconds:
+                self._mark_changed(path) # Still being written (e.g. a slow copy); look again later
+            else:
+                settled.append((path, stat))
+        fingerprint = loaded_profile.fingerprint
+        rules = loaded_profile.rules
+        by_root = {}
+        for path, stat in settled:
+            root = self._root_of(path)
+            if root:
+                by_root.setdefault(root, []).append((path, stat))
+        for path in removed:
+            root = self._root_of(path)
+            if root:
+                scan_history.remove_files(root, self.profile_name, [path])
+        incompatible = []
+        with ThreadPoolExecutor(max_workers=max(1, Config.SCAN_WORKERS), thread_name_prefix="watch-probe") as executor:
+            for root, files in by_root.items():
+                verdict_rules = self._verdict_rules(scan_history, root, rules)
+                items = list(executor.map(lambda file: _analyze_media_file("watch", pathlib.Path(file[0]), pathlib.Path(root), rules, None, logger,
+                                                                           file_stat=file[1], verdict_rules=verdict_rules), files))
+                scan_history.upsert_files(root, self.profile_name, fingerprint,
+                                          [(path, stat.st_size, stat.st_mtime_ns, _history_item(root, item)) for (path, stat), item in zip(files, items)])
+                incompatible.extend(item for item in items if not item["is_compatible"] and not item.get("error"))
+                logger.info(f"Library watcher checked {len(items)} changed file(s) under '{root}'.")
+        with self._lock:
+            self._counters["checked"] += len(settled)
+            self._counters["removed"] += len(removed)
+            self._counters["batches"] += 1
+            self._last_batch_at = time.time()
+        if incompatible and self.on_incompatible:
+            self.on_incompatible(incompatible)
+            with self._lock:
+                self._counters["handed_over"] += len(incompatible)
+        return backlog
+
+    def _verdict_rules(self, scan_history, root: str, rules: utils.CompiledProfile) -> dict | None:
+        """{profile name: rules} for the per-profile verdicts the root's snapshot holds, like the scan that wrote it (None if it has none)."""
+        names = scan_history.verdict_profiles(root, self.profile_name)
+        if not names:
+            return None
+        verdict_rules = {}
+        for name in names:
+            loaded_profile = self.load_profile(name) if name != self.profile_name else None
+            if name != self.profile_name and loaded_profile is None:
+                logger.warning(f"Library watcher: profile '{name}' of the '{root}' snapshot no longer exists; its verdicts are left out.")
+                continue
+            verdict_rules[name] = loaded_profile.rules if loaded_profile else rules
+        return verdict_rules
+
+    def _root_of(self, path: str) -> str | None:
+        return next((root for root in self.roots if path == root or path.startswith(root.rstrip(os.sep) + os.sep)), None)
+
+_watch_lock_file = None
+
+def start_library_watcher(load_profile, on_incompatible=None) -> LibraryWatcher | None:
+    """Starts the watcher for Config.WATCH_ROOTS, in one process only (a lock file in CONFIG_DIR decides which)."""
+    global _watch_lock_file
+    if not Config.WATCH_ROOTS:
+        return None
+    if not Config.WATCH_PROFILE:
+        logger.error("WATCH_ROOTS is set but WATCH_PROFILE is not; library watcher disabled.")
+        return None
+    if fcntl is not None:
+        lock_path = pathlib.Path(Config.CONFIG_DIR) / "watch.lock"
+        try:
+            _watch_lock_file = open(lock_path, "w")
+            fcntl.flock(_watch_lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            logger.info("Library watcher already running in another process.")
+            return None
+    watcher = LibraryWatcher(Config.WATCH_ROOTS, Config.WATCH_PROFILE, load_profile, Config.WATCH_MODE, Config.WATCH_DEBOUNCE_SECONDS,
+                             Config.WATCH_POLL_SECONDS, on_incompatible)
+    watcher.start()
+    return watcher
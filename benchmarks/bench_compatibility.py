@@ -0,0 +1,82 @@
+"""
+Micro-benchmark: utils.check_compatibility vs. a compiled profile's evaluate().
+
+Builds a corpus of synthetic ffprobe JSON (mixed containers, codecs, levels and track counts),
+times both checkers over it and reports how many verdicts differ. Differences are expected only
+where the compiled rules apply the unsupported_*_strict fields.
+
+    python benchmarks/bench_compatibility.py [--files 20000] [--repeat 5] [--profile "Plex - Generic"]
+"""
+import argparse
+import json
+import pathlib
+import random
+import sys
+import time
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+import utils  # noqa: E402
+
+CONTAINERS = ["matroska,webm", "mov,mp4,m4a,3gp,3g2,mj2", "avi", "mpegts", "asf", "flv"]
+VIDEO_CODECS = ["h264", "h264", "h264", "hevc", "hevc", "mpeg4", "vc1", "av1"]
+H264_LEVELS = [30, 31, 40, 41, 42, 50, 51]
+AUDIO_CODECS = ["aac", "aac", "ac3", "eac3", "dts", "truehd", "flac", "mp3", "opus", "pcm_s16le"]
+SUBTITLE_CODECS = ["subrip", "subrip", "ass", "mov_text", "hdmv_pgs_subtitle", "dvd_subtitle"]
+
+def synthetic_probe(rng: random.Random) -> dict:
+    """Returns one fake `ffprobe -show_format -show_streams` result."""
+    streams = []
+    video_codec = rng.choice(VIDEO_CODECS)
+    streams.append({"index": 0, "codec_type": "video", "codec_name": video_codec, "profile": "High",
+                    "level": rng.choice(H264_LEVELS) if video_codec == "h264" else 120})
+    for _ in range(rng.randint(1, 4)):
+        streams.append({"index": len(streams), "codec_type": "audio", "codec_name": rng.choice(AUDIO_CODECS),
+                        "channels": rng.choice([2, 6, 8]), "tags": {"language": rng.choice(["eng", "fre", "spa", "jpn"])}})
+    for _ in range(rng.randint(0, 6)):
+        streams.append({"index": len(streams), "codec_type": "subtitle", "codec_name": rng.choice(SUBTITLE_CODECS)})
+    return {"format": {"format_name": rng.choice(CONTAINERS), "duration": f"{rng.uniform(600, 9000):.3f}"}, "streams": streams}
+
+def time_checker(check, corpus: list[dict], repeat: int) -> tuple[float, list]:
+    """Returns (best seconds per pass over the corpus, verdicts of the last pass)."""
+    best = float("inf")
+    verdicts = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        verdicts = [check(media_info) for media_info in corpus]
+        best = min(best, time.perf_counter() - start)
+    return best, verdicts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=20000, help="Synthetic probe results in the corpus")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed passes per checker (best is reported)")
+    parser.add_argument("--profile", default="Plex - Generic", help="Profile name under ./profiles")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    with open(REPO_ROOT / "profiles" / f"{args.profile}.json", "r", encoding="utf-8") as f:
+        profile = json.load(f)
+    rng = random.Random(args.seed)
+    corpus = [synthetic_probe(rng) for _ in range(args.files)]
+
+    legacy_seconds, legacy_verdicts = time_checker(lambda media_info: utils.check_compatibility(media_info, profile), corpus, args.repeat)
+    compile_start = time.perf_counter()
+    rules = utils.compile_profile(profile)
+    compile_seconds = time.perf_counter() - compile_start
+    compiled_seconds, compiled_verdicts = time_checker(rules.evaluate, corpus, args.repeat)
+
+    differing = sum(1 for legacy, compiled in zip(legacy_verdicts, compiled_verdicts) if legacy[0] != compiled[0])
+    report = {
+        "files": args.files,
+        "profile": args.profile,
+        "legacy": {"seconds": round(legacy_seconds, 4), "files_per_sec": round(args.files / legacy_seconds)},
+        "compiled": {"seconds": round(compiled_seconds, 4), "files_per_sec": round(args.files / compiled_seconds),
+                     "compile_seconds": round(compile_seconds, 6)},
+        "speedup": round(legacy_seconds / compiled_seconds, 2),
+        "verdicts_differing": differing
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+End-to-end benchmark: run_scan_task and run_fix_task over a synthetic media library.
+
+Builds a nested library with ffmpeg lavfi sources (mixed containers, video codecs and H.264 levels,
+1-3 audio tracks of mixed codecs and layouts, text subtitles, some non-media files), then runs a cold
+scan (empty probe cache), a warm scan (every probe cached) and a fix of the incompatible files, each
+through the real task functions, task store and /api/status endpoint. Reports JSON meant to be
+diffed between commits:
+
+    files/sec, p50/p95/max per-file probe and fix latency, peak RSS, /api/status payload sizes,
+    and the task's own "timings" breakdown.
+
+The corpus is kept (and reused while --files/--seed/--duration match), so repeated runs only time
+the scan and fix. Needs ffmpeg and ffprobe on PATH.
+
+    python benchmarks/bench_end_to_end.py [--files 200] [--fix-files 20] [--workers 4] [--output result.json]
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import json
+import logging
+import math
+import os
+import pathlib
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+CORPUS_VERSION = 1
+MANIFEST_NAME = ".bench-corpus.json"
+# Per container: the video codecs, audio codecs and subtitle codecs it can hold
+CONTAINERS = {
+    "mkv": (["h264", "h264", "hevc", "mpeg4", "mpeg2video"], ["aac", "ac3", "eac3", "dts", "flac", "mp3", "truehd"], ["srt", "ass"]),
+    "mp4": (["h264", "h264", "hevc", "mpeg4"], ["aac", "ac3", "eac3", "mp3"], ["mov_text"]),
+    "mov": (["h264", "mpeg4"], ["aac", "ac3", "mp3"], ["mov_text"]),
+    "avi": (["mpeg4", "h264"], ["mp3", "ac3"], []),
+    "ts": (["h264", "hevc", "mpeg2video"], ["aac", "ac3", "eac3", "mp2"], []),
+}
+CONTAINER_WEIGHTS = ["mkv"] * 4 + ["mp4"] * 2 + ["mov", "avi", "ts"]
+H264_LEVELS = ["3.0", "3.1", "4.0", "4.1", "4.2", "5.0", "5.1"]
+VIDEO_ARGS = {
+    "h264": ["-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p"],
+    "hevc": ["-c:v", "libx265", "-preset", "ultrafast", "-x265-params", "log-level=error", "-pix_fmt", "yuv420p"],
+    "mpeg4": ["-c:v", "mpeg4"],
+    "mpeg2video": ["-c:v", "mpeg2video"],
+}
+AUDIO_ENCODERS = {"aac": "aac", "ac3": "ac3", "eac3": "eac3", "dts": "dca", "flac": "flac", "mp3": "libmp3lame", "truehd": "truehd", "mp2": "mp2"}
+STEREO_ONLY = {"mp3", "mp2"}
+SUBTITLE_ENCODERS = {"srt": "srt", "ass": "ass", "mov_text": "mov_text"}
+LANGUAGES = ["eng", "fre", "spa", "jpn", "ger"]
+SUBTITLES_SRT = "1\n00:00:00,000 --> 00:00:01,000\nBenchmark subtitle\n\n2\n00:00:01,000 --> 00:00:02,000\nSecond line\n"
+
+def file_spec(seed: int, n: int) -> dict:
+    """The deterministic layout and stream mix of corpus file n."""
+    rng = random.Random(seed * 1_000_003 + n)
+    container = rng.choice(CONTAINER_WEIGHTS)
+    video_codecs, audio_codecs, subtitle_codecs = CONTAINERS[container]
+    video = rng.choice(video_codecs)
+    audio = []
+    for _ in range(rng.randint(1, 3)):
+        codec = rng.choice(audio_codecs)
+        audio.append({"codec": codec, "channels": 2 if codec in STEREO_ONLY else rng.choice([2, 6]), "language": rng.choice(LANGUAGES)})
+    subtitles = [rng.choice(subtitle_codecs) for _ in range(rng.randint(0, 2))] if subtitle_codecs else []
+    if rng.random() < 0.6:
+        relative_dir = f"Shows/Show {n // 40:03d}/Season {n // 10 % 4 + 1:02d}"
+        name = f"Show {n // 40:03d} - S{n // 10 % 4 + 1:02d}E{n % 10 + 1:02d}"
+    else:
+        relative_dir = f"Movies/Movie {n:05d} ({1970 + n % 55})"
+        name = f"Movie {n:05d}"
+    return {"relative_path": f"{relative_dir}/{name}.{container}", "container": container, "video": video,
+            "level": rng.choice(H264_LEVELS) if video == "h264" else None, "audio": audio, "subtitles": subtitles}
+
+def ffmpeg_command(spec: dict, output: pathlib.Path, subtitle_file: pathlib.Path, duration: float) -> list[str]:
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+           "-f", "lavfi", "-i", f"testsrc2=size=160x90:rate=10:duration={duration}",
+           "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}"]
+    if spec["subtitles"]:
+        cmd += ["-i", str(subtitle_file)]
+    cmd += ["-map", "0:v"] + VIDEO_ARGS[spec["video"]]
+    if spec["level"]:
+        cmd += ["-level:v", spec["level"]]
+    for index, track in enumerate(spec["audio"]):
+        cmd += ["-map", "1:a", f"-c:a:{index}", AUDIO_ENCODERS[track["codec"]], f"-ac:a:{index}", str(track["channels"]),
+                f"-metadata:s:a:{index}", f"language={track['language']}"]
+    for index, codec in enumerate(spec["subtitles"]):
+        cmd += ["-map", "2:s", f"-c:s:{index}", SUBTITLE_ENCODERS[codec]]
+    return cmd + ["-strict", "-2", "-shortest", str(output)]
+
+def build_corpus(corpus: pathlib.Path, files: int, seed: int, duration: float, jobs: int) -> dict:
+    """Generates the corpus unless a matching one is already there. Returns its manifest."""
+    wanted = {"version": CORPUS_VERSION, "files": files, "seed": seed, "duration": duration}
+    manifest_path = corpus / MANIFEST_NAME
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+        if {key: manifest.get(key) for key in wanted} == wanted:
+            return manifest
+        shutil.rmtree(corpus)
+    elif corpus.exists() and any(corpus.iterdir()):
+        raise SystemExit(f"{corpus} is not empty and holds no benchmark corpus; pass an empty or new --corpus directory.")
+    corpus.mkdir(parents=True, exist_ok=True)
+    subtitle_file = corpus / ".bench-subtitles.srt"
+    subtitle_file.write_text(SUBTITLES_SRT)
+    specs = [file_spec(seed, n) for n in range(files)]
+    for spec in specs:
+        (corpus / spec["relative_path"]).parent.mkdir(parents=True, exist_ok=True)
+    for movie_dir in {(corpus / spec["relative_path"]).parent for spec in specs if spec["relative_path"].startswith("Movies/")}:
+        (movie_dir / "movie.nfo").write_text("<movie/>\n") # Non-media files the walk has to skip
+
+    def generate(spec: dict):
+        output = corpus / spec["relative_path"]
+        result = subprocess.run(ffmpeg_command(spec, output, subtitle_file, duration), capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed for {spec['relative_path']}: {result.stderr.strip()[-500:]}")
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        list(executor.map(generate, specs))
+    manifest = dict(wanted, generate_seconds=round(time.perf_counter() - started, 2),
+                    bytes=sum((corpus / spec["relative_path"]).stat().st_size for spec in specs))
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+def percentiles(samples: list[float]) -> dict:
+    """p50/p95/max (nearest rank) in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    rank = lambda fraction: ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+    return {"count": len(ordered), "p50_ms": round(rank(0.50) * 1000, 2), "p95_ms": round(rank(0.95) * 1000, 2), "max_ms": round(ordered[-1] * 1000, 2)}
+
+def _rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+@contextlib.contextmanager
+def peak_rss(report: dict):
+    """Samples this process's RSS while the block runs and stores the peak (MiB) in report["peak_rss_mb"].
+    Falls back to the process-lifetime peak where /proc is unavailable."""
+    peak = [_rss_bytes() or 0]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.02):
+            peak[0] = max(peak[0], _rss_bytes() or 0)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        yield
+    finally:
+        done.set()
+        sampler.join()
+        if not peak[0]:
+            peak[0] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        report["peak_rss_mb"] = round(peak[0] / 1048576, 1)
+
+@contextlib.contextmanager
+def timed_calls(module, name: str, samples: list):
+    """Records the wall time of every call to module.<name> into samples while the block runs."""
+    original = getattr(module, name)
+
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - started)
+
+    setattr(module, name, wrapper)
+    try:
+        yield
+    finally:
+        setattr(module, name, original)
+
+def status_payloads(client, task_id: str) -> dict:
+    """Sizes of the progress-only status response and of paging through every result with ?since=."""
+    progress_bytes = len(client.get(f"/api/status/{task_id}").get_data())
+    results_bytes, pages, cursor = 0, 0, 0
+    while True:
+        response = client.get(f"/api/status/{task_id}?since={cursor}")
+        body = response.get_json()
+        results_bytes += len(response.get_data())
+        pages += 1
+        cursor = body.get("cursor", cursor)
+        if not body.get("has_more"):
+            break
+    return {"progress_bytes": progress_bytes, "with_results_bytes": results_bytes, "result_pages": pages}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=200, help="Media files in the synthetic library")
+    parser.add_argument("--fix-files", type=int, default=20, help="Incompatible files to fix (0 skips the fix run)")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds of media per file")
+    parser.add_argument("--workers", type=int, default=None, help="Scan probe workers (default: SCAN_WORKERS)")
+    parser.add_argument("--fix-concurrency", type=int, default=None, help="Concurrent fix jobs (default: FIX_WORKERS)")
+    parser.add_argument("--profile", default="Plex - Generic", help="Profile name under ./profiles")
+    parser.add_argument("--corpus", type=pathlib.Path, default=pathlib.Path(tempfile.gettempdir()) / "playarr-bench-corpus",
+                        help="Where the synthetic library is generated and kept")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 2, help="Parallel ffmpeg processes while generating")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", type=pathlib.Path, help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    manifest = build_corpus(args.corpus.resolve(), args.files, args.seed, args.duration, args.jobs)
+    corpus = args.corpus.resolve()
+
+    # Config is read at import time: point the app at a throwaway CONFIG_DIR (empty probe cache and task store)
+    config_dir = tempfile.mkdtemp(prefix="playarr-bench-config-")
+    os.environ["CONFIG_DIR"] = config_dir
+    os.environ.pop("WATCH_ROOTS", None)
+    import app.tasks as task_module
+    from app import create_app
+    from app.config import Config
+    from app.probe_cache import get_probe_cache
+    from app import routes
+
+    client = create_app().test_client()
+    tasks = routes.tasks
+    logger = logging.getLogger("bench")
+    logger.setLevel(logging.WARNING)
+    with open(REPO_ROOT / "profiles" / f"{args.profile}.json", "r", encoding="utf-8") as f:
+        profile = json.load(f)
+    ffmpeg_version = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).stdout.split("\n", 1)[0]
+    commit = subprocess.run(["git", "-C", str(REPO_ROOT), "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    report = {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "ffmpeg": ffmpeg_version,
+        "cpus": os.cpu_count(),
+        "corpus": {key: manifest[key] for key in ("files", "seed", "duration", "bytes", "generate_seconds")},
+        "settings": {"workers": args.workers or Config.SCAN_WORKERS, "fix_concurrency": args.fix_concurrency or Config.FIX_WORKERS,
+                     "profile": args.profile, "probe_fast_enabled": Config.PROBE_FAST_ENABLED},
+    }
+
+    try:
+        for phase in ("scan_cold", "scan_warm"):
+            task_id = f"bench_{phase}"
+            phase_report = {}
+            probe_samples = []
+            with peak_rss(phase_report), timed_calls(task_module, "_probe_media_file", probe_samples):
+                started = time.perf_counter()
+                task_module.run_scan_task(task_id, corpus, profile, tasks, logger, workers=args.workers, profile_name=args.profile)
+                seconds = time.perf_counter() - started
+            status = client.get(f"/api/status/{task_id}").get_json()
+            processed = status.get("processed_count") or 0
+            phase_report.update({
+                "status": status.get("status"),
+                "files": processed,
+                "probe_errors": sum(1 for item in tasks[task_id]["result"] if isinstance(item, dict) and item.get("error")),
+                "seconds": round(seconds, 3),
+                "files_per_sec": round(processed / seconds, 1) if seconds else None,
+                "probe_latency": percentiles(probe_samples),
+                "status_payload": status_payloads(client, task_id),
+                "timings": status.get("timings"),
+                "probe_tiers": status.get("probe_tiers"),
+            })
+            report[phase] = phase_report
+            probe_cache = get_probe_cache()
+            if probe_cache:
+                probe_cache.flush()
+
+        if args.fix_files > 0:
+            scan_results = [item for item in tasks["bench_scan_cold"]["result"] if isinstance(item, dict) and item.get("is_compatible") is False
+                            and not item.get("error") and item.get("audio_tracks")]
+            files_to_fix = scan_results[:args.fix_files]
+            fix_options = {"output_suffix": ".benchfix", "backup": False}
+            if args.fix_concurrency:
+                fix_options["concurrency"] = args.fix_concurrency
+            phase_report = {}
+            fix_samples = []
+            with peak_rss(phase_report), timed_calls(task_module, "_fix_media_file", fix_samples):
+                started = time.perf_counter()
+                task_module.run_fix_task("bench_fix", files_to_fix, fix_options, tasks, logger, profile=profile)
+                seconds = time.perf_counter() - started
+            status = client.get("/api/status/bench_fix").get_json()
+            outcomes = tasks["bench_fix"]["result"]
+            phase_report.update({
+                "status": status.get("status"),
+                "files": len(files_to_fix),
+                "outcomes": {state: sum(1 for outcome in outcomes if outcome.get("status") == state) for state in ("success", "failed", "skipped")},
+                "seconds": round(seconds, 3),
+                "files_per_sec": round(len(files_to_fix) / seconds, 2) if seconds else None,
+                "file_latency": percentiles(fix_samples),
+                "encode_speed": status.get("encode_speed"),
+                "status_payload": status_payloads(client, "bench_fix"),
+                "timings": status.get("timings"),
+            })
+            report["fix"] = phase_report
+            for outcome in outcomes:
+                if outcome.get("output_path"):
+                    pathlib.Path(outcome["output_path"]).unlink(missing_ok=True) # Keep the corpus reusable
+        report["peak_child_rss_mb"] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * (1 if sys.platform == "darwin" else 1024) / 1048576, 1)
+    finally:
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        args.output.write_text(output + "\n")
+
+if __name__ == "__main__":
+    main()
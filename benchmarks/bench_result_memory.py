@@ -0,0 +1,93 @@
+"""
+Memory benchmark: scan results as a list of dicts vs. app.result_records.CompactResultList.
+
+Builds synthetic scan result items shaped like _analyze_media_file's output (fresh strings per item,
+as JSON decoding or f-strings would produce), measures the memory each representation holds with
+tracemalloc, and checks that the compact list converts back to identical dicts.
+
+    python benchmarks/bench_result_memory.py [--files 100000]
+"""
+import argparse
+import gc
+import json
+import pathlib
+import random
+import sys
+import time
+import tracemalloc
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+from app.result_records import CompactResultList  # noqa: E402
+
+ROOT = "/media/library"
+CONTAINERS = ["matroska", "mov", "avi", "mpegts"]
+VIDEO_DETAILS = ["h264 High L4.1", "h264 High L5.1", "hevc Main 10 L5.1", "mpeg4 Simple Profile L0.1"]
+AUDIO = [("aac", "stereo", 2), ("ac3", "5.1(side)", 6), ("eac3", "5.1(side)", 6), ("dts", "5.1(side)", 6), ("truehd", "7.1", 8)]
+LANGUAGES = ["eng", "fre", "spa", "jpn", None]
+SUBTITLES = ["subrip", "ass", "hdmv_pgs_subtitle", "mov_text"]
+REASONS = ["Direct Play OK", "Audio codec 'dts' not supported", "Video level 5.1 > max 4.1", "Container 'avi' not supported"]
+
+def fresh(value):
+    """A new string object with the same text, like every decoded or formatted string in a real scan."""
+    return "".join(list(value)) if isinstance(value, str) else value
+
+def synthetic_result(rng: random.Random, n: int) -> dict:
+    relative_path = f"Show {n // 500}/Season {n // 50 % 10:02d}/Episode {n:06d}.mkv"
+    audio_tracks = []
+    for index in range(1, rng.randint(2, 4)):
+        codec, layout, channels = rng.choice(AUDIO)
+        audio_tracks.append({"index": index, "codec": fresh(codec), "language": fresh(rng.choice(LANGUAGES)),
+                             "title": None, "channels": channels, "channel_layout": fresh(layout)})
+    reason = rng.choice(REASONS)
+    return {
+        "file_path": f"{ROOT}/{relative_path}",
+        "relative_path": relative_path,
+        "is_compatible": reason == REASONS[0],
+        "reason": fresh(reason),
+        "error": None,
+        "container": fresh(rng.choice(CONTAINERS)),
+        "video_details": fresh(rng.choice(VIDEO_DETAILS)),
+        "audio_tracks": audio_tracks,
+        "subtitle_codecs": sorted({fresh(rng.choice(SUBTITLES)) for _ in range(rng.randint(0, 3))}),
+        "duration": round(rng.uniform(1200, 3600), 3)
+    }
+
+def measure(build) -> tuple[object, int, float]:
+    """Returns (built object, bytes it holds, seconds to build)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    built = build()
+    seconds = time.perf_counter() - start
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return built, held, seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=100000, help="Synthetic scan results")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    dicts, dict_bytes, dict_seconds = measure(lambda: [synthetic_result(random.Random(args.seed + n), n) for n in range(args.files)])
+    compact, compact_bytes, compact_seconds = measure(
+        lambda: CompactResultList(ROOT, (synthetic_result(random.Random(args.seed + n), n) for n in range(args.files))))
+
+    start = time.perf_counter()
+    round_trip = list(compact)
+    unpack_seconds = time.perf_counter() - start
+    report = {
+        "files": args.files,
+        "dicts": {"bytes": dict_bytes, "bytes_per_result": round(dict_bytes / args.files), "build_seconds": round(dict_seconds, 3)},
+        "compact": {"bytes": compact_bytes, "bytes_per_result": round(compact_bytes / args.files), "build_seconds": round(compact_seconds, 3),
+                    "to_dicts_seconds": round(unpack_seconds, 3)},
+        "reduction": round(dict_bytes / compact_bytes, 2),
+        "round_trip_identical": round_trip == dicts
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 let currentTaskId = null;
 let currentTaskType = null;
 let pollInterval = null;
+let eventSource = null;
+let resultsCursor = 0;
 
 async function startScan() {
     if (!window.profileSelect || !window.profileSelect.value) {
@@ -18,13 +20,14 @@ async function startScan() {
         const resultData = await response.json();
         if (!response.ok) throw new Error(resultData.error || `HTTP error ${response.status}`);
         currentTaskId = resultData.task_id;
+        resultsCursor = 0;
         sessionStorage.setItem('activeTaskId', currentTaskId);
         sessionStorage.setItem('activeTaskType', currentTaskType);
-        window.statusMessage.textContent = `Scan queued. Polling...`;
+        window.statusMessage.textContent = `Scan queued. Waiting for progress...`;
         if (window.progressBarContainer) window.progressBarContainer.style.display = 'flex';
         if (window.progressBarInner) window.progressBarInner.style.width = '0%';
         if (window.progressText) window.progressText.textContent = '0%';
-        startPolling();
+        startTaskUpdates();
     } catch (e) {
         window.statusMessage.textContent = `Error starting scan: ${e.message}`;
         setUIState(false);
@@ -32,6 +35,41 @@ async function startScan() {
     }
 }
 
+// Offers to continue tasks that were cut off by a server or container restart.
+async function checkInterruptedTasks() {
+    if (currentTaskId) return;
+    let interrupted = [];
+    try {
+        const response = await fetch('/api/tasks/interrupted');
+        if (!response.ok) return;
+        interrupted = await response.json();
+    } catch (e) {
+        return;
+    }
+    for (const task of interrupted) {
+        const what = task.kind === 'fix' ? 'A fix task' : `A scan of '${task.directory}' (${task.profile_name})`;
+        const done = task.total_files ? `${task.processed_count}/${task.total_files}` : `${task.processed_count}`;
+        if (!confirm(`${what} was interrupted after ${done} files. Resume it?`)) continue;
+        try {
+            const response = await fetch(`/api/tasks/${task.task_id}/resume`, { method: 'POST' });
+            const resultData = await response.json();
+            if (!response.ok) throw new Error(resultData.error || `HTTP error ${response.status}`);
+            currentTaskId = task.task_id;
+            currentTaskType = task.kind === 'fix' ? 'fix' : 'scan';
+            resultsCursor = 0;
+            window.fullResultsData = [];
+            sessionStorage.setItem('activeTaskId', currentTaskId);
+            sessionStorage.setItem('activeTaskType', currentTaskType);
+            setUIState(true, false);
+            window.statusMessage.textContent = `Resuming ${currentTaskType}...`;
+            startTaskUpdates();
+        } catch (e) {
+            window.statusMessage.textContent = `Error resuming task: ${e.message}`;
+        }
+        return;
+    }
+}
+
 async function stopTask() {
     if (!currentTaskId) {
         window.statusMessage.textContent = "No active task to stop.";
@@ -50,6 +88,107 @@ async function stopTask() {
     }
 }
 
+function applyResultsDelta(newResults, reset) {
+    if (reset || !Array.isArray(window.fullResultsData)) {
+        window.fullResultsData = [];
+    }
+    if (newResults.length > 0) {
+        window.fullResultsData.push(...newResults);
+    }
+    if (!reset && newResults.length === 0) return;
+    if (reset) applyFilterAndRenderTable();
+    else appendResultsToTable(newResults);
+    updateSummary(window.fullResultsData, currentTaskType === 'fix');
+    updateFilterButtonCounts();
+}
+
+function finishTask(task) {
+    const finalTaskType = currentTaskType;
+    stopTaskUpdates();
+
+    applyFilterAndRenderTable();
+    updateSummary(window.fullResultsData, finalTaskType === 'fix');
+    updateFilterButtonCounts();
+
+    let finalMsg = "";
+    if (task.status === 'cancelled') {
+        finalMsg = `${finalTaskType || 'Task'} cancelled.`;
+        if (Array.isArray(window.fullResultsData) && window.fullResultsData.length > 0 && !window.fullResultsData[0]?.message) {
+            finalMsg += " Displaying partial results.";
+        }
+    } else if (task.status === 'failed') {
+        finalMsg = `${finalTaskType || 'Task'} failed: ${task.error || 'Unknown reason'}`;
+    } else if (task.status === 'interrupted') {
+        finalMsg = `${finalTaskType || 'Task'} was interrupted. Reload the page to resume it.`;
+    } else if (task.status === 'completed') {
+        if (finalTaskType === 'fix') {
+            finalMsg = "Fix task completed.";
+        } else {
+            const scanMsg = (Array.isArray(window.fullResultsData) && window.fullResultsData.length > 0 && window.fullResultsData[0]?.message && !window.fullResultsData[0]?.status)
+                ? window.fullResultsData[0].message
+                : (Array.isArray(window.fullResultsData) ? `Processed ${window.fullResultsData.length} files.` : "Processing completed.");
+            finalMsg = `Scan completed. ${scanMsg}`;
+        }
+    }
+    if (window.statusMessage) window.statusMessage.textContent = finalMsg;
+
+    currentTaskId = null;
+    currentTaskType = null;
+    sessionStorage.removeItem('activeTaskId');
+    sessionStorage.removeItem('activeTaskType');
+    setUIState(false);
+}
+
+function abandonTask(message) {
+    if (window.statusMessage) window.statusMessage.textContent = message;
+    setUIState(false);
+    stopTaskUpdates();
+    currentTaskId = null;
+    currentTaskType = null;
+    sessionStorage.removeItem('activeTaskId');
+    sessionStorage.removeItem('activeTaskType');
+    updateFilterButtonCounts();
+}
+
+// Prefer the server-pushed event stream; fall back to interval polling when EventSource is unavailable or the stream breaks.
+function startTaskUpdates() {
+    stopTaskUpdates();
+    if (typeof EventSource === 'undefined') {
+        startPolling();
+        return;
+    }
+    eventSource = new EventSource(`/api/tasks/${currentTaskId}/events?since=${resultsCursor}`);
+    eventSource.addEventListener('results', (event) => {
+        const data = JSON.parse(event.data);
+        resultsCursor = data.cursor;
+        applyResultsDelta(data.result || [], data.reset === true);
+    });
+    eventSource.addEventListener('progress', (event) => {
+        updateStatus(JSON.parse(event.data));
+    });
+    eventSource.addEventListener('done', (event) => {
+        const task = JSON.parse(event.data);
+        updateStatus(task);
+        finishTask(task);
+    });
+    eventSource.onerror = () => {
+        stopEventStream();
+        if (currentTaskId) startPolling();
+    };
+}
+
+function stopTaskUpdates() {
+    stopEventStream();
+    stopPolling();
+}
+
+function stopEventStream() {
+    if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+    }
+}
+
 function startPolling() {
     stopPolling();
     pollInterval = setInterval(async () => {
@@ -58,7 +197,7 @@ function startPolling() {
             return;
         }
         try {
-            const response = await fetch(`/api/status/${currentTaskId}`);
+            const response = await fetch(`/api/status/${currentTaskId}?since=${resultsCursor}`);
             if (!response.ok) {
                 let eMsg = `Poll error ${response.status}`;
                 try {
@@ -70,71 +209,21 @@ function startPolling() {
             }
             const task = await response.json();
 
-            let resultsChanged = false;
-            const newResults = task.result;
-
-            if (newResults !== null && newResults !== undefined) {
-                const newResultsArray = Array.isArray(newResults) ? newResults : (newResults.message ? [newResults] : []);
-                if (JSON.stringify(window.fullResultsData) !== JSON.stringify(newResultsArray)) {
-                    window.fullResultsData = newResultsArray;
-                    resultsChanged = true;
-                }
+            if (typeof task.cursor === 'number') {
+                resultsCursor = task.cursor;
             }
-
+            applyResultsDelta(Array.isArray(task.result) ? task.result : [], task.reset === true);
             updateStatus(task);
 
-            if (resultsChanged) {
-                applyFilterAndRenderTable();
-                updateSummary(window.fullResultsData, currentTaskType === 'fix');
-                updateFilterButtonCounts();
+            if (task.has_more) {
+                // More results are waiting server-side; drain them before treating the task as finished.
+                return;
             }
-
-            if (['completed', 'failed', 'cancelled'].includes(task.status)) {
-                const finalTaskType = currentTaskType;
-                const finalTaskId = currentTaskId;
-                stopPolling();
-
-                if (resultsChanged) {
-                    applyFilterAndRenderTable();
-                }
-                updateSummary(window.fullResultsData, finalTaskType === 'fix');
-                updateFilterButtonCounts();
-
-                let finalMsg = "";
-                if (task.status === 'cancelled') {
-                    finalMsg = `${finalTaskType || 'Task'} cancelled.`;
-                    if (Array.isArray(window.fullResultsData) && window.fullResultsData.length > 0 && !window.fullResultsData[0]?.message) {
-                        finalMsg += " Displaying partial results.";
-                    }
-                } else if (task.status === 'failed') {
-                    finalMsg = `${finalTaskType || 'Task'} failed: ${task.error || 'Unknown reason'}`;
-                } else if (task.status === 'completed') {
-                    if (finalTaskType === 'fix') {
-                        finalMsg = "Fix task completed.";
-                    } else {
-                        const scanMsg = (Array.isArray(window.fullResultsData) && window.fullResultsData.length > 0 && window.fullResultsData[0]?.message && !window.fullResultsData[0]?.status)
-                            ? window.fullResultsData[0].message
-                            : (Array.isArray(window.fullResultsData) ? `Processed ${window.fullResultsData.length} files.` : "Processing completed.");
-                        finalMsg = `Scan completed. ${scanMsg}`;
-                    }
-                }
-                if (window.statusMessage) window.statusMessage.textContent = finalMsg;
-
-                currentTaskId = null;
-                currentTaskType = null;
-                sessionStorage.removeItem('activeTaskId');
-                sessionStorage.removeItem('activeTaskType');
-                setUIState(false);
+            if (['completed', 'failed', 'cancelled', 'interrupted'].includes(task.status)) {
+                finishTask(task);
             }
         } catch (error) {
-            if (window.statusMessage) window.statusMessage.textContent = `Polling error: ${error.message}. Stopping polling.`;
-            setUIState(false);
-            stopPolling();
-            currentTaskId = null;
-            currentTaskType = null;
-            sessionStorage.removeItem('activeTaskId');
-            sessionStorage.removeItem('activeTaskType');
-            updateFilterButtonCounts();
+            abandonTask(`Polling error: ${error.message}. Stopping polling.`);
         }
     }, 2000);
 }
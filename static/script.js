@@ -117,6 +117,7 @@ function showAboutModal() {
     let currentTaskType = null;
     let pollInterval = null;
     let fullResultsData = [];
+    let resultsCursor = 0;
     let profileBeingEdited = null;
     let currentProfileList = [];
 
@@ -219,6 +220,7 @@ function showAboutModal() {
             const resultData = await response.json();
             if (!response.ok) throw new Error(resultData.error || `HTTP error ${response.status}`);
             currentTaskId = resultData.task_id;
+            resultsCursor = 0;
             sessionStorage.setItem('activeTaskId', currentTaskId);
             sessionStorage.setItem('activeTaskType', currentTaskType);
             statusMessage.textContent = `Scan queued. Polling...`;
@@ -256,7 +258,7 @@ function showAboutModal() {
                 return;
             }
             try {
-                const response = await fetch(`/api/status/${currentTaskId}`);
+                const response = await fetch(`/api/status/${currentTaskId}?since=${resultsCursor}`);
                 if (!response.ok) {
                     let eMsg = `Poll error ${response.status}`;
                     try { const d = await response.json(); eMsg = d.error || eMsg; } catch (e) {}
@@ -265,16 +267,11 @@ function showAboutModal() {
                 }
                 const task = await response.json();
 
-                let resultsChanged = false;
-                const newResults = task.result;
-
-                if (newResults !== null && newResults !== undefined) {
-                    const newResultsArray = Array.isArray(newResults) ? newResults : (newResults.message ? [newResults] : []);
-                    if (JSON.stringify(fullResultsData) !== JSON.stringify(newResultsArray)) {
-                        fullResultsData = newResultsArray;
-                        resultsChanged = true;
-                    }
-                }
+                const newResults = Array.isArray(task.result) ? task.result : [];
+                const resultsChanged = task.reset === true || newResults.length > 0;
+                if (task.reset === true) fullResultsData = [];
+                if (newResults.length > 0) fullResultsData = fullResultsData.concat(newResults);
+                if (typeof task.cursor === 'number') resultsCursor = task.cursor;
 
                 updateStatus(task);
 
@@ -284,6 +281,8 @@ function showAboutModal() {
                     updateFilterButtonCounts();
                 }
 
+                if (task.has_more) return;
+
                 if (['completed', 'failed', 'cancelled'].includes(task.status)) {
                     const finalTaskType = currentTaskType;
                     const finalTaskId = currentTaskId;
@@ -394,6 +393,11 @@ function showAboutModal() {
              } else if (d === 0) {
                   statusText += `\nInitializing file list...`;
              }
+             if (task.eta_seconds != null && task.eta_seconds > 0) {
+                 const etaMin = Math.floor(task.eta_seconds / 60);
+                 const etaSec = task.eta_seconds % 60;
+                 statusText += `\nETA ${etaMin > 0 ? `${etaMin}m ` : ''}${etaSec}s` + (task.encode_speed ? ` @ ${task.encode_speed}x` : '');
+             }
          } else {
              const spinner = document.querySelector('.spinner');
              if (spinner) spinner.remove();
@@ -412,7 +416,7 @@ function showAboutModal() {
                  if (progressBarInner) progressBarInner.style.width = `${p}%`;
                  if (progressText) progressText.textContent = `Stopping... (${p}%)`;
              } else if (task.status === 'queued') {
-                 statusText = `Status: ${taskTypeDisplay} queued...`;
+                 statusText = task.queue_position ? `Status: ${taskTypeDisplay} queued (position ${task.queue_position})...` : `Status: ${taskTypeDisplay} queued...`;
              }
          }
 
@@ -62,6 +62,10 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    if (window.scanButton) {
+        checkInterruptedTasks();
+    }
+
     // Apply saved theme on load
     const savedTheme = localStorage.getItem('theme') || 'light';
     applyTheme(savedTheme);
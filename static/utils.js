@@ -85,8 +85,18 @@ function getSelectedFilter() {
     return r ? r.value : 'all';
 }
 
-function applyFilterAndRenderTable() {
+function filterResultsForDisplay(items) {
     const filterValue = getSelectedFilter();
+    if (currentTaskType === 'fix') {
+        return items.filter(item => item.status !== undefined);
+    }
+    if (filterValue === 'attention') {
+        return items.filter(i => !i.is_compatible && !i.error && !i.message && i.relative_path !== undefined);
+    }
+    return items.filter(i => i.relative_path !== undefined && !i.message);
+}
+
+function applyFilterAndRenderTable() {
     let filteredData = [];
     const dataToFilter = (Array.isArray(window.fullResultsData)) ? window.fullResultsData : [];
 
@@ -94,18 +104,25 @@ function applyFilterAndRenderTable() {
         filteredData = dataToFilter;
         if (window.statusMessage) window.statusMessage.textContent = "No files scanned yet — choose a directory and profile to begin.";
     }
-    else if (currentTaskType === 'fix') {
-        filteredData = dataToFilter.filter(item => item.status !== undefined);
-    }
-    else if (filterValue === 'attention') {
-        filteredData = dataToFilter.filter(i => !i.is_compatible && !i.error && !i.message && i.relative_path !== undefined);
-    }
     else {
-        filteredData = dataToFilter.filter(i => i.relative_path !== undefined && !i.message);
+        filteredData = filterResultsForDisplay(dataToFilter);
     }
     renderTable(filteredData);
 }
 
+// Appends newly received results without re-rendering the rows already in the table.
+function appendResultsToTable(newItems) {
+    if (!window.resultsTableBody) { return; }
+    const rows = window.resultsTableBody.rows;
+    const showingPlaceholder = rows.length === 0 || (rows.length === 1 && rows[0].cells.length === 1);
+    if (showingPlaceholder) {
+        applyFilterAndRenderTable();
+        return;
+    }
+    const isFixResults = currentTaskType === 'fix';
+    filterResultsForDisplay(newItems).forEach(item => insertResultRow(item, isFixResults));
+}
+
 function renderTable(resultsToDisplay) {
     if (!window.resultsTableBody) { return; }
     window.resultsTableBody.innerHTML = '';
@@ -127,43 +144,47 @@ function renderTable(resultsToDisplay) {
                 : "Scan results will appear here.");
     } else if (dataIsArray) {
         resultsToDisplay.forEach(item => {
-            const row = window.resultsTableBody.insertRow();
-            if (isFixResults) {
-                row.className = `fix-${item.status || 'unknown'}`;
-                row.insertCell().textContent = item.relative_path || 'N/A';
-                const statusCell = row.insertCell(); statusCell.colSpan = 5;
-                statusCell.textContent = item.status ? item.status.toUpperCase() : '?';
-                row.insertCell().textContent = item.message || '';
-            } else if (item.relative_path !== undefined) {
-                row.className = item.is_compatible ? 'directplay-yes' : 'directplay-no';
-                const filenameCell = row.insertCell();
-                const fullPath = item.relative_path || '';
-                const baseFilename = fullPath.split(/[\\/]/).pop() || fullPath;
-                filenameCell.textContent = baseFilename;
-                filenameCell.title = fullPath;
-                row.insertCell().textContent = item.container || 'N/A';
-                row.insertCell().textContent = item.video_details || 'N/A';
-                const audioCell = row.insertCell();
-                if (Array.isArray(item.audio_tracks) && item.audio_tracks.length > 0) {
-                    audioCell.innerHTML = item.audio_tracks.map(track => {
-                        let parts = [];
-                        if (track.index != null) parts.push(`#${track.index}`);
-                        parts.push(track.codec || '?');
-                        if (track.language && track.language !== 'und') parts.push(`(${track.language})`);
-                        if (track.channels) parts.push(`${track.channels}ch`);
-                        if (track.title) parts.push(`'${track.title}'`);
-                        return parts.join(' ').replace(/</g, "<").replace(/>/g, ">");
-                    }).join('<br>');
-                } else { audioCell.textContent = 'N/A'; }
-                const subsCell = row.insertCell();
-                subsCell.textContent = Array.isArray(item.subtitle_codecs) && item.subtitle_codecs.length > 0 ? item.subtitle_codecs.join(', ') : 'N/A';
-                row.insertCell().textContent = item.is_compatible ? 'Yes' : 'No';
-                row.insertCell().textContent = item.reason || item.error || (item.is_compatible ? 'Direct Play OK' : '');
-            }
+            insertResultRow(item, isFixResults);
         });
     }
 }
 
+function insertResultRow(item, isFixResults) {
+    const row = window.resultsTableBody.insertRow();
+    if (isFixResults) {
+        row.className = `fix-${item.status || 'unknown'}`;
+        row.insertCell().textContent = item.relative_path || 'N/A';
+        const statusCell = row.insertCell(); statusCell.colSpan = 5;
+        statusCell.textContent = item.status ? item.status.toUpperCase() : '?';
+        row.insertCell().textContent = item.message || '';
+    } else if (item.relative_path !== undefined) {
+        row.className = item.is_compatible ? 'directplay-yes' : 'directplay-no';
+        const filenameCell = row.insertCell();
+        const fullPath = item.relative_path || '';
+        const baseFilename = fullPath.split(/[\\/]/).pop() || fullPath;
+        filenameCell.textContent = baseFilename;
+        filenameCell.title = fullPath;
+        row.insertCell().textContent = item.container || 'N/A';
+        row.insertCell().textContent = item.video_details || 'N/A';
+        const audioCell = row.insertCell();
+        if (Array.isArray(item.audio_tracks) && item.audio_tracks.length > 0) {
+            audioCell.innerHTML = item.audio_tracks.map(track => {
+                let parts = [];
+                if (track.index != null) parts.push(`#${track.index}`);
+                parts.push(track.codec || '?');
+                if (track.language && track.language !== 'und') parts.push(`(${track.language})`);
+                if (track.channels) parts.push(`${track.channels}ch`);
+                if (track.title) parts.push(`'${track.title}'`);
+                return parts.join(' ').replace(/</g, "<").replace(/>/g, ">");
+            }).join('<br>');
+        } else { audioCell.textContent = 'N/A'; }
+        const subsCell = row.insertCell();
+        subsCell.textContent = Array.isArray(item.subtitle_codecs) && item.subtitle_codecs.length > 0 ? item.subtitle_codecs.join(', ') : 'N/A';
+        row.insertCell().textContent = item.is_compatible ? 'Yes' : 'No';
+        row.insertCell().textContent = item.reason || item.error || (item.is_compatible ? 'Direct Play OK' : '');
+    }
+}
+
 function updateSummary(fullDataSet, isFixSummary = false) {
     if (!window.resultsSummary) return;
     let summaryText = "";
@@ -0,0 +1,34 @@
+import os
+import logging
+import pathlib
+import tempfile
+import unittest
+
+os.environ.setdefault("CONFIG_DIR", tempfile.mkdtemp(prefix="playarr-test-config-"))
+
+from app.tasks import run_fix_task
+
+class ResumeFixTaskTest(unittest.TestCase):
+    def test_resume_of_fix_interrupted_while_queued(self):
+        """A fix that was queued when its process died has none of the progress fields a started fix has."""
+        with tempfile.TemporaryDirectory() as media_dir:
+            files_to_fix = []
+            for name in ("a", "b"):
+                media_file = pathlib.Path(media_dir) / f"{name}.mkv"
+                media_file.write_bytes(b"")
+                pathlib.Path(media_dir, f"{name}.fixed.mkv").write_bytes(b"") # Outputs already there, so no ffmpeg run
+                files_to_fix.append({"file_path": str(media_file), "relative_path": media_file.name})
+            tasks = {"fix_1": {"type": "fix", "status": "interrupted", "cancel_requested": False}}
+
+            run_fix_task("fix_1", files_to_fix, {"concurrency": 2}, tasks, logging.getLogger(__name__), resume=True)
+
+        task = tasks["fix_1"]
+        self.assertEqual(task["status"], "completed")
+        self.assertEqual(task["total_files"], 2)
+        self.assertEqual(task["processed_count"], 2)
+        self.assertEqual(task["progress"], 100)
+        self.assertEqual([outcome["relative_path"] for outcome in task["result"]], ["a.mkv", "b.mkv"])
+        self.assertEqual(task["transcode_seconds_saved"], {"estimated": 0.0, "extrapolated": 0.0})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+import utils
+
+PROFILE = {
+    "supported_containers": ["matroska"],
+    "supported_video_codecs": ["h264"],
+    "supported_audio_codecs": ["aac"],
+    "supported_subtitle_codecs": ["subrip"],
+    "unsupported_subtitle_formats": ["hdmv_pgs_subtitle"]
+}
+
+def _media_info(subtitle_codec: str) -> dict:
+    return {"format": {"format_name": "matroska,webm"},
+            "streams": [{"codec_type": "video", "codec_name": "h264"},
+                        {"codec_type": "audio", "codec_name": "aac"},
+                        {"codec_type": "subtitle", "codec_name": subtitle_codec}]}
+
+class SubtitleRulesTest(unittest.TestCase):
+    def setUp(self):
+        self.rules = utils.compile_profile(PROFILE)
+
+    def test_supported_subtitle(self):
+        self.assertEqual(self.rules.evaluate(_media_info("subrip")), (True, "Direct Play OK"))
+
+    def test_unlisted_subtitle_is_noted_without_changing_the_verdict(self):
+        self.assertEqual(self.rules.evaluate(_media_info("mov_text")),
+                         (True, "Direct Play OK (Subtitle 'mov_text' not in supported list)"))
+
+    def test_unsupported_subtitle_requires_transcode(self):
+        self.assertEqual(self.rules.evaluate(_media_info("hdmv_pgs_subtitle")),
+                         (False, "Subtitle format 'hdmv_pgs_subtitle' requires transcode"))
+
+    def test_note_follows_blocking_reasons(self):
+        media_info = _media_info("mov_text")
+        media_info["streams"][1]["codec_name"] = "dts"
+        self.assertEqual(self.rules.evaluate(media_info),
+                         (False, "Audio codec 'dts' unsupported, Subtitle 'mov_text' not in supported list"))
+
+if __name__ == "__main__":
+    unittest.main()
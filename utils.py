@@ -1,18 +1,76 @@
 # utils.py
+import os
 import pathlib
 import subprocess
 import json
+import re
+import time
+import hashlib
+import threading
 from rich.console import Console
 
 console = Console(stderr=True, force_terminal=True, color_system="auto")
 
 SUPPORTED_EXTENSIONS = {".mkv", ".mp4", ".avi", ".mov", ".ts", ".m2ts", ".wmv", ".flv"}
 
+# --- Media Discovery ---
+def iter_media_files(directory: pathlib.Path, recursive: bool = True, should_stop=None):
+    """
+    Streams supported media files under a directory as os.DirEntry objects.
+    Uses the DirEntry type cache instead of per-path stat calls; entries are yielded in sorted,
+    depth-first order (a directory's files before its subdirectories). Directory symlinks are not followed.
+    """
+    pending_dirs = [str(directory)]
+    while pending_dirs:
+        if should_stop and should_stop(): return
+        current_dir = pending_dirs.pop()
+        try:
+            with os.scandir(current_dir) as it: entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            console.print(f"[yellow]Warn: Could not read directory '{current_dir}': {e}[/yellow]", style="dim")
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive: subdirs.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS and entry.is_file():
+                    yield entry
+            except OSError:
+                continue
+        pending_dirs.extend(reversed(subdirs))
+
+# Bytes read from each end of a file for its content fingerprint
+FINGERPRINT_BLOCK_SIZE = 65536
+
+def file_fingerprint(file_path: pathlib.Path, size: int) -> str | None:
+    """
+    Returns a fast partial-content fingerprint of a file: a hash of its size and its first and last FINGERPRINT_BLOCK_SIZE bytes.
+    Media containers keep their headers/indexes at the ends, so this tells re-encodes apart while reading at most 128 KiB.
+    Returns None if the file can't be read.
+    """
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    try:
+        with open(file_path, 'rb') as f:
+            digest.update(f.read(FINGERPRINT_BLOCK_SIZE))
+            if size > FINGERPRINT_BLOCK_SIZE:
+                f.seek(max(FINGERPRINT_BLOCK_SIZE, size - FINGERPRINT_BLOCK_SIZE))
+                digest.update(f.read(FINGERPRINT_BLOCK_SIZE))
+    except OSError:
+        return None
+    return digest.hexdigest()
+
 # --- ffprobe Execution ---
-def run_ffprobe(file_path: pathlib.Path) -> dict | None:
-    """Runs ffprobe on a file and returns parsed JSON data or None on error."""
+# Only the fields scans read; the fast tier asks ffprobe for nothing else
+FAST_PROBE_ENTRIES = "format=format_name,duration:stream=index,codec_type,codec_name,profile,level,channels,channel_layout:stream_tags=language,title"
+# Containers whose streams are found by reading packets rather than a header, so a capped probe can miss some
+FAST_PROBE_UNRELIABLE_FORMATS = ("mpegts", "mpeg")
+
+def run_ffprobe(file_path: pathlib.Path, probe_args: list[str] | None = None) -> dict | None:
+    """Runs ffprobe on a file and returns parsed JSON data or None on error.
+    probe_args replaces the default "-show_format -show_streams" selection."""
     abs_file_path = str(file_path.resolve())
-    ffprobe_cmd = ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_format", "-show_streams", abs_file_path]
+    ffprobe_cmd = ["ffprobe", "-v", "quiet", "-print_format", "json", *(probe_args or ["-show_format", "-show_streams"]), abs_file_path]
     # console.print(f"Running ffprobe for: {abs_file_path}", style="dim") # Uncomment for verbose debugging
     try:
         result = subprocess.run(ffprobe_cmd, capture_output=True, text=True, check=False, encoding='utf-8', errors='ignore', timeout=60) # 60s timeout
@@ -36,6 +94,151 @@ def run_ffprobe(file_path: pathlib.Path) -> dict | None:
         console.print(f"[red]An unexpected error occurred running ffprobe for '{file_path.name}': {e}[/red]")
         return None
 
+def fast_probe_gaps(media_info: dict | None) -> str | None:
+    """Returns why a fast-tier probe result can't be trusted (so a full probe is needed), or None if it is complete."""
+    if not media_info: return "probe failed"
+    format_info = media_info.get('format') or {}
+    if not format_info.get('format_name'): return "no container"
+    if any(name in FAST_PROBE_UNRELIABLE_FORMATS for name in format_info['format_name'].split(',')): return "stream-discovered container"
+    if not format_info.get('duration'): return "no duration"
+    streams = media_info.get('streams') or []
+    if not streams: return "no streams"
+    for stream in streams:
+        if not stream.get('codec_name'): return "undetected codec"
+        if stream.get('codec_type') == 'video' and stream['codec_name'] == 'h264' and (stream.get('level') or 0) <= 0: return "undefined h264 level"
+        if stream.get('codec_type') == 'audio' and not stream.get('channels'): return "unknown audio channels"
+    return None
+
+class ProbeTierStats:
+    """Thread-safe per-tier probe counts and wall times, for one scan."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers = {"fast": [0, 0.0], "full": [0, 0.0]}
+        self._escalations = {}
+
+    def record(self, tier: str, seconds: float, escalation_reason: str | None = None):
+        with self._lock:
+            self._tiers[tier][0] += 1
+            self._tiers[tier][1] += seconds
+            if escalation_reason:
+                self._escalations[escalation_reason] = self._escalations.get(escalation_reason, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snapshot = {tier: {"count": count, "seconds": round(seconds, 3)} for tier, (count, seconds) in self._tiers.items()}
+            snapshot["escalations"] = dict(self._escalations)
+            return snapshot
+
+def run_ffprobe_tiered(file_path: pathlib.Path, probesize: int, analyzeduration_us: int, stats: ProbeTierStats | None = None) -> dict | None:
+    """
+    Probes with a fast tier first: only FAST_PROBE_ENTRIES, reading at most `probesize` bytes / `analyzeduration_us`
+    of the file. Escalates to a full run_ffprobe when the fast result is missing data (see fast_probe_gaps).
+    """
+    started = time.monotonic()
+    media_info = run_ffprobe(file_path, ["-probesize", str(probesize), "-analyzeduration", str(analyzeduration_us), "-show_entries", FAST_PROBE_ENTRIES])
+    gap = fast_probe_gaps(media_info)
+    if stats: stats.record("fast", time.monotonic() - started, gap)
+    if gap is None: return media_info
+    started = time.monotonic()
+    media_info = run_ffprobe(file_path)
+    if stats: stats.record("full", time.monotonic() - started)
+    return media_info
+
+# --- Compiled Profile Rules ---
+class CompiledProfile:
+    """
+    Immutable, pre-processed form of a profile's rules (see compile_profile).
+    Codec and container lists become frozensets and the H.264 level limit is resolved once, so that
+    evaluate() can check a probe result in a single pass over its streams.
+    """
+    __slots__ = ("supported_containers", "strict_containers", "supported_video", "strict_video",
+                 "max_h264_level", "max_h264_level_str", "supported_audio", "strict_audio",
+                 "supported_subtitles", "unsupported_subtitles", "checks_audio")
+
+    def __init__(self, profile: dict):
+        def codec_set(key): return frozenset(str(c).lower() for c in (profile.get(key) or []))
+        set_attr = object.__setattr__
+        set_attr(self, "supported_containers", codec_set("supported_containers"))
+        set_attr(self, "strict_containers", codec_set("unsupported_containers_strict"))
+        set_attr(self, "supported_video", codec_set("supported_video_codecs"))
+        set_attr(self, "strict_video", codec_set("unsupported_video_codecs_strict"))
+        max_level = profile.get("max_h264_level")
+        set_attr(self, "max_h264_level", max_level if isinstance(max_level, (int, float)) else None)
+        set_attr(self, "max_h264_level_str", f"{max_level / 10.0:.1f}" if self.max_h264_level is not None else None)
+        set_attr(self, "supported_audio", codec_set("supported_audio_codecs"))
+        set_attr(self, "strict_audio", codec_set("unsupported_audio_codecs_strict"))
+        set_attr(self, "supported_subtitles", codec_set("supported_subtitle_codecs"))
+        set_attr(self, "unsupported_subtitles", codec_set("unsupported_subtitle_formats"))
+        set_attr(self, "checks_audio", bool(self.supported_audio or self.strict_audio))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def audio_supported(self, codec_name: str) -> bool:
+        """Whether an audio track of this codec plays: in supported_audio_codecs (if set) and not strictly unsupported."""
+        return (not self.supported_audio or codec_name in self.supported_audio) and codec_name not in self.strict_audio
+
+    def evaluate(self, media_info: dict) -> tuple[bool, str]:
+        """
+        Checks media info against the compiled rules. Same contract as check_compatibility, and additionally
+        applies the unsupported_*_strict deny lists. As there, only unsupported_subtitle_formats affects the
+        verdict; a subtitle codec in neither subtitle list is treated as unknown, not as unsupported, and
+        (when supported_subtitle_codecs is set) only noted in the reason.
+        Returns: (can_direct_play, reason_string)
+        """
+        if not isinstance(media_info, dict): return False, "Internal error: Invalid data"
+        reasons = {} # Insertion-ordered, so duplicate reasons are dropped without a list scan
+        notes = {} # Non-blocking, reported without changing the verdict
+
+        # 1. Check Container
+        container = ((media_info.get('format') or {}).get('format_name') or '').lower().split(',')[0]
+        if container and ((self.supported_containers and container not in self.supported_containers) or container in self.strict_containers):
+            reasons[f"Container '{container}' unsupported"] = None
+
+        # 2. Check Streams
+        streams = media_info.get('streams')
+        if isinstance(streams, list):
+            first_video_checked = False; first_incompatible_audio = None; compatible_audio_found = False
+            for stream in streams:
+                if not isinstance(stream, dict): continue
+                codec_type = stream.get('codec_type'); codec_name = stream.get('codec_name', 'unknown')
+                if codec_type == 'audio':
+                    if self.audio_supported(codec_name): compatible_audio_found = True
+                    elif first_incompatible_audio is None: first_incompatible_audio = codec_name
+                elif codec_type == 'video' and not first_video_checked:
+                    first_video_checked = True
+                    if (self.supported_video and codec_name not in self.supported_video) or codec_name in self.strict_video:
+                        reasons[f"Video codec '{codec_name}' unsupported"] = None
+                    level = stream.get('level')
+                    if codec_name == 'h264' and self.max_h264_level is not None and isinstance(level, int) and level > self.max_h264_level:
+                        reasons[f"H.264 Level L{level / 10.0:.1f} exceeds profile max L{self.max_h264_level_str}"] = None
+                elif codec_type == 'subtitle':
+                    if codec_name in self.unsupported_subtitles:
+                        reasons[f"Subtitle format '{codec_name}' requires transcode"] = None
+                    elif self.supported_subtitles and codec_name not in self.supported_subtitles:
+                        notes[f"Subtitle '{codec_name}' not in supported list"] = None
+            # Audio plays if any one track is compatible
+            if self.checks_audio and first_incompatible_audio is not None and not compatible_audio_found:
+                reasons[f"Audio codec '{first_incompatible_audio}' unsupported"] = None
+        if not reasons: return True, f"Direct Play OK ({', '.join(notes)})" if notes else "Direct Play OK"
+        return False, ", ".join([*reasons, *notes])
+
+def compatibility_fields(media_info: dict) -> dict:
+    """Reduces an ffprobe result to the fields CompiledProfile.evaluate() reads, for cheap storage and re-checks."""
+    return {
+        "format": {"format_name": (media_info.get('format') or {}).get('format_name')},
+        "streams": [{key: stream[key] for key in ("codec_type", "codec_name", "level") if key in stream}
+                    for stream in media_info.get('streams') or [] if isinstance(stream, dict)]
+    }
+
+def compile_profile(profile: dict) -> CompiledProfile:
+    """Compiles a profile JSON object into a CompiledProfile. Compile once per scan, then call evaluate() per file."""
+    if not isinstance(profile, dict): raise TypeError("Profile must be a JSON object")
+    return CompiledProfile(profile)
+
 # --- Compatibility Check Logic (With improved reason strings) ---
 def check_compatibility(media_info: dict, profile: dict) -> tuple[bool, str]:
     """
@@ -87,6 +290,12 @@ def check_compatibility(media_info: dict, profile: dict) -> tuple[bool, str]:
     return can_direct_play, reason_str
 
 # --- Profile Loading ---
+def sanitize_filename(name: str) -> str:
+    """Returns a profile name safe to use as a file stem (letters, digits, spaces, '-', '_', '.', '(', ')'), or '' if none remains."""
+    if not isinstance(name, str): return ""
+    safe_name = re.sub(r"[^\w\s.()-]", "", name).strip().strip(".")
+    return safe_name if safe_name and ".." not in safe_name else ""
+
 def load_profiles(profiles_dir: pathlib.Path) -> dict:
     """Loads profile JSON files from the specified directory."""
     profiles = {}